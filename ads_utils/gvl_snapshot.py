@@ -0,0 +1,172 @@
+"""
+GVL 批次讀取：
+    以一次 ADS sum-read (read_list_by_name) 讀取 do_routine_job 需要的所有 GVL 變數，
+    PLC 拒絕批次讀取時，改為逐一讀取 (read_by_name)。
+    sum-read 中個別變數失敗時 pyads 不拋出例外，而是以錯誤字串作為該變數的值，
+    非數值的變數改為單獨讀取，仍失敗時記錄於 errors。
+    symbol info (index group / offset) 由 pyads 快取，每次讀取不需再查詢 symbol。
+"""
+import time
+from typing import Dict, List, Optional
+
+
+# (屬性名稱, GVL 變數名稱, 是否為必要資料)
+GVL_SNAPSHOT_SYMBOLS = (
+    # AMR 位置
+    ("pos_x", "GVL.nCar_PositionX", True),
+    ("pos_y", "GVL.nCar_PositionY", True),
+    ("pos_z", "GVL.nCarLiftHeight", True),
+    ("pos_theta", "GVL.nCar_PositionYaw", True),
+    ("tag_id", "GVL.nCar_PositionTagID", True),
+    # 拍照任務
+    ("CameraWorkStatus", "GVL.CameraWorkStatus", True),
+    ("ToCameraWorkCommand", "GVL.ToCameraWorkCommand", True),
+    ("FromCameraWorkCommand", "GVL.FromCameraWorkCommand", True),
+    # 替身任務
+    ("ManualSemiControlDisableStatus",
+     "GVL.bWeb_ManualSemiControlDisableStatus", False),
+    ("AutoManualStatus", "GVL.bWeb_AutoManualStatus", False),
+    ("AutoManualSwitch", "GVL.bWeb_AutoManualSwitch", False),
+    ("bWeb_bBeckhoff_IPC_HartBitStatus",
+     "GVL.bWeb_bBeckhoff_IPC_HartBitStatus", False),
+    ("ManualJoyControlEnable", "GVL.bWeb_ManualJoyControlEnable", False),
+    ("ManualJoyDirection", "GVL.bWeb_ManualJoyDirection", False),
+    ("ManualJoyStrength", "GVL.bWeb_ManualJoyStrength", False),
+    # IUMOBO 障礙物偵測
+    ("RealSenseObstacleSignal", "GVL.bWeb_RealSenseObstacleSignal", False),
+)
+
+
+def is_valid_value(value) -> bool:
+    """GVL 變數皆為數值 / BOOL，其他型別 (例如 ADS 錯誤字串) 視為讀取失敗"""
+    return isinstance(value, (bool, int, float))
+
+
+class GVLSnapshot:
+    """一次讀取的 GVL 資料"""
+
+    def __init__(self):
+        # AMR 位置
+        self.pos_x: Optional[int] = None
+        self.pos_y: Optional[int] = None
+        self.pos_z: Optional[int] = None
+        self.pos_theta: Optional[int] = None
+        self.tag_id: Optional[int] = None
+        # 拍照任務
+        self.CameraWorkStatus: Optional[int] = None
+        self.ToCameraWorkCommand: Optional[int] = None
+        self.FromCameraWorkCommand: Optional[int] = None
+        # 替身任務
+        self.ManualSemiControlDisableStatus: Optional[bool] = None
+        self.AutoManualStatus: Optional[bool] = None
+        self.AutoManualSwitch: Optional[bool] = None
+        self.bWeb_bBeckhoff_IPC_HartBitStatus: Optional[bool] = None
+        self.ManualJoyControlEnable: Optional[bool] = None
+        self.ManualJoyDirection: Optional[int] = None
+        self.ManualJoyStrength: Optional[int] = None
+        # IUMOBO 障礙物偵測
+        self.RealSenseObstacleSignal: Optional[bool] = None
+
+        self.batched = False  # True: 由 sum-read 取得
+        self.errors: Dict[str, str] = {}  # 讀取失敗的變數, {變數名稱: 錯誤}
+        self.read_time = 0.0  # 讀取耗時(秒)
+
+    def has(self, attr: str) -> bool:
+        """資料是否讀取成功"""
+        return attr not in self.errors
+
+    @property
+    def required_ok(self) -> bool:
+        """必要資料(位置、任務)是否皆讀取成功"""
+        for attr, _, required in GVL_SNAPSHOT_SYMBOLS:
+            if required and not self.has(attr):
+                return False
+        return True
+
+    @property
+    def manual_ok(self) -> bool:
+        """替身任務資料是否皆讀取成功"""
+        return all(self.has(attr) for attr in (
+            "ManualSemiControlDisableStatus", "AutoManualStatus", "AutoManualSwitch",
+            "bWeb_bBeckhoff_IPC_HartBitStatus", "ManualJoyControlEnable",
+            "ManualJoyDirection", "ManualJoyStrength"))
+
+    def __repr__(self):
+        values = ", ".join(f"{attr}:{getattr(self, attr)}"
+                           for attr, _, _ in GVL_SNAPSHOT_SYMBOLS)
+        return f"GVLSnapshot({values}, batched:{self.batched}, errors:{list(self.errors)})"
+
+
+class GVLSnapshotReader:
+    """GVL 批次讀取"""
+
+    def __init__(self, symbols=GVL_SNAPSHOT_SYMBOLS, logger=None):
+        self.symbols = symbols
+        self.names: List[str] = [name for _, name, _ in symbols]
+        self.logger = logger
+        self.batch_enabled = True  # PLC 拒絕 sum-read 時關閉
+        self.batch_retry_cycles = 100  # 關閉後，每隔幾次重新嘗試 sum-read
+        self._cycles_since_reject = 0
+
+    def read(self, client) -> GVLSnapshot:
+        """讀取 GVL snapshot"""
+        start = time.perf_counter()
+        snapshot = GVLSnapshot()
+        values = None
+
+        if not self.batch_enabled:
+            self._cycles_since_reject += 1
+            if self._cycles_since_reject >= self.batch_retry_cycles:
+                self.batch_enabled = True
+
+        if self.batch_enabled:
+            values = self._read_batch(client)
+
+        if values is not None:
+            snapshot.batched = True
+            for attr, name, _ in self.symbols:
+                if is_valid_value(values[name]):
+                    setattr(snapshot, attr, values[name])
+                else:
+                    # 個別變數讀取失敗 (值為 ADS 錯誤字串)
+                    self._read_one(client, snapshot, attr, name)
+        else:
+            self._read_each(client, snapshot)
+
+        snapshot.read_time = time.perf_counter() - start
+        return snapshot
+
+    def _read_batch(self, client) -> Optional[dict]:
+        """sum-read，失敗回傳 None"""
+        try:
+            values = client.read_list_by_name(self.names)
+        except Exception as e:
+            self._reject(f"sum-read failed, fallback to single read, error:{e}")
+            return None
+        if not isinstance(values, dict) or any(name not in values for name in self.names):
+            self._reject(f"sum-read incomplete, fallback to single read, result:{values}")
+            return None
+        return values
+
+    def _read_each(self, client, snapshot: GVLSnapshot):
+        """逐一讀取"""
+        for attr, name, _ in self.symbols:
+            self._read_one(client, snapshot, attr, name)
+
+    @staticmethod
+    def _read_one(client, snapshot: GVLSnapshot, attr: str, name: str):
+        try:
+            value = client.read_by_name(name)
+        except Exception as e:
+            snapshot.errors[attr] = str(e)
+            return
+        if is_valid_value(value):
+            setattr(snapshot, attr, value)
+        else:
+            snapshot.errors[attr] = f"invalid value:{value!r}"
+
+    def _reject(self, message: str):
+        self.batch_enabled = False
+        self._cycles_since_reject = 0
+        if self.logger is not None:
+            self.logger.error(message)
@@ -0,0 +1,144 @@
+"""
+PLC 週期性工作排程：
+    以 time.monotonic 固定時間格點 (start + n * period) 排程，
+    不因寫入延遲累積漂移；錯過的週期會被略過並計數。
+    提供實測週期、jitter 與 missed deadline 統計。
+"""
+import sys
+import time
+from threading import Event, Lock, Thread
+from typing import Callable, Dict
+
+
+class PeriodicJob:
+    """週期性工作"""
+
+    def __init__(self, name: str, period: float, func: Callable, offset: float = 0.0):
+        self.name = name
+        self.period = period  # 週期(秒)
+        self.func = func
+        self.offset = offset  # 第一次執行延遲(秒)，錯開同週期的工作
+        self.deadline = 0.0  # 下次執行時間(time.monotonic)
+
+        # 統計
+        self.run_cnt = 0
+        self.missed_cnt = 0  # 錯過的週期數
+        self.error_cnt = 0
+        self.last_start = None
+        self.period_sum = 0.0  # 實際執行間隔總和
+        self.period_min = None
+        self.period_max = None
+        self.lateness_sum = 0.0  # 實際開始時間 - 排程時間
+        self.lateness_max = 0.0
+        self.duration_max = 0.0  # 最長執行時間
+
+    def record(self, start: float, end: float):
+        """記錄一次執行"""
+        lateness = max(0.0, start - self.deadline)
+        self.lateness_sum += lateness
+        self.lateness_max = max(self.lateness_max, lateness)
+        self.duration_max = max(self.duration_max, end - start)
+        if self.last_start is not None:
+            interval = start - self.last_start
+            self.period_sum += interval
+            self.period_min = interval if self.period_min is None else min(self.period_min, interval)
+            self.period_max = interval if self.period_max is None else max(self.period_max, interval)
+        self.last_start = start
+        self.run_cnt += 1
+
+    def get_stats(self) -> dict:
+        intervals = self.run_cnt - 1
+        return {
+            "period_ms": self.period * 1000,
+            "measured_period_ms": round(self.period_sum / intervals * 1000, 2) if intervals > 0 else None,
+            "min_period_ms": round(self.period_min * 1000, 2) if self.period_min is not None else None,
+            "max_period_ms": round(self.period_max * 1000, 2) if self.period_max is not None else None,
+            "mean_jitter_ms": round(self.lateness_sum / self.run_cnt * 1000, 2) if self.run_cnt else None,
+            "max_jitter_ms": round(self.lateness_max * 1000, 2),
+            "max_duration_ms": round(self.duration_max * 1000, 2),
+            "run_cnt": self.run_cnt,
+            "missed_cnt": self.missed_cnt,
+            "error_cnt": self.error_cnt,
+        }
+
+
+class FixedRateScheduler:
+    """固定頻率排程 (單一執行緒，依 deadline 先後執行)"""
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.jobs: Dict[str, PeriodicJob] = {}
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = Thread()
+
+    def add_job(self, name: str, period: float, func: Callable, offset: float = 0.0) -> PeriodicJob:
+        """加入週期性工作"""
+        job = PeriodicJob(name, period, func, offset)
+        with self.lock:
+            if self.thread.is_alive():
+                job.deadline = time.monotonic() + offset
+            self.jobs[name] = job
+        return job
+
+    def start(self):
+        if self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = Thread(target=self._run, name="plc-scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {name: job.get_stats() for name, job in self.jobs.items()}
+
+    def _run(self):
+        _enable_high_resolution_timer()
+        now = time.monotonic()
+        with self.lock:
+            for job in self.jobs.values():
+                job.deadline = now + job.offset
+
+        while not self.stop_event.is_set():
+            with self.lock:
+                jobs = list(self.jobs.values())
+            if not jobs:
+                self.stop_event.wait(0.1)
+                continue
+            job = min(jobs, key=lambda item: item.deadline)
+
+            remaining = job.deadline - time.monotonic()
+            if remaining > 0:
+                if self.stop_event.wait(remaining):
+                    break
+
+            start = time.monotonic()
+            try:
+                job.func()
+            except Exception as e:
+                job.error_cnt += 1
+                if self.logger is not None:
+                    self.logger.error(f"scheduled job {job.name} failed, error:{e}")
+            end = time.monotonic()
+            job.record(start, end)
+
+            # 下一個時間格點，錯過的週期略過並計數
+            job.deadline += job.period
+            if job.deadline <= end:
+                missed = int((end - job.deadline) // job.period) + 1
+                job.missed_cnt += missed
+                job.deadline += missed * job.period
+
+
+def _enable_high_resolution_timer():
+    """Windows 預設計時器解析度約 15.6ms，調整為 1ms"""
+    if sys.platform != "win32":
+        return
+    try:
+        import ctypes
+        ctypes.windll.winmm.timeBeginPeriod(1)
+    except Exception:
+        pass
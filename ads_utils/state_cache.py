@@ -0,0 +1,185 @@
+"""
+PLC 狀態快取：
+    以 ADS device notification (on-change) 訂閱任務命令、障礙物訊號與 AMR 位置，
+    變數變化時立即喚醒等待中的執行緒 (dispatcher)。
+    scheduler 週期 GVL 輪詢 (AMR.poll_plc_state) 的結果也會寫入快取，當作 notification 遺失時的 watchdog。
+"""
+import time
+from threading import Lock, Event
+from typing import Callable, Dict, Optional
+
+
+# 屬性名稱: GVL 變數名稱
+PLC_NOTIFY_SYMBOLS = {
+    "ToCameraWorkCommand": "GVL.ToCameraWorkCommand",
+    "CameraWorkStatus": "GVL.CameraWorkStatus",
+    "FromCameraWorkCommand": "GVL.FromCameraWorkCommand",
+    "RealSenseObstacleSignal": "GVL.bWeb_RealSenseObstacleSignal",
+    "pos_x": "GVL.nCar_PositionX",
+    "pos_y": "GVL.nCar_PositionY",
+    "pos_theta": "GVL.nCar_PositionYaw",
+}
+# 變化時需喚醒 dispatcher 的變數
+PLC_WAKE_ATTRS = ("ToCameraWorkCommand", "CameraWorkStatus",
+                  "FromCameraWorkCommand", "RealSenseObstacleSignal")
+
+
+class PLCStateCache:
+    """ADS notification 狀態快取"""
+
+    def __init__(self, symbols: Dict[str, str] = None, wake_attrs=PLC_WAKE_ATTRS, logger=None,
+                 retry_min=1.0, retry_max=30.0):
+        self.symbols = dict(symbols or PLC_NOTIFY_SYMBOLS)  # {屬性: 變數名稱}
+        self.wake_attrs = set(wake_attrs)
+        self.attrs = {name: attr for attr, name in self.symbols.items()}
+        self.logger = logger
+
+        self.lock = Lock()
+        self.changed = Event()  # 任一變數變化
+        self.values: Dict[str, object] = {}
+        self.update_time: Dict[str, float] = {}  # 最後更新時間(time.monotonic)
+        self.write_time: Dict[str, float] = {}  # 最後本地寫入時間(time.monotonic)
+        self.listeners = []  # callback(attr, value)
+
+        self.client = None  # 已訂閱的 ADS 連線
+        self.ads_symbols = []  # pyads AdsSymbol
+        # 訂閱失敗重試 (指數退避，重新連線後立即重試)
+        self.retry_min = retry_min  # 第一次重試間隔(秒)
+        self.retry_max = retry_max  # 最長重試間隔(秒)
+        self.retry_delay = retry_min
+        self.retry_client = None  # 訂閱失敗的 ADS 連線
+        self.next_retry = 0.0  # 下次可重試時間(time.monotonic)
+        self.subscribe_fail_cnt = 0
+        self.notify_cnt = 0  # 收到 notification 次數
+        self.poll_fix_cnt = 0  # 輪詢發現 notification 未更新的次數
+
+    # ---------- 訂閱 ----------
+    def is_subscribed(self, client) -> bool:
+        """是否已在此連線訂閱"""
+        return self.client is not None and self.client is client
+
+    def need_subscribe(self, client) -> bool:
+        """
+        是否需要 (重新) 訂閱：
+            同一連線訂閱失敗後依指數退避等待，新連線 (重新連線) 立即重試
+        """
+        if self.is_subscribed(client):
+            return False
+        if client is not self.retry_client:
+            self.retry_client = None
+            self.retry_delay = self.retry_min
+            return True
+        return time.monotonic() >= self.next_retry
+
+    def subscribe(self, client) -> bool:
+        """訂閱所有變數的 on-change notification"""
+        self.unsubscribe()
+        ads_symbols = []
+        try:
+            for attr, name in self.symbols.items():
+                symbol = client.get_symbol(name)
+                symbol.add_device_notification(self._make_callback(
+                    client, attr, symbol.plc_type))
+                ads_symbols.append(symbol)
+        except Exception as e:
+            self._log_error(f"subscribe plc notification failed, error:{e}")
+            for symbol in ads_symbols:
+                self._clear(symbol)
+            self.subscribe_fail_cnt += 1
+            self.retry_client = client
+            self.next_retry = time.monotonic() + self.retry_delay
+            self._log_error(f"retry subscribe in {self.retry_delay:.0f}s")
+            self.retry_delay = min(self.retry_max, self.retry_delay * 2)
+            return False
+        self.client = client
+        self.ads_symbols = ads_symbols
+        self.retry_client = None
+        self.retry_delay = self.retry_min
+        return True
+
+    def unsubscribe(self):
+        """取消訂閱"""
+        for symbol in self.ads_symbols:
+            self._clear(symbol)
+        self.ads_symbols = []
+        self.client = None
+
+    def _clear(self, symbol):
+        try:
+            symbol.clear_device_notifications()
+        except Exception as e:
+            self._log_error(f"clear plc notification failed, error:{e}")
+
+    def _make_callback(self, client, attr: str, plc_type):
+        def callback(notification, data_name):
+            try:
+                _, _, value = client.parse_notification(notification, plc_type)
+            except Exception as e:
+                self._log_error(f"parse notification failed, {data_name}, error:{e}")
+                return
+            self.notify_cnt += 1
+            self.set(attr, value)
+        return callback
+
+    # ---------- 讀寫 ----------
+    def get(self, attr: str, default=None):
+        with self.lock:
+            return self.values.get(attr, default)
+
+    def set(self, attr: str, value):
+        """更新數值，wake_attrs 內的變數變化時喚醒 dispatcher"""
+        with self.lock:
+            changed = self.values.get(attr) != value or attr not in self.values
+            self.values[attr] = value
+            self.update_time[attr] = time.monotonic()
+        if changed:
+            self._notify(attr, value)
+
+    def set_written(self, attr: str, value):
+        """本地寫入 PLC 成功後更新數值，避免 notification 到達前讀到舊值"""
+        with self.lock:
+            self.write_time[attr] = time.monotonic()
+        self.set(attr, value)
+
+    def update_from_poll(self, values: Dict[str, object], read_start: float):
+        """
+        輪詢結果寫入快取 (watchdog)：
+            read_start 之後有本地寫入的變數不更新，避免舊值覆蓋
+        """
+        for attr, value in values.items():
+            if attr not in self.symbols:
+                continue
+            with self.lock:
+                if self.write_time.get(attr, 0.0) > read_start:
+                    continue
+                stale = attr in self.values and self.values[attr] != value
+            if stale and self.client is not None:
+                self.poll_fix_cnt += 1
+            self.set(attr, value)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待變數變化，回傳是否有變化"""
+        changed = self.changed.wait(timeout)
+        self.changed.clear()
+        return changed
+
+    def wake(self):
+        """喚醒 dispatcher"""
+        self.changed.set()
+
+    def add_listener(self, callback: Callable):
+        """變數變化時呼叫 callback(attr, value)"""
+        self.listeners.append(callback)
+
+    def _notify(self, attr: str, value):
+        for callback in self.listeners:
+            try:
+                callback(attr, value)
+            except Exception as e:
+                self._log_error(f"state listener failed, attr:{attr}, error:{e}")
+        if attr in self.wake_attrs:
+            self.changed.set()
+
+    def _log_error(self, message: str):
+        if self.logger is not None:
+            self.logger.error(message)
@@ -0,0 +1,137 @@
+"""
+PLC 拍照任務狀態機：
+    ToCameraWorkCommand -> 任務類型 對照表，
+    依 (ToCameraWorkCommand, CameraWorkStatus, FromCameraWorkCommand) 執行
+    start / wait / complete / NG / reset 轉換，
+    CameraWorkStatus 與 FromCameraWorkCommand 以一次 ADS sum-write 寫入。
+"""
+from typing import Callable, Dict
+
+
+# ToCameraWorkCommand: 任務類型 (TaskDispatcher task type)
+PLC_TASK_TABLE = {
+    7: "designated",
+    8: "ir",
+    9: "target",
+    10: "panorama",
+    11: "video",
+    12: "initial",
+}
+
+# CameraWorkStatus
+STATUS_IDLE = 0  # 閒置 / 任務完成
+STATUS_RUNNING = 1  # 任務執行中
+STATUS_NG = 2  # 任務啟動失敗
+
+CAMERA_WORK_STATUS = "GVL.CameraWorkStatus"
+FROM_CAMERA_WORK_COMMAND = "GVL.FromCameraWorkCommand"
+
+
+def sum_write(client, values: Dict[str, object]):
+    """
+    以一次 ADS sum-write 寫入多個變數，
+    PLC 不支援 sum-write 時，改為逐一寫入，失敗時拋出例外
+    """
+    if len(values) == 1:
+        name, value = next(iter(values.items()))
+        client.write_by_name(name, value)
+        return
+    try:
+        result = client.write_list_by_name(values)
+    except Exception:
+        for name, value in values.items():
+            client.write_by_name(name, value)
+        return
+    errors = {name: error for name, error in (result or {}).items()
+              if error != "no error"}
+    if errors:
+        raise RuntimeError(f"sum-write failed, errors:{errors}")
+
+
+class PLCTaskStateMachine:
+    """PLC 拍照任務狀態機"""
+
+    def __init__(self, start_task: Callable, is_running: Callable, write: Callable,
+                 task_table: Dict[int, str] = None, logger=None):
+        """
+        start_task(task_type) -> (ret, response)，response 為 {"status", "message"}
+        is_running(task_type) -> bool
+        write(client, {變數名稱: 數值})，失敗時拋出例外
+        """
+        self.start_task = start_task
+        self.is_running = is_running
+        self.write = write
+        self.task_table = dict(task_table or PLC_TASK_TABLE)
+        self.logger = logger
+
+    def step(self, client, to_command, status, from_command) -> bool:
+        """執行一次狀態轉換，PLC 寫入失敗時回傳 False"""
+        task_type = self.task_table.get(to_command)
+
+        if task_type is not None:
+            if status == STATUS_IDLE and from_command == 0:
+                return self._start(client, to_command, task_type)
+            if status == STATUS_RUNNING:
+                return self._wait(client, task_type)
+            return True
+
+        if to_command == 0:  # completed task / no task
+            if status == STATUS_IDLE:
+                if from_command != 0:
+                    self._debug("complete the task, write FromCameraWorkCommand = 0")
+                    return self._write(client, {FROM_CAMERA_WORK_COMMAND: 0})
+                return True
+            # CameraWorkStatus = 1, 2
+            self._error("abnormal case, reset status")
+            return self._write(client, {CAMERA_WORK_STATUS: STATUS_IDLE,
+                                        FROM_CAMERA_WORK_COMMAND: 0})
+        return True
+
+    def _start(self, client, to_command, task_type) -> bool:
+        """start -> running / NG"""
+        self._debug(
+            f"start {task_type} task, write FromCameraWorkCommand = {to_command}, and write CameraWorkStatus = 1")
+        ret, response = self.start_task(task_type)
+        self._debug(f"request result----ret:{ret}, response:{response}")
+
+        if not ret or not isinstance(response, dict):
+            reason = "request failed"
+        elif "status" not in response or "message" not in response:
+            reason = "type failed"
+        elif not response.get("status"):
+            reason = "status failed"
+        else:
+            success = self._write(client, {CAMERA_WORK_STATUS: STATUS_RUNNING,
+                                           FROM_CAMERA_WORK_COMMAND: to_command})
+            if success:
+                self._debug(f"start {task_type} task successfully!")
+            return success
+
+        self._error(
+            f"{reason}, write CameraWorkStatus = 2, FromCameraCommand = {to_command}")
+        return self._write(client, {CAMERA_WORK_STATUS: STATUS_NG,
+                                    FROM_CAMERA_WORK_COMMAND: to_command})
+
+    def _wait(self, client, task_type) -> bool:
+        """running -> complete"""
+        if self.is_running(task_type):
+            self._debug(f"waiting for {task_type} task completed!")
+            return True
+        self._debug(f"{task_type} task completed, write CameraWorkStatus = 0")
+        return self._write(client, {CAMERA_WORK_STATUS: STATUS_IDLE})
+
+    def _write(self, client, values) -> bool:
+        try:
+            self.write(client, values)
+        except Exception as e:
+            self._error(f"write plc failed, values:{values}, error:{e}")
+            return False
+        return True
+
+    def _debug(self, message: str):
+        if self.logger is not None:
+            self.logger.debug(message)
+
+    def _error(self, message: str):
+        if self.logger is not None:
+            self.logger.error(message)
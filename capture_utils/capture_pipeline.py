@@ -0,0 +1,102 @@
+"""
+拍攝存檔管線：
+    拍攝迴圈取得影像後即交由 worker 執行 JPEG 編碼與寫檔，
+    PTZ 可立即移動至下一個拍攝點；
+    未完成的存檔數量有上限 (backpressure)，避免影像堆積佔用記憶體。
+"""
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from threading import BoundedSemaphore, Lock
+from typing import Callable, Dict, List, Optional
+
+import cv2
+
+
+class CapturePipeline:
+    """影像存檔管線"""
+
+    def __init__(self, workers=2, max_pending=4, logger=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix="capture")
+        self.slots = BoundedSemaphore(max_pending)  # 未完成存檔上限
+        self.logger = logger
+        self.lock = Lock()
+        self.pending: Dict[str, Future] = {}  # filename -> future
+
+        # 統計
+        self.saved_cnt = 0
+        self.failed_cnt = 0
+        self.block_time = 0.0  # 拍攝迴圈等待空位總時間(秒)
+        self.write_time_max = 0.0  # 最長存檔時間(秒)
+
+    def is_pending(self, filename: str) -> bool:
+        with self.lock:
+            return filename in self.pending
+
+    def submit(self, filename: str, img, on_saved: Optional[Callable] = None) -> Future:
+        """送出存檔，未完成數量達上限時等待；存檔成功後呼叫 on_saved(filename)"""
+        start = time.monotonic()
+        self.slots.acquire()
+        blocked = time.monotonic() - start
+        with self.lock:
+            self.block_time += blocked
+        try:
+            future = self.executor.submit(self._write, filename, img)
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.pending[filename] = future
+        future.add_done_callback(lambda f: self._done(filename, f, on_saved))
+        return future
+
+    def wait(self, futures: List[Future], timeout=None) -> int:
+        """等待存檔完成，回傳失敗數量"""
+        done, not_done = wait(futures, timeout=timeout)
+        failed = len(not_done)
+        for future in done:
+            if future.exception() is not None or not future.result():
+                failed += 1
+        return failed
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "pending": len(self.pending),
+                "saved_cnt": self.saved_cnt,
+                "failed_cnt": self.failed_cnt,
+                "block_time": round(self.block_time, 3),
+                "write_time_max": round(self.write_time_max, 3),
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def _write(self, filename: str, img) -> bool:
+        start = time.monotonic()
+        ret = cv2.imwrite(filename, img)
+        elapsed = time.monotonic() - start
+        with self.lock:
+            self.write_time_max = max(self.write_time_max, elapsed)
+        if not ret and self.logger is not None:
+            self.logger.error(f"save img failed, filename:{filename}")
+        return ret
+
+    def _done(self, filename: str, future: Future, on_saved: Optional[Callable] = None):
+        self.slots.release()
+        ok = future.exception() is None and future.result()
+        if future.exception() is not None and self.logger is not None:
+            self.logger.error(
+                f"save img failed, filename:{filename}, error:{future.exception()}")
+        with self.lock:
+            self.pending.pop(filename, None)
+            if ok:
+                self.saved_cnt += 1
+            else:
+                self.failed_cnt += 1
+        if ok and on_saved is not None:
+            try:
+                on_saved(filename)
+            except Exception as e:
+                if self.logger is not None:
+                    self.logger.error(f"save img callback failed, filename:{filename}, error:{e}")
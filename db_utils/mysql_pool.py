@@ -0,0 +1,177 @@
+"""
+MySQL 連線池 (pymysql)：
+    多執行緒 (Flask handler、上傳佇列) 各自取得連線，不共用同一條連線；
+    閒置超過 ping_interval 的連線使用前先 ping 確認，失效的連線直接捨棄重建。
+    介面與 clsMySqlDB 相容 (Open、Close、IsOpen、ReOpen、SelectRowsByTuple、UpdateRowsByTuple)，
+    另提供 ExecuteMany 批次寫入。
+"""
+import time
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+from threading import Lock
+
+import pymysql
+
+
+class MySQLPool:
+    """MySQL 連線池"""
+
+    def __init__(self, host: str, user: str, password: str, database: str, port=3306,
+                 size=4, ping_interval=30.0, connect_timeout=5, logger=None):
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.port = port
+        self.size = size  # 最大連線數
+        self.ping_interval = ping_interval  # 閒置超過此時間使用前先 ping(秒)
+        self.connect_timeout = connect_timeout
+        self.logger = logger
+        self.idle = LifoQueue()  # (connection, last_used)
+        self.lock = Lock()
+        self.total = 0  # 已建立連線數 (含使用中)
+        self.opened = False
+
+        # 統計
+        self.connect_cnt = 0
+        self.error_cnt = 0
+
+    def Open(self) -> bool:
+        """開啟連線池並確認可連線"""
+        self.opened = True
+        return self.IsOpen()
+
+    def Close(self):
+        """關閉閒置連線"""
+        self.opened = False
+        self._close_idle()
+
+    def ReOpen(self) -> bool:
+        self._close_idle()
+        return self.Open()
+
+    def IsOpen(self) -> bool:
+        """健康檢查：取得連線並 ping"""
+        if not self.opened:
+            return False
+        try:
+            with self.connection(ping=True):
+                pass
+        except Exception as e:
+            self._error(f"mysql health check failed, error:{e}")
+            return False
+        return True
+
+    @contextmanager
+    def connection(self, ping=False, timeout=10.0):
+        """取得連線，發生例外時捨棄該連線"""
+        conn, last_used = self._acquire(timeout)
+        try:
+            if ping or time.monotonic() - last_used > self.ping_interval:
+                conn.ping(reconnect=True)
+            yield conn
+        except Exception:
+            with self.lock:
+                self.error_cnt += 1
+            self._discard(conn)
+            raise
+        else:
+            self.idle.put((conn, time.monotonic()))
+
+    def SelectRowsByTuple(self, query: str, data=None, raise_error=False) -> list:
+        """查詢，失敗時回傳空 list (raise_error 時拋出例外)"""
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, data)
+                    rows = list(cursor.fetchall())
+                conn.commit()  # 結束交易，下次查詢可讀到最新資料
+                return rows
+        except Exception as e:
+            self._error(f"mysql select failed, error:{e}")
+            if raise_error:
+                raise
+            return []
+
+    def UpdateRowsByTuple(self, query: str, data=None) -> bool:
+        """寫入單筆"""
+        return self.ExecuteMany(query, [data])
+
+    def ExecuteMany(self, query: str, rows: list) -> bool:
+        """批次寫入 (同一交易)，insert ... values 會合併為一次傳送"""
+        if not rows:
+            return True
+        try:
+            with self.connection() as conn:
+                try:
+                    with conn.cursor() as cursor:
+                        if len(rows) == 1:
+                            cursor.execute(query, rows[0])
+                        else:
+                            cursor.executemany(query, rows)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            self._error(f"mysql execute failed, rows:{len(rows)}, error:{e}")
+            return False
+        return True
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "opened": self.opened,
+                "total": self.total,
+                "idle": self.idle.qsize(),
+                "connect_cnt": self.connect_cnt,
+                "error_cnt": self.error_cnt,
+            }
+
+    def _acquire(self, timeout: float):
+        try:
+            return self.idle.get_nowait()
+        except Empty:
+            pass
+        with self.lock:
+            create = self.total < self.size
+            if create:
+                self.total += 1
+        if not create:
+            # 已達上限，等待其他執行緒歸還
+            try:
+                return self.idle.get(timeout=timeout)
+            except Empty:
+                raise TimeoutError("no mysql connection available")
+        try:
+            conn = pymysql.connect(host=self.host, port=self.port, user=self.user,
+                                   password=self.password, database=self.database,
+                                   charset="utf8mb4", connect_timeout=self.connect_timeout,
+                                   autocommit=False)
+        except Exception:
+            with self.lock:
+                self.total -= 1
+            raise
+        with self.lock:
+            self.connect_cnt += 1
+        return conn, time.monotonic()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.lock:
+            self.total -= 1
+
+    def _close_idle(self):
+        while True:
+            try:
+                conn, _ = self.idle.get_nowait()
+            except Empty:
+                break
+            self._discard(conn)
+
+    def _error(self, message: str):
+        if self.logger is not None:
+            self.logger.error(message)
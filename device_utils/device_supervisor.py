@@ -0,0 +1,130 @@
+"""
+裝置監控：
+    每個裝置 (PTZ camera、front camera、IR camera、MySQL ...) 以獨立執行緒檢查連線，
+    斷線時以指數退避 (exponential backoff) 重新連線，
+    避免裝置重連阻塞 ADS 控制迴圈 (心跳、位置讀取)。
+"""
+import time
+from threading import Event, Thread
+from typing import Callable, Dict, Optional
+
+
+class SupervisedDevice:
+    """受監控裝置"""
+
+    def __init__(self, name: str, is_alive: Callable, reconnect: Callable,
+                 poll: Optional[Callable] = None, interval=1.0, base_delay=1.0, max_delay=60.0):
+        self.name = name
+        self.is_alive = is_alive  # is_alive() -> bool
+        self.reconnect = reconnect  # reconnect()，失敗時回傳 False 或拋出例外
+        self.poll = poll  # 連線正常時，每 interval 秒執行一次
+        self.interval = interval  # 檢查週期(秒)
+        self.base_delay = base_delay  # 第一次重連等待(秒)
+        self.max_delay = max_delay  # 最長重連等待(秒)
+
+        self.alive = None
+        self.failures = 0  # 連續重連失敗次數
+        self.reconnect_cnt = 0  # 重連總次數
+        self.next_retry = 0.0  # 下次可重連時間(time.monotonic)
+        self.last_error = ""
+        self.thread = Thread()
+
+    def backoff_delay(self) -> float:
+        """目前的重連等待時間"""
+        if self.failures <= 0:
+            return 0.0
+        return min(self.max_delay, self.base_delay * (2 ** (self.failures - 1)))
+
+    def get_status(self) -> dict:
+        return {
+            "alive": self.alive,
+            "failures": self.failures,
+            "reconnect_cnt": self.reconnect_cnt,
+            "retry_in": max(0.0, round(self.next_retry - time.monotonic(), 1)),
+            "last_error": self.last_error,
+        }
+
+
+class DeviceSupervisor:
+    """裝置監控"""
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.devices: Dict[str, SupervisedDevice] = {}
+        self.stop_event = Event()
+
+    def add_device(self, name: str, is_alive: Callable, reconnect: Callable,
+                   poll: Optional[Callable] = None, **kwargs) -> SupervisedDevice:
+        """加入監控裝置，kwargs: interval, base_delay, max_delay"""
+        device = SupervisedDevice(name, is_alive, reconnect, poll, **kwargs)
+        self.devices[name] = device
+        return device
+
+    def start(self):
+        """開始監控"""
+        self.stop_event.clear()
+        for device in self.devices.values():
+            if not device.thread.is_alive():
+                device.thread = Thread(target=self._supervise, args=(device,),
+                                       name=f"supervisor-{device.name}", daemon=True)
+                device.thread.start()
+
+    def stop(self):
+        """停止監控"""
+        self.stop_event.set()
+
+    def get_status(self) -> dict:
+        return {name: device.get_status() for name, device in self.devices.items()}
+
+    def _supervise(self, device: SupervisedDevice):
+        while not self.stop_event.is_set():
+            self._check(device)
+            self.stop_event.wait(device.interval)
+
+    def _check(self, device: SupervisedDevice):
+        try:
+            alive = bool(device.is_alive())
+        except Exception as e:
+            alive = False
+            device.last_error = str(e)
+
+        if alive:
+            if device.alive is False:
+                self._info(f"{device.name} reconnected!")
+            device.alive = True
+            device.failures = 0
+            device.next_retry = 0.0
+            if device.poll is not None:
+                try:
+                    device.poll()
+                except Exception as e:
+                    device.last_error = str(e)
+                    self._error(f"{device.name} poll failed, error:{e}")
+            return
+
+        device.alive = False
+        now = time.monotonic()
+        if now < device.next_retry:
+            return
+
+        self._error(f"{device.name} is not running, reconnect!")
+        device.reconnect_cnt += 1
+        try:
+            ret = device.reconnect()
+        except Exception as e:
+            ret = False
+            device.last_error = str(e)
+        # 下一次檢查確認是否恢復，仍未連線時等待時間加倍
+        device.failures += 1
+        device.next_retry = time.monotonic() + device.backoff_delay()
+        if ret is False:
+            self._error(
+                f"{device.name} reconnect failed, failures:{device.failures}, retry in {device.backoff_delay():.0f}s")
+
+    def _info(self, message: str):
+        if self.logger is not None:
+            self.logger.info(message)
+
+    def _error(self, message: str):
+        if self.logger is not None:
+            self.logger.error(message)
@@ -2,12 +2,11 @@ import os
 import logging
 import time
 from datetime import datetime
-from typing import Iterable
 from queue import Queue
-from threading import Thread
+from threading import Lock, Thread
 from concurrent.futures.thread import ThreadPoolExecutor
 from base64 import b64encode
-from flask import (Flask, jsonify, render_template, request, Response)
+from flask import (Flask, jsonify, render_template, request, Response, send_from_directory)
 import cv2
 # import numpy as np
 import requests
@@ -17,11 +16,35 @@ from camera.onvif_camera import clsONVIFCamera
 from IR_cam.FLIR_A400 import FLIRA400
 from Sockets.ftp_utils import MyFTP
 from Sockets.ADS import ADSClient
-from file_utils.operate_file import (write_file, read_lines)
+from ads_utils.gvl_snapshot import GVLSnapshotReader
+from ads_utils.state_cache import PLCStateCache
+from ads_utils.task_state_machine import (PLCTaskStateMachine, sum_write)
+from ads_utils.plc_scheduler import FixedRateScheduler
+from task_utils.task_dispatch import TaskDispatcher
+from device_utils.device_supervisor import DeviceSupervisor
+from ptz_utils.arrival import PTZArrivalDetector
+from ptz_utils.shot_planner import ShotPlanner
+from ptz_utils.pose_convert import (target_bearing, bearing_to_pan,
+                                    angles_to_ptz, ptz_to_angles)
+from capture_utils.capture_pipeline import CapturePipeline
+from stream_utils.frame_slot import FrameSlot
+from stream_utils.mjpeg_broadcaster import (MJPEGBroadcaster, StreamOptions)
+from stream_utils.snapshot_cache import SnapshotCache
+from stitch_utils.incremental_stitcher import IncrementalStitcher
+from stitch_utils.stitch_service import StitchService
+from stitch_utils.tile_pyramid import (DZI_NAME, PREVIEW_NAME, read_pyramid_info)
+from stitch_utils.stitch_worker import write_registration
+from upload_utils.ftp_pool import FTPSessionPool
+from upload_utils.upload_manifest import UploadManifest
+from upload_utils.parallel_uploader import ParallelUploader
+from upload_utils.upload_queue import (UploadQueue, STATE_CAPTURING, STATE_PENDING, STATE_STITCHING,
+                                       KIND_STITCH, KIND_TASK)
+from task_utils.task_journal import (write_journal, read_journal, write_info, load_task_record)
+from task_utils.image_store import ImageStore
+from task_utils.plan_cache import PlanCache
 from config_utils.config_utils import ClsConfigParser
-from DB.clsMySqlDB import clsMySqlDB
+from db_utils.mysql_pool import MySQLPool
 from Logger.LogWriter import LogWriter
-from panorama.panorama import (stitch, crop, add_black_margin)
 
 
 class AMR(ADSClient):
@@ -51,8 +74,6 @@ class AMR(ADSClient):
         # 替身網頁控制心跳
         self.ManualSemiControlHartBit = None
         self.web_control_counter = 0
-        self.web_control_thread = Thread(target=self.web_control_heartbeat)
-        self.web_control_thread.start()
         # 替身任務 flag, 前進、後退、左轉、右轉控制
         self.ManualSemiControlEnable = None  # 0或1，執行替身任務時為1，放開為0
         self.ManualSemiControlForwardButton = None  # 0或1，前進時為1，放開為0
@@ -70,127 +91,87 @@ class AMR(ADSClient):
         self.RealSenseObstacleSignal = None  # 此次訊號
         self.obstacle_thread = Thread()  # obstacle thread
 
+        # 任務分派 (TaskDispatcher)
+        self.task_dispatcher = None
+        # PLC 拍照任務狀態機
+        self.task_state_machine = PLCTaskStateMachine(
+            self.do_tasks, self.is_task_running, self.write_plc, logger=self.logger)
+
+        # GVL 批次讀取
+        self.gvl_reader = GVLSnapshotReader(logger=self.logger)
+        self.gvl_snapshot = None  # 最近一次讀取結果
+
+        # PLC 狀態快取 (ADS notification)，變化時喚醒 dispatcher
+        self.state_cache = PLCStateCache(logger=self.logger)
+        self.state_cache.add_listener(self.on_plc_state_changed)
+        self.dispatch_watchdog = 0.5  # GVL 輪詢 (watchdog) 與 dispatcher 執行週期(秒)
+        self.dispatch_thread = Thread(target=self.dispatch_loop, daemon=True)
+        self.dispatch_thread.start()
+
+        # PLC 週期性工作 (心跳、GVL 輪詢 watchdog)，固定時間格點執行
+        self.heartbeat_period = 0.2  # bFromExternalDeviceHartBit 切換週期(秒)
+        self.heartbeat_ok = True  # 最近一次心跳寫入是否成功
+        # GVL 輪詢超過 heartbeat_stale_periods 個週期未成功，停止切換心跳，讓 PLC 判定異常
+        self.heartbeat_stale_periods = 4
+        self.heartbeat_paused = False
+        self.last_snapshot_ok = None  # 最近一次 GVL 輪詢成功時間(time.monotonic)
+        self.scheduler = FixedRateScheduler(self.logger)
+        self.scheduler.add_job("heartbeat", self.heartbeat_period,
+                               self.amr_heartbeat)
+        self.scheduler.add_job("web_control_heartbeat", 0.5,
+                               self.web_control_heartbeat, offset=0.05)
+        self.scheduler.add_job("gvl_poll", self.dispatch_watchdog,
+                               self.poll_plc_state, offset=0.1)
+        self.scheduler.start()
+
+    def on_plc_state_changed(self, attr, value):
+        """ADS notification 更新 AMR 位置"""
+        if attr == "pos_x":
+            self.amr_pos_x = value
+        elif attr == "pos_y":
+            self.amr_pos_y = value
+        elif attr == "pos_theta":
+            self.amr_pos_theta = value // 1000  # 取整數
+
     def do_routine_job(self, client):
         """??AMR??"""
 
         success = True
 
-        # ----------相機資源連結----------
-        # check rtsp
-        if not self.camera.is_running():  # ptz camera
-            self.logger.error("camera is not running , restart camera!")
-            self.camera.close_camera()
-            self.camera.open_camera(True)
-            time.sleep(1)
-        if not self.camera.front_camera.is_running():  # front camera
-            self.logger.error("front camera is not running , restart camera!")
-            self.camera.front_camera.close_camera()
-            self.camera.front_camera.open_camera(True)
-            time.sleep(1)
-        if not self.camera.ir_cam.is_running:  # ir cam
-            self.camera.ir_cam.close_camera()
-            self.camera.ir_cam = FLIRA400()
-            self.camera.ir_cam.open_camera()
-            time.sleep(1)
-
-        # ----------MySQL 資源連結----------
-        # check mysql conn
-        if not self.camera.mysql_conn.IsOpen():
-            self.logger.error("mysql is not connected, reconnect to mysql")
-            self.camera.mysql_conn.Close()
-            self.camera.mysql_conn.Open()
-
-        # get PTZ status
-        ptz_status = self.camera.onvif.get_ptz_status()
-        pan, tilt, zoom = ptz_status.get("pan"), \
-            ptz_status.get("tilt"), \
-            ptz_status.get("zoom")
-        if isinstance(pan, float) and isinstance(tilt, float) and isinstance(zoom, float):
-            self.camera.crr_pan, self.camera.crr_tilt, self.camera.crr_zoom = calculate_ptz_angle([
-                                                                                                  pan, tilt, zoom])
-
-        # amr heart beat
-        try:
-            client.write_by_name(
-                "GVL.ExternalDevice1.bFromExternalDeviceHartBit", self.heart_bit)
-        except:
+        # 相機、MySQL 連線與 PTZ 狀態由 DeviceSupervisor 監控
+
+        # amr heart beat (scheduler 固定週期寫入)
+        if not self.heartbeat_ok:
             self.logger.error("write heart beat failed!")
             success = False
             return success
-        finally:
-            if self.heart_bit == 1:
-                self.heart_bit = 0
-            else:
-                self.heart_bit = 1
 
-        # 拍照任務
-        try:
-            pos_x = client.read_by_name("GVL.nCar_PositionX")
-            pos_y = client.read_by_name("GVL.nCar_PositionY")
-            pos_z = client.read_by_name("GVL.nCarLiftHeight")
-            pos_theta = client.read_by_name("GVL.nCar_PositionYaw")
-            tag_id = client.read_by_name("GVL.nCar_PositionTagID")
-            CameraWorkStatus = client.read_by_name(
-                "GVL.CameraWorkStatus")  # camera status
-            ToCameraWorkCommand = client.read_by_name(
-                "GVL.ToCameraWorkCommand")
-            FromCameraWorkCommand = client.read_by_name(
-                "GVL.FromCameraWorkCommand")
-        except Exception as e:
-            self.logger.error(f"read amr data failed, error:{e}")
+        # GVL 由 scheduler 週期讀取 (poll_plc_state)，此處只回報最近一次結果
+        snapshot = self.gvl_snapshot
+        if snapshot is None or not snapshot.required_ok:
+            self.logger.error(
+                f"read amr data failed, error:{None if snapshot is None else snapshot.errors}")
             success = False
             return success
-        else:
-            # update amr information
-            self.amr_pos_x = pos_x
-            self.amr_pos_y = pos_y
-            self.amr_pos_z = pos_z
-            self.amr_tag_id = tag_id
-            self.amr_pos_theta = pos_theta // 1000  # 取整數
-
-        # 替身任務
-        try:
-            ManualSemiControlDisableStatus = client.read_by_name(
-                "GVL.bWeb_ManualSemiControlDisableStatus")
-            AutoManualStatus = client.read_by_name("GVL.bWeb_AutoManualStatus")
-            AutoManualSwitch = client.read_by_name("GVL.bWeb_AutoManualSwitch")
-            bWeb_bBeckhoff_IPC_HartBitStatus = client.read_by_name("GVL.bWeb_bBeckhoff_IPC_HartBitStatus")
-            ManualJoyControlEnable = client.read_by_name(
-                "GVL.bWeb_ManualJoyControlEnable")  # 是否可切換替身模式
-            ManualJoyDirection = client.read_by_name(
-                "GVL.bWeb_ManualJoyDirection")  # 替身模式方向
-            ManualJoyStrength = client.read_by_name(
-                "GVL.bWeb_ManualJoyStrength")  # 替身模式強度
-        except Exception as e:
-            self.logger.error(f"read manual function failed, error:{e}")
-            # success = False
-            # return success
-        else:
-            # 替身任務狀態
-            self.bWeb_bBeckhoff_IPC_HartBitStatus = bWeb_bBeckhoff_IPC_HartBitStatus
-            self.ManualSemiControlDisableStatus = ManualSemiControlDisableStatus
-            self.AutoManualStatus = AutoManualStatus
-            self.AutoManualSwitch = AutoManualSwitch
-            # 搖桿控制
-            self.ManualJoyControlEnable = ManualJoyControlEnable  # 可否切換替身模式
-            self.ManualJoyDirection = ManualJoyDirection  # 替身模式方向
-            self.ManualJoyStrength = ManualJoyStrength  # 替身模式強度
-
-        # IUMOBO 障礙物偵測
-        try:
-            RealSenseObstacleSignal = client.read_by_name(
-                "GVL.bWeb_RealSenseObstacleSignal")
-        except Exception as e:
+        if not self.is_plc_state_fresh():
+            self.logger.error("gvl poll is stale, heart beat paused!")
+            success = False
+            return success
+        pos_z, tag_id = snapshot.pos_z, snapshot.tag_id
+        CameraWorkStatus = snapshot.CameraWorkStatus  # camera status
+        ToCameraWorkCommand = snapshot.ToCameraWorkCommand
+        FromCameraWorkCommand = snapshot.FromCameraWorkCommand
+        if not snapshot.manual_ok:
             self.logger.error(
-                f"read iumobo obstacle signal failed!, error:{e}")
-            # success = False
-            # return success
-        else:
-            # IUMOBO 障礙物偵測
-            self.RealSenseObstacleSignal = RealSenseObstacleSignal
+                f"read manual function failed, error:{snapshot.errors}")
+        if not snapshot.has("RealSenseObstacleSignal"):
+            self.logger.error(
+                f"read iumobo obstacle signal failed!, error:{snapshot.errors.get('RealSenseObstacleSignal')}")
 
         # report status
         self.logger.info(f"heart beat:{self.heart_bit}")
+        self.logger.info(
+            f"gvl read time:{snapshot.read_time * 1000:.1f}ms, batched:{snapshot.batched}")
         self.logger.info(
             f"FromCameraWorkCommand:{FromCameraWorkCommand}, ToCameraWorkCommand:{ToCameraWorkCommand}, CameraWorkStatus:{CameraWorkStatus}")
         self.logger.info(
@@ -235,629 +216,140 @@ class AMR(ADSClient):
         #         self.mode_change = ""
         #         self.logger("change to auto mode successfully!")
 
-        # IUMOBO 障礙物偵測工作
-        if self.RealSenseObstacleSignal == True and self.LastRealSenseObstacleSignal == False:
-            # download and upload obstacle imgs
-            self.obstacle_thread = Thread(
-                target=self.download_and_upload_obstacle_imgs)
-            self.obstacle_thread.start()
-
-        # tasks
-        if ToCameraWorkCommand == 7:  # designated task
-
-            if CameraWorkStatus == 0:
-
-                if FromCameraWorkCommand == 0:
-
-                    ################ start designated task ################
-                    self.logger.debug(
-                        "start designated task, write FromCameraWorkCommand = 7, and write CameraWorkStatus = 1")
-
-                    camera.designated_task.is_running = True  # change status
-
-                    url = "http://127.0.0.1:8080/designated/start_designated_task"
-                    ret, response = self.do_tasks(url)
-                    self.logger.debug(
-                        f"request result----ret:{ret}, response:{response}")
-                    if ret and isinstance(response, Iterable):
-                        if "status" in response and "message" in response:
-                            if response.get("status"):
-
-                                # PLC OK
-                                try:
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 1)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                                else:
-                                    self.logger.debug(
-                                        "start designated task successfully!")
-                            else:
-
-                                # status failed
-                                self.logger.error(
-                                    "status failed, write CameraWorkStatus = 2, FromCameraCommand = 7")
-
-                                # PLC NG
-                                try:
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 2)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                        else:
-
-                            # type failed
-                            self.logger.error(
-                                "type failed, write CameraWorkStatus = 2, FromCameraCommand = 7")
-
-                            # PLC NG
-                            try:
-                                client.write_by_name("GVL.CameraWorkStatus", 2)
-                                client.write_by_name(
-                                    "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                            except:
-                                success = False
-                                return success
-                    else:
-                        # request failed
-                        self.logger.error(
-                            "request failed, write CameraWorkStatus = 2, FromCameraCommand = 7")
-
-                        # PLC NG
-                        try:
-                            client.write_by_name("GVL.CameraWorkStatus", 2)
-                            client.write_by_name(
-                                "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                        except:
-                            success = False
-                            return success
-                    ################ start designated task ################
-
-            elif CameraWorkStatus == 1:
-
-                ################ wait designated task complete ################
-                if not self.camera.designated_task.is_running:
-                    # task completed!
-                    self.logger.debug(
-                        "designated task completed, write CameraWorkStatus = 0")
-                    # PLC D???
-                    try:
-                        client.write_by_name("GVL.CameraWorkStatus", 0)
-                    except:
-                        success = False
-                        return success
-                else:
-                    self.logger.debug("waiting for designated task completed!")
-                ################ wait designated task complete ################
-
-        elif ToCameraWorkCommand == 8:  # IR camera
-
-            if CameraWorkStatus == 0:
-
-                if FromCameraWorkCommand == 0:
-
-                    ################ start ir task ################
-                    self.logger.debug(
-                        "start ir task, write FromCameraWorkCommand = 8, and write CameraWorkStatus = 1")
-
-                    camera.ir_task.is_running = True  # change status
-
-                    url = "http://127.0.0.1:8080/ir/start_ir_task"
-                    ret, response = self.do_tasks(url)
-                    self.logger.debug(
-                        f"request result----ret:{ret}, response:{response}")
-                    if ret and isinstance(response, Iterable):
-                        if "status" in response and "message" in response:
-                            if response.get("status"):
-
-                                # PLC ok
-                                try:
-                                    # CameraWorkStatus????1,?????
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 1)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                                else:
-                                    self.logger.debug(
-                                        "start ir task successfully!")
-                            else:
-
-                                # status failed
-                                self.logger.error(
-                                    "status failed, write CameraWorkStatus = 2, FromCameraCommand = 8")
-
-                                # PLC NG
-                                try:
-                                    # CameraWorkStatus????1,?????
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 2)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                        else:
-
-                            # type failed
-                            self.logger.error(
-                                "type failed, write CameraWorkStatus = 2, FromCameraCommand = 8")
-
-                            # PLC NG
-                            try:
-                                # CameraWorkStatus????1,?????
-                                client.write_by_name("GVL.CameraWorkStatus", 2)
-                                client.write_by_name(
-                                    "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                            except:
-                                success = False
-                                return success
-                    else:
-                        # request failed
-                        self.logger.error(
-                            "request failed, write CameraWorkStatus = 2, FromCameraCommand = 8")
-
-                        # PLC NG
-                        try:
-                            # CameraWorkStatus????1,?????
-                            client.write_by_name("GVL.CameraWorkStatus", 2)
-                            client.write_by_name(
-                                "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                        except:
-                            success = False
-                            return success
-                    ################ start ir task ################
-
-            elif CameraWorkStatus == 1:
-
-                ################ wait ir task complete ################
-                if not self.camera.ir_task.is_running:
-                    # task completed!
-                    self.logger.debug(
-                        "ir task completed, write CameraWorkStatus = 0")
-                    # PLC D???
-                    try:
-                        client.write_by_name("GVL.CameraWorkStatus", 0)
-                    except:
-                        success = False
-                        return success
-                else:
-                    self.logger.debug("waiting for ir task completed!")
-                ################ wait ir task complete ################
-
-        elif ToCameraWorkCommand == 9:  # target task
-
-            if CameraWorkStatus == 0:
-
-                if FromCameraWorkCommand == 0:
-
-                    ################ start target task ################
-                    self.logger.debug(
-                        "start target task, write FromCameraWorkCommand = 9, and write CameraWorkStatus = 1")
-
-                    camera.target_task.is_running = True  # change status
-                    url = "http://127.0.0.1:8080/target/start_target_task"
-                    ret, response = self.do_tasks(url)
-                    self.logger.debug(
-                        f"request result----ret:{ret}, response:{response}")
-                    if ret and isinstance(response, Iterable):
-                        if "status" in response and "message" in response:
-                            if response.get("status"):
-                                # PLC OK
-                                try:
-                                    # CameraWorkStatus 1
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 1)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                                else:
-                                    self.logger.debug(
-                                        "start target task successfully!")
-                            else:
-                                # status failed
-                                self.logger.error(
-                                    "status failed, write CameraWorkStatus = 2, FromCameraCommand = 9")
-
-                                # PLC NG
-                                try:
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 2)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                        else:
-
-                            # type failed
-                            self.logger.error(
-                                "type failed, write CameraWorkStatus = 2, FromCameraCommand = 9")
-
-                            # PLC NG
-                            try:
-                                # CameraWorkStatus????1,?????
-                                client.write_by_name("GVL.CameraWorkStatus", 2)
-                                client.write_by_name(
-                                    "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                            except:
-                                success = False
-                                return success
-                    else:
-                        # request failed
-                        self.logger.error(
-                            "request failed, write CameraWorkStatus = 2, FromCameraCommand = 9")
-
-                        # PLC NG
-                        try:
-                            # CameraWorkStatus????1,?????
-                            client.write_by_name("GVL.CameraWorkStatus", 2)
-                            client.write_by_name(
-                                "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                        except:
-                            success = False
-                            return success
-                    ################ start target task ################
-
-            elif CameraWorkStatus == 1:  # camera working
-
-                ################ wait target task complete ################
-                if not self.camera.target_task.is_running:
-                    # task completed!
-                    self.logger.debug(
-                        "target task completed, write CameraWorkStatus = 0")
-                    try:
-                        # CameraWorkStatus 0, complted
-                        client.write_by_name("GVL.CameraWorkStatus", 0)
-                        # client.write_by_name("GVL.FromCameraWorkCommand", 0)
-                    except:
-                        success = False
-                        return success
-                    else:
-                        pass
-                else:
-                    self.logger.debug("waiting for target task completed!")
-                ################ wait target task complete ################
-
-        elif ToCameraWorkCommand == 10:  # panorama task
+        # 訂閱 ADS notification (連線重建後重新訂閱，失敗時退避重試)
+        if self.state_cache.need_subscribe(client):
+            if self.state_cache.subscribe(client):
+                self.logger.info("subscribe plc notification successfully!")
 
-            if CameraWorkStatus == 0:
-
-                if FromCameraWorkCommand == 0:
-
-                    ################ start panorama task ################
-                    self.logger.debug(
-                        "start panorama task, write FromCameraWorkCommand = 10, and write CameraWorkStatus = 1")
-
-                    camera.panorama_task.is_running = True  # change status
-
-                    url = "http://127.0.0.1:8080/panorama/start_panorama_task"
-                    ret, response = self.do_tasks(url)
-                    self.logger.debug(
-                        f"request result----ret:{ret}, response:{response}")
-                    if ret and isinstance(response, Iterable):
-                        if "status" in response and "message" in response:
-                            if response.get("status"):
-
-                                # PLC D???
-                                try:
-                                    # CameraWorkStatus????1,?????
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 1)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                                else:
-                                    self.logger.debug(
-                                        "start panorama task successfully!")
-                            else:
-
-                                # status failed
-                                self.logger.error(
-                                    "status failed, write CameraWorkStatus = 2, FromCameraCommand = 10")
-
-                                # PLC D??? NG
-                                try:
-                                    # CameraWorkStatus????1,?????
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 2)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                        else:
-
-                            # type failed
-                            self.logger.error(
-                                "type failed, write CameraWorkStatus = 2, FromCameraCommand = 10")
-
-                            # PLC NG
-                            try:
-                                # CameraWorkStatus????1,?????
-                                client.write_by_name("GVL.CameraWorkStatus", 2)
-                                client.write_by_name(
-                                    "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                            except:
-                                success = False
-                                return success
-                    else:
-                        # request failed
-                        self.logger.error(
-                            "request failed, write CameraWorkStatus = 2, FromCameraCommand = 10")
-
-                        # PLC D??? NG
-                        try:
-                            # CameraWorkStatus????1,?????
-                            client.write_by_name("GVL.CameraWorkStatus", 2)
-                            client.write_by_name(
-                                "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                        except:
-                            success = False
-                            return success
-                    ################ start panorama task ################
-
-            elif CameraWorkStatus == 1:
-
-                ################ wait panorama task complete ################
-                if not self.camera.panorama_task.is_running:
-                    # task completed!
-                    self.logger.debug(
-                        "panorama task completed, write CameraWorkStatus = 0")
-                    # PLC D
-                    try:
-                        client.write_by_name("GVL.CameraWorkStatus", 0)
-                    except:
-                        success = False
-                        return success
-                else:
-                    self.logger.debug("waiting for panoramra task completed!")
-                ################ wait panorama task complete ################
-
-        elif ToCameraWorkCommand == 11:  # video task
-
-            if CameraWorkStatus == 0:
-
-                if FromCameraWorkCommand == 0:
-
-                    ################ start video task ################
-                    self.logger.debug(
-                        f"start video task, write FromCameraWorkCommand = {ToCameraWorkCommand}, and write CameraWorkStatus = 1")
-
-                    camera.video_task.is_running = True  # change status
-                    url = "http://127.0.0.1:8080/video/start_video_task"
-                    ret, response = self.do_tasks(url)
-                    self.logger.debug(
-                        f"request result----ret:{ret}, response:{response}")
-                    if ret and isinstance(response, Iterable):
-                        if "status" in response and "message" in response:
-                            if response.get("status"):
-                                # PLC OK
-                                try:
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 1)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                                else:
-                                    self.logger.debug(
-                                        "start video task successfully!")
-                            else:
-                                # status failed
-                                self.logger.error(
-                                    f"status failed, write CameraWorkStatus = 2, FromCameraCommand = {ToCameraWorkCommand}")
-
-                                # PLC NG
-                                try:
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 2)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                        else:
-
-                            # type failed
-                            self.logger.error(
-                                f"type failed, write CameraWorkStatus = 2, FromCameraCommand = {ToCameraWorkCommand}")
-
-                            # PLC NG
-                            try:
-                                client.write_by_name("GVL.CameraWorkStatus", 2)
-                                client.write_by_name(
-                                    "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                            except:
-                                success = False
-                                return success
-                    else:
-                        # request failed
-                        self.logger.error(
-                            f"request failed, write CameraWorkStatus = 2, FromCameraCommand = {ToCameraWorkCommand}")
-
-                        # PLC NG
-                        try:
-                            client.write_by_name("GVL.CameraWorkStatus", 2)
-                            client.write_by_name(
-                                "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                        except:
-                            success = False
-                            return success
-                    ################ start video task ################
-
-            elif CameraWorkStatus == 1:
-
-                ################ wait video task complete ################
-                if not self.camera.video_task.is_running:
-                    # task completed!
-                    self.logger.debug(
-                        "video task completed, write CameraWorkStatus = 0")
-
-                    try:
-                        client.write_by_name("GVL.CameraWorkStatus", 0)
-                    except:
-                        success = False
-                        return success
-                else:
-                    self.logger.debug("waiting for video task completed!")
-                ################ wait video task complete ################
-
-        elif ToCameraWorkCommand == 12:  # initial task
-
-            if CameraWorkStatus == 0:
-
-                if FromCameraWorkCommand == 0:
-
-                    ################ start initial task ################
-                    self.logger.debug(
-                        "start initial task, write FromCameraWorkCommand = 12, and write CameraWorkStatus = 1")
-
-                    self.camera.initial_task.is_running = True  # change status
-
-                    url = "http://127.0.0.1:8080/initial/start_initial_task"
-                    ret, response = self.do_tasks(url)
-                    self.logger.debug(
-                        f"request result----ret:{ret}, response:{response}")
-                    if ret and isinstance(response, Iterable):
-                        if "status" in response and "message" in response:
-                            if response.get("status"):
-
-                                # PLC OK
-                                try:
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 1)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                                else:
-                                    self.logger.debug(
-                                        "start initial task successfully!")
-                            else:
+        return success
 
-                                # status failed
-                                self.logger.error(
-                                    f"status failed, write CameraWorkStatus = 2, FromCameraCommand = {ToCameraWorkCommand}")
-
-                                # PLC NG
-                                try:
-                                    client.write_by_name(
-                                        "GVL.CameraWorkStatus", 2)
-                                    client.write_by_name(
-                                        "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                                except:
-                                    success = False
-                                    return success
-                        else:
+    def poll_plc_state(self):
+        """
+        GVL 輪詢 (watchdog)，由 scheduler 每 dispatch_watchdog 秒執行：
+            讀取 GVL (sum-read)，更新 AMR 資訊與狀態快取，並喚醒 dispatcher
+        """
+        client = self.client
+        try:
+            if client is None:
+                return
+            read_start = time.monotonic()
+            snapshot = self.gvl_reader.read(client)
+            self.gvl_snapshot = snapshot
+            if not snapshot.required_ok:
+                return
 
-                            # type failed
-                            self.logger.error(
-                                f"type failed, write CameraWorkStatus = 2, FromCameraCommand = {ToCameraWorkCommand}")
-
-                            # PLC NG
-                            try:
-                                # CameraWorkStatus????1,?????
-                                client.write_by_name("GVL.CameraWorkStatus", 2)
-                                client.write_by_name(
-                                    "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                            except:
-                                success = False
-                                return success
-                    else:
-                        # request failed
-                        self.logger.error(
-                            f"request failed, write CameraWorkStatus = 2, FromCameraCommand = {ToCameraWorkCommand}")
-
-                        # PLC NG
-                        try:
-                            client.write_by_name("GVL.CameraWorkStatus", 2)
-                            client.write_by_name(
-                                "GVL.FromCameraWorkCommand", ToCameraWorkCommand)
-                        except:
-                            success = False
-                            return success
-                    ################ start initial task ################
-
-            elif CameraWorkStatus == 1:
-
-                ################ wait initial task complete ################
-                if not self.camera.initial_task.is_running:
-                    # task completed!
-                    self.logger.debug(
-                        "initial task completed, write CameraWorkStatus = 0")
-                    try:
-                        client.write_by_name("GVL.CameraWorkStatus", 0)
-                    except:
-                        success = False
-                        return success
-                else:
-                    self.logger.debug("waiting for initial task completed!")
-                ################ wait initial task complete ################
+            # update amr information
+            self.amr_pos_x = snapshot.pos_x
+            self.amr_pos_y = snapshot.pos_y
+            self.amr_pos_z = snapshot.pos_z
+            self.amr_tag_id = snapshot.tag_id
+            self.amr_pos_theta = snapshot.pos_theta // 1000  # 取整數
+
+            # 替身任務
+            if snapshot.manual_ok:
+                # 替身任務狀態
+                self.bWeb_bBeckhoff_IPC_HartBitStatus = snapshot.bWeb_bBeckhoff_IPC_HartBitStatus
+                self.ManualSemiControlDisableStatus = snapshot.ManualSemiControlDisableStatus
+                self.AutoManualStatus = snapshot.AutoManualStatus
+                self.AutoManualSwitch = snapshot.AutoManualSwitch
+                # 搖桿控制
+                self.ManualJoyControlEnable = snapshot.ManualJoyControlEnable  # 可否切換替身模式
+                self.ManualJoyDirection = snapshot.ManualJoyDirection  # 替身模式方向
+                self.ManualJoyStrength = snapshot.ManualJoyStrength  # 替身模式強度
 
-        elif ToCameraWorkCommand == 0:  # completed task / no task
+            # IUMOBO 障礙物偵測
+            if snapshot.has("RealSenseObstacleSignal"):
+                self.RealSenseObstacleSignal = snapshot.RealSenseObstacleSignal
+
+            # 輪詢結果寫入狀態快取 (watchdog)
+            self.state_cache.update_from_poll({
+                "ToCameraWorkCommand": snapshot.ToCameraWorkCommand,
+                "CameraWorkStatus": snapshot.CameraWorkStatus,
+                "FromCameraWorkCommand": snapshot.FromCameraWorkCommand,
+                "RealSenseObstacleSignal": self.RealSenseObstacleSignal,
+                "pos_x": snapshot.pos_x,
+                "pos_y": snapshot.pos_y,
+                "pos_theta": snapshot.pos_theta,
+            }, read_start)
+            self.last_snapshot_ok = time.monotonic()
+        finally:
+            # 讀取失敗也要喚醒 dispatcher 檢查任務是否完成
+            self.state_cache.wake()
+
+    def is_plc_state_fresh(self):
+        """最近一次 GVL 輪詢成功是否在 heartbeat_stale_periods 個週期內"""
+        last = self.last_snapshot_ok
+        if last is None:
+            return False
+        return time.monotonic() - last <= self.dispatch_watchdog * self.heartbeat_stale_periods
+
+    def dispatch_loop(self):
+        """
+        PLC 任務 dispatcher：
+            ADS notification 變化時立即執行，
+            無變化時每 dispatch_watchdog 秒執行一次 (檢查任務是否完成)
+        """
+        while True:
+            # scheduler 每 dispatch_watchdog 秒喚醒一次，逾時為備援
+            self.state_cache.wait(self.dispatch_watchdog * 4)
+            client = self.client
+            if client is None:
+                continue
+            try:
+                if not self.dispatch_tasks(client):
+                    self.logger.error("dispatch tasks failed!")
+            except Exception as e:
+                self.logger.error(f"dispatch tasks failed, error:{e}")
 
-            if CameraWorkStatus == 0:
+    def write_plc(self, client, values):
+        """以一次 sum-write 寫入 PLC，並同步更新狀態快取"""
+        sum_write(client, values)
+        for name, value in values.items():
+            attr = self.state_cache.attrs.get(name)
+            if attr is not None:
+                self.state_cache.set_written(attr, value)
 
-                if FromCameraWorkCommand != 0:  # 7, 8, 9, 10, 11, 12
+    def dispatch_tasks(self, client):
+        """依 PLC 狀態快取執行拍照任務與障礙物偵測"""
 
-                    ################ complete the task ################
-                    self.logger.debug(
-                        "complete the task, write FromCameraWorkCommand = 0")
-                    try:
-                        client.write_by_name("GVL.FromCameraWorkCommand", 0)
-                    except:
-                        success = False
-                        return success
-                    else:
-                        pass
-                    ################ complete the task ################
+        ToCameraWorkCommand = self.state_cache.get("ToCameraWorkCommand")
+        CameraWorkStatus = self.state_cache.get("CameraWorkStatus")
+        FromCameraWorkCommand = self.state_cache.get("FromCameraWorkCommand")
+        self.RealSenseObstacleSignal = self.state_cache.get(
+            "RealSenseObstacleSignal", self.RealSenseObstacleSignal)
 
-            else:  # CameraWorkStatus = 1, 2
+        # IUMOBO 障礙物偵測工作
+        if self.RealSenseObstacleSignal == True and self.LastRealSenseObstacleSignal == False:
+            # download and upload obstacle imgs
+            self.obstacle_thread = Thread(
+                target=self.download_and_upload_obstacle_imgs)
+            self.obstacle_thread.start()
 
-                ################ abnormal case, reset status ################
-                self.logger.error("abnormal case, reset status")
-                try:
-                    client.write_by_name("GVL.CameraWorkStatus", 0)
-                    client.write_by_name("GVL.FromCameraWorkCommand", 0)
-                except:
-                    success = False
-                    return success
-                ################ abnormal case, rest status ################
+        # tasks
+        success = self.task_state_machine.step(
+            client, ToCameraWorkCommand, CameraWorkStatus, FromCameraWorkCommand)
 
         # record the last signal
         self.LastRealSenseObstacleSignal = self.RealSenseObstacleSignal
 
         return success
 
-    def do_tasks(self, task_url):
+    def do_tasks(self, task_type):
         """執行任務"""
         success, data = False, None
-        data = {"requestor": "AGVC"}
-        try:
-            # response = requests.post(url=task_url).json()
-            response = requests.post(url=task_url, json=data).json()
-        except:
-            self.logger.error("request failed!")
-        else:
-            success = True
-            data = response
+        if self.task_dispatcher is None:
+            self.logger.error("task dispatcher is not ready!")
+            return success, data
+        data = self.task_dispatcher.start(task_type, requestor="AGVC")
+        success = True
         return success, data  # 返回執行結果，與取得資料
 
+    def is_task_running(self, task_type):
+        """任務是否執行中"""
+        if self.task_dispatcher is None:
+            return False
+        return self.task_dispatcher.is_running(task_type)
+
     def add_camera(self, camera):
         """add camera"""
         self.camera = camera
@@ -1150,24 +642,51 @@ class AMR(ADSClient):
                 break
             time.sleep(0.5)
 
+    def amr_heartbeat(self):
+        """amr heart beat, 由 scheduler 每 heartbeat_period 秒執行"""
+        client = self.client
+        if client is None:
+            return
+        # GVL 輪詢停滯時不切換心跳，PLC 才能偵測到異常
+        if not self.is_plc_state_fresh():
+            if not self.heartbeat_paused:
+                self.heartbeat_paused = True
+                self.logger.error(
+                    f"gvl poll older than {self.heartbeat_stale_periods} periods, heart beat paused!")
+            return
+        if self.heartbeat_paused:
+            self.heartbeat_paused = False
+            self.logger.info("gvl poll recovered, heart beat resumed")
+        try:
+            client.write_by_name(
+                "GVL.ExternalDevice1.bFromExternalDeviceHartBit", self.heart_bit)
+        except:
+            self.heartbeat_ok = False
+            raise
+        else:
+            self.heartbeat_ok = True
+        finally:
+            if self.heart_bit == 1:
+                self.heart_bit = 0
+            else:
+                self.heart_bit = 1
+
     def web_control_heartbeat(self):
-        """web control heartbeat"""
-        while True:
-            try:
-                if self.client is not None:
-                    self.client.write_by_name(
-                        "GVL.bWeb_ManualSemiControlHartBit", self.web_control_counter)
-            except Exception as e:
-                self.logger.error(f"write web hearteat failed, error:{e}")
+        """web control heartbeat, 由 scheduler 每0.5秒執行"""
+        try:
+            if self.client is not None:
+                self.client.write_by_name(
+                    "GVL.bWeb_ManualSemiControlHartBit", self.web_control_counter)
+        except Exception as e:
+            self.logger.error(f"write web hearteat failed, error:{e}")
+        else:
+            # 更新heart beat
+            self.ManualSemiControlHartBit = self.web_control_counter
+        finally:
+            if self.web_control_counter == 0:
+                self.web_control_counter = 1
             else:
-                # 更新heart beat
-                self.ManualSemiControlHartBit = self.web_control_counter
-            finally:
-                if self.web_control_counter == 0:
-                    self.web_control_counter = 1
-                else:
-                    self.web_control_counter = 0
-            time.sleep(0.5)  # 每0.5秒執行一次
+                self.web_control_counter = 0
 
     def download_obstacle_imgs(self):
         """download obstacle img from apache"""
@@ -1358,49 +877,12 @@ class AMR(ADSClient):
                     break
 
 
-def stitch_target_image(dir) -> bool:
-    """stitch target images"""
-
-    success = False
-    start = time.time()
-    print(f"dir:{dir}")
-
-    try:
-        files = os.listdir(dir)
-    except:
-        return success
-    else:
-        for file in files:
-            file_name, file_extension = os.path.splitext(file)
-            if file_extension != ".jpg":
-                files.remove(file)
-        print(files)
-        pano = stitch(dir, files)
-
-        RESULT = dir + os.sep + 'target.jpg'
-        if pano is not None:
-            success = True
-            pano = crop(pano)
-            pano = add_black_margin(pano)
-            try:
-                cv2.imwrite(RESULT, pano)
-            except:
-                print("save target image failed!")
-        else:
-            print("stitch error")
-
-        end = time.time()
-        print("cost "+str(end-start))
-    print(success)
-    return success
-
-
-def convert_angle(angle: int):
-    """convert angle to ~ 180 degrees"""
-    while angle < 0:
-        angle += 360
-    angle %= 360
-    return angle
+def prepare_task_stitch(camera, journal):
+    """
+    任務結束：標記需要拼接，finish_task_journal 建立拼接結果上傳工作後才匯出登錄結果並加入拼接佇列；
+    相機參數估計、bundle adjustment 與合成皆由 stitch_service 在獨立 process 執行 (任務不需等待)
+    """
+    journal["stitch_state"] = "queued"
 
 
 def calculate_ptz_value(ptz):
@@ -1417,10 +899,8 @@ def calculate_ptz_value(ptz):
     if ptz[2] < 0 or ptz[2] > 1:
         raise ValueError("zoom倍率範圍應在0 ~ 1之間!")
 
-    pan_value = ptz[0] * (1/170)
-    tilt_value = ptz[1] / 100
-    zoom_value = ptz[2]
-    return [pan_value, tilt_value, zoom_value]
+    pan_value, tilt_value, zoom_value, _ = angles_to_ptz(ptz[0], ptz[1], ptz[2])
+    return [float(pan_value), float(tilt_value), float(zoom_value)]
 
 
 def calculate_ptz_angle(ptz):
@@ -1437,62 +917,77 @@ def calculate_ptz_angle(ptz):
     if ptz[2] < 0 or ptz[2] > 1:
         raise ValueError("zoom倍率範圍應在0 ~ 1之間!")
 
-    pan_angle = (ptz[0] * 170) // 1
-    tilt_angle = (ptz[1] * 100) // 1
-    zoom_value = round(ptz[2], 1)  # maybe wroung
-    return [pan_angle, tilt_angle, zoom_value]
+    pan_angle, tilt_angle, zoom_value, _ = ptz_to_angles(ptz[0], ptz[1], ptz[2])
+    return [float(pan_angle), float(tilt_angle), float(zoom_value)]
+
+
+def get_ptz_position(camera):
+    """獲取PTZ控制值 [pan, tilt, zoom]，失敗回傳 None"""
+    ptz_status = camera.onvif.get_ptz_status()
+    pan, tilt, zoom = ptz_status.get("pan"), \
+        ptz_status.get("tilt"), \
+        ptz_status.get("zoom")
+    if isinstance(pan, float) and isinstance(tilt, float) and isinstance(zoom, float):
+        return [pan, tilt, zoom]
+    return None
 
 
 def move_to_abs(camera, ptz_angle=[0.0, 0.0, 0.0], wait_seconds=20):
     """PTZ移動至指定角度位置"""
-    success = False
-    start = time.time()
-    end = start + wait_seconds
     try:
         ptz_value = calculate_ptz_value(ptz_angle)  # 角度換算成控制值
     except:
         print("calculate ptz value failed!")
         return
+    try:
+        # 移動前位置，用於預估到位時間
+        start_value = calculate_ptz_value(
+            [camera.crr_pan, camera.crr_tilt, camera.crr_zoom])
+    except:
+        start_value = None
+    move_time = time.monotonic()
     ret = camera.onvif.abs_move(ptz_value[0], ptz_value[1], ptz_value[2])
-    while ret:
-
-        # timeout
-        now = time.time()
-        if now >= end:
-            # print("Timeout!")
-            # 更新PTZ
-            camera.crr_pan = 0
-            camera.crr_tilt = 0
-            camera.crr_zoom = 0
-            break
+    if not ret:
+        return False
+
+    # 等待到位 (依預估時間調整查詢頻率)
+    timing = camera.ptz_detector.wait(
+        start_value, ptz_value, wait_seconds, move_time)
+    camera.main_logger.debug(f"ptz move:{ptz_angle}, timing:{timing.get_status()}")
+    if timing.success:
+        # print("Move completed!")
+        # 更新PTZ
+        camera.crr_pan = ptz_angle[0]
+        camera.crr_tilt = ptz_angle[1]
+        camera.crr_zoom = ptz_angle[2]
+    elif timing.reason == "timeout":
+        # print("Timeout!")
+        # 更新PTZ
+        camera.crr_pan = 0
+        camera.crr_tilt = 0
+        camera.crr_zoom = 0
+    else:
+        print("get ptz value failed!")
 
-        # 獲取PTZ值
-        ptz_status = camera.onvif.get_ptz_status()
-        pan, tilt, zoom = ptz_status.get("pan"), \
-            ptz_status.get("tilt"), \
-            ptz_status.get("zoom")
-
-        if isinstance(pan, float) and isinstance(tilt, float) and isinstance(zoom, float):
-            # 檢查是否到位
-            pan_diff, tilt_diff, zoom_diff = abs(ptz_value[0]-pan), \
-                abs(ptz_value[1]-tilt), \
-                abs(ptz_value[2]-zoom)
-            if pan_diff <= 0.005 and tilt_diff <= 0.005 and zoom_diff <= 0.005:
-                # print("Move completed!")
-                success = True
-
-                # 更新PTZ
-                camera.crr_pan = ptz_angle[0]
-                camera.crr_tilt = ptz_angle[1]
-                camera.crr_zoom = ptz_angle[2]
-                break
-        else:
-            print("get ptz value failed!")
-            break
+    return timing.success
 
-    time.sleep(1)  # 等待1秒
 
-    return success
+def plan_task_shots(camera, task_queue, extra_time=0.0):
+    """依 PTZ 移動時間重新排列 task_queue 拍攝順序，並預估任務時間"""
+    shots = list(task_queue.queue)
+    task_queue.queue.clear()
+    try:
+        plan = camera.shot_planner.plan(
+            shots, [camera.crr_pan, camera.crr_tilt, camera.crr_zoom])
+    except Exception as e:
+        camera.main_logger.error(f"plan task shots failed, error:{e}")
+        plan_shots, estimated_time = shots, 0.0
+    else:
+        camera.main_logger.info(f"shot plan:{plan.get_status()}")
+        plan_shots, estimated_time = plan.shots, plan.estimated_time
+    for shot in plan_shots:
+        task_queue.put(shot)
+    task_queue.estimated_time = estimated_time + extra_time  # 預估任務時間(秒)
 
 
 def create_task_folder(camera):
@@ -1532,20 +1027,10 @@ def run_initial_task(camera):
 def run_panorama_task(camera):
     """Panorama 全景環景拍攝"""
     task_folder = create_task_folder(camera)  # 建立task資料夾
-    filename = task_folder + os.sep + "info.txt"
     start_time = time.time()
-    write_file(filename, f"amr_pos_theta:{camera.amr.amr_pos_theta}\n")
-    write_file(filename, f"camera_offset:{camera.camera_offset}\n")
-    write_file(filename, f"task_type:panorama\n")
-    write_file(filename, f"task_cnt:{camera.panorama_task.qsize()}\n")
-    write_file(filename, f"requestor:{camera.task_requestor}\n")
-    write_file(filename, f"amr_pos_x:{camera.amr.amr_pos_x}\n")
-    write_file(filename, f"amr_pos_y:{camera.amr.amr_pos_y}\n")
-    write_file(filename, f"amr_pos_z:{camera.amr.amr_pos_z}\n")
-    write_file(filename, f"amr_tag_id:{camera.amr.amr_tag_id}\n")
-    write_file(filename, f"ftp_url:{task_folder}\n")
-    write_file(
-        filename, f'task_time:{camera.panorama_task.start_time.strftime("%Y-%m-%d %H:%M:%S")}\n')
+    journal = start_task_journal(
+        camera, "panorama", camera.panorama_task, task_folder, camera.panorama_task.qsize())  # 任務紀錄
+    camera.stitcher.start(task_folder)  # 拍攝時增量登錄影像
 
     camera.panorama_task.is_running = True
     camera.panorama_task.stop_flag = False
@@ -1553,27 +1038,9 @@ def run_panorama_task(camera):
     # run initial task
     # run_initial_task(camera)
 
-    while camera.panorama_task.qsize() > 0:
-
-        if camera.panorama_task.stop_flag:
-            # 中斷環景拍攝任務
-            print("panorama task stopped!")
-            break
+    capture_task_shots(camera, camera.panorama_task, "panorama")  # 拍攝
 
-        ptz_angle = camera.panorama_task.get()
-
-        ret = move_to_abs(camera, ptz_angle)  # PTZ控制
-        if not ret:
-            print(f"ptz:{ptz_angle} retrived image failed!")
-        else:
-            save_img(camera, ptz_angle)  # 存照片
-
-        print(f"panorama task left cnt:{camera.panorama_task.qsize()}")
-
-        time.sleep(0.5)
-
-    write_file(
-        filename, f"task_left:{camera.panorama_task.qsize()}\n")
+    journal["task_left"] = camera.panorama_task.qsize()
 
     # clear initial task
     if not camera.initial_task.empty():
@@ -1581,36 +1048,13 @@ def run_panorama_task(camera):
     # 清空任務
     if not camera.panorama_task.empty():
         camera.panorama_task.queue.clear()
-    write_file(filename, f"time_cost:{int(time.time()-start_time)}\n")
-
-    # camera.panorama_task.is_running = False
 
-    # ftp上傳圖像
-    print("uploading imgs...")
-    print(f"pos_id:{camera.pos_folder}, task_folder:{camera.task_folder}")
-    ret = ftp_upload_imgs(camera, camera.pos_folder, camera.task_folder)
-    if ret:
-        # 上傳成功刪圖像
-        ftp_remove_imgs(camera, camera.pos_folder, camera.task_folder)
+    prepare_task_stitch(camera, journal)  # 背景拼接
 
-        # write to mysql
-        query = """
-insert into `task_history` (`task_type`, `amr_pos_X`, `amr_pos_y`, `amr_pos_z`,
-`amr_pos_theta`, `amr_tag_id`, `ftp_url`, `task_time`, `stitch_state`, `requestor`) values
-(%s, %s, %s, %s, %s, %s, %s, %s, %s )
-"""
-        print(query)
-        data = ("panorama", camera.pos_folder_x, camera.pos_folder_y, camera.pos_folder_z,
-                camera.pos_folder_theta, camera.pos_folder_tag_id, "save_imgs" +
-                os.sep+camera.pos_folder+os.sep+camera.task_folder,
-                camera.panorama_task.start_time.strftime("%Y-%m-%d %H:%M:%S"), "none", camera.task_requestor)
-        camera.mysql_conn.UpdateRowsByTuple(query, data)
-    else:
-        print("uploading imgs failed!")
+    # camera.panorama_task.is_running = False
 
-    if ret:
-        # 補上傳其它任務圖像
-        ftp_upload_previous_tasks(camera)
+    # 任務結束，背景上傳 FTP 並寫入 MySQL，拼接完成後再上傳拼接結果，任務不需等待
+    finish_task_journal(camera, journal, camera.panorama_task, start_time)
 
     print("panorama task finished!")
     camera.panorama_task.is_running = False
@@ -1619,20 +1063,10 @@ insert into `task_history` (`task_type`, `amr_pos_X`, `amr_pos_y`, `amr_pos_z`,
 def run_target_task(camera):
     """Target環景拍攝"""
     task_folder = create_task_folder(camera)  # 建立task資料夾
-    filename = task_folder + os.sep + "info.txt"
     start_time = time.time()
-    write_file(filename, f"amr_pos_theta:{camera.amr.amr_pos_theta}\n")
-    write_file(filename, f"camera_offset:{camera.camera_offset}\n")
-    write_file(filename, f"task_type:target\n")
-    write_file(filename, f"task_cnt:{camera.target_task.qsize()}\n")
-    write_file(filename, f"requestor:{camera.task_requestor}\n")
-    write_file(filename, f"amr_pos_x:{camera.amr.amr_pos_x}\n")
-    write_file(filename, f"amr_pos_y:{camera.amr.amr_pos_y}\n")
-    write_file(filename, f"amr_pos_z:{camera.amr.amr_pos_z}\n")
-    write_file(filename, f"amr_tag_id:{camera.amr.amr_tag_id}\n")
-    write_file(filename, f"ftp_url:{task_folder}\n")
-    write_file(
-        filename, f'task_time:{camera.target_task.start_time.strftime("%Y-%m-%d %H:%M:%S")}\n')
+    journal = start_task_journal(
+        camera, "target", camera.target_task, task_folder, camera.target_task.qsize())  # 任務紀錄
+    camera.stitcher.start(task_folder)  # 拍攝時增量登錄影像
 
     camera.target_task.is_running = True
     camera.target_task.stop_flag = False
@@ -1640,27 +1074,9 @@ def run_target_task(camera):
     # run initial task
     # run_initial_task(camera)
 
-    while camera.target_task.qsize() > 0:
-
-        if camera.target_task.stop_flag:
-            # 中斷Target環景拍攝任務
-            print("target task stopped!")
-            break
-
-        ptz_angle = camera.target_task.get()
-
-        ret = move_to_abs(camera, ptz_angle)  # PTZ控制
-        if not ret:
-            print(f"ptz:{ptz_angle} retrived image failed!")
-        else:
-            save_img(camera, ptz_angle)  # 存照片
-
-        print(f"target task left cnt:{camera.target_task.qsize()}")
+    capture_task_shots(camera, camera.target_task, "target")  # 拍攝
 
-        time.sleep(0.5)
-
-    write_file(
-        filename, f"task_left:{camera.target_task.qsize()}\n")
+    journal["task_left"] = camera.target_task.qsize()
 
     # clear initial task
     if not camera.initial_task.empty():
@@ -1669,51 +1085,10 @@ def run_target_task(camera):
     if not camera.target_task.empty():
         camera.target_task.queue.clear()
 
-    # stitch images, maybe failed and raised exception
-    # try:
-    #     if not stitch_target_image("save_imgs"+ os.sep + camera.pos_folder + os.sep + camera.task_folder):
-    #         print("stitch target images failed!")
-    #         write_file(filename, f"stitch_state:ng\n")
-    #     else:
-    #         write_file(filename, f"stitch_state:ok\n")
-    # except:
-    #     write_file(filename, f"stitch_state:ng\n")
-    write_file(filename, f"stitch_state:none\n")
-
-    # read info.txt and get stitch state
-    lines = read_lines("save_imgs" + os.sep + camera.pos_folder +
-                       os.sep + camera.task_folder + os.sep + "info.txt")
-    stitch_state = "none"
-    for line in lines:
-        if "stitch_state:" in line:
-            stitch_state = line.replace("stitch_state:", "")
-    write_file(filename, f"time_cost:{int(time.time()-start_time)}\n")
-
-    # ftp上傳圖像
-    print("uploading imgs...")
-    print(f"pos_id:{camera.pos_folder}, task_folder:{camera.task_folder}")
-    ret = ftp_upload_imgs(camera, camera.pos_folder, camera.task_folder)
-    if ret:
-        # write to mysql
-        query = """
-insert into `task_history` (`task_type`, `amr_pos_X`, `amr_pos_y`, `amr_pos_z`,
-`amr_pos_theta`, `amr_tag_id`, `ftp_url`, `task_time`, `stitch_state`, `requestor`) values
-(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s )
-"""
-        # print(query)
-        data = ("target", camera.pos_folder_x, camera.pos_folder_y, camera.pos_folder_z,
-                camera.pos_folder_theta, camera.pos_folder_tag_id, "save_imgs" +
-                os.sep+camera.pos_folder+os.sep+camera.task_folder,
-                camera.target_task.start_time.strftime("%Y-%m-%d %H:%M:%S"), stitch_state, camera.task_requestor)
-        if camera.mysql_conn.UpdateRowsByTuple(query, data):
-            # 上傳成功刪圖像
-            ftp_remove_imgs(camera, camera.pos_folder, camera.task_folder)
-    else:
-        print("uploading imgs failed!")
+    prepare_task_stitch(camera, journal)  # 背景拼接
 
-    if ret:
-        # 補上傳其它任務圖像
-        ftp_upload_previous_tasks(camera)
+    # 任務結束，背景上傳 FTP 並寫入 MySQL，拼接完成後再上傳拼接結果，任務不需等待
+    finish_task_journal(camera, journal, camera.target_task, start_time)
 
     print("target task finished!")
     camera.target_task.is_running = False
@@ -1722,20 +1097,9 @@ insert into `task_history` (`task_type`, `amr_pos_X`, `amr_pos_y`, `amr_pos_z`,
 def run_designated_task(camera):
     """designated指定點拍攝"""
     task_folder = create_task_folder(camera)  # 建立task資料夾
-    filename = task_folder + os.sep + "info.txt"
     start_time = time.time()
-    write_file(filename, f"amr_pos_theta:{camera.amr.amr_pos_theta}\n")
-    write_file(filename, f"camera_offset:{camera.camera_offset}\n")
-    write_file(filename, f"task_type:designated\n")
-    write_file(filename, f"task_cnt:{camera.designated_task.qsize()}\n")
-    write_file(filename, f"requestor:{camera.task_requestor}\n")
-    write_file(filename, f"amr_pos_x:{camera.amr.amr_pos_x}\n")
-    write_file(filename, f"amr_pos_y:{camera.amr.amr_pos_y}\n")
-    write_file(filename, f"amr_pos_z:{camera.amr.amr_pos_z}\n")
-    write_file(filename, f"amr_tag_id:{camera.amr.amr_tag_id}\n")
-    write_file(filename, f"ftp_url:{task_folder}\n")
-    write_file(
-        filename, f'task_time:{camera.designated_task.start_time.strftime("%Y-%m-%d %H:%M:%S")}\n')
+    journal = start_task_journal(
+        camera, "designated", camera.designated_task, task_folder, camera.designated_task.qsize())  # 任務紀錄
 
     camera.designated_task.is_running = True
     camera.designated_task.stop_flag = False
@@ -1743,27 +1107,9 @@ def run_designated_task(camera):
     # run initial task
     # run_initial_task(camera)
 
-    while camera.designated_task.qsize() > 0:
+    capture_task_shots(camera, camera.designated_task, "designated")  # 拍攝
 
-        if camera.designated_task.stop_flag:
-            # 中斷designated 拍攝任務
-            print("designated task stopped!")
-            break
-
-        ptz_angle = camera.designated_task.get()
-
-        ret = move_to_abs(camera, ptz_angle)  # PTZ控制
-        if not ret:
-            print(f"ptz:{ptz_angle} retrived image failed!")
-        else:
-            save_img(camera, ptz_angle)  # 存照片
-
-        print(f"designated task left cnt:{camera.designated_task.qsize()}")
-
-        time.sleep(0.5)
-
-    write_file(
-        filename, f"task_left:{camera.designated_task.qsize()}\n")
+    journal["task_left"] = camera.designated_task.qsize()
 
     # clear initial task
     if not camera.initial_task.empty():
@@ -1772,35 +1118,10 @@ def run_designated_task(camera):
     if not camera.designated_task.empty():
         camera.designated_task.queue.clear()
 
-    write_file(filename, f"stitch_state:none\n")
-
-    write_file(filename, f"time_cost:{int(time.time()-start_time)}\n")
 
-    # ftp上傳圖像
-    print("uploading imgs...")
-    print(f"pos_id:{camera.pos_folder}, task_folder:{camera.task_folder}")
-    ret = ftp_upload_imgs(camera, camera.pos_folder, camera.task_folder)
-    if ret:
-        # write to mysql
-        query = """
-insert into `task_history` (`task_type`, `amr_pos_X`, `amr_pos_y`, `amr_pos_z`,
-`amr_pos_theta`, `amr_tag_id`, `ftp_url`, `task_time`, `stitch_state`, `requestor`) values
-(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s )
-"""
-        print(query)
-        data = ("designated", camera.pos_folder_x, camera.pos_folder_y, camera.pos_folder_z,
-                camera.pos_folder_theta, camera.pos_folder_tag_id, "save_imgs" +
-                os.sep+camera.pos_folder+os.sep+camera.task_folder,
-                camera.designated_task.start_time.strftime("%Y-%m-%d %H:%M:%S"), "none", camera.task_requestor)
-        if camera.mysql_conn.UpdateRowsByTuple(query, data):
-            # 上傳成功刪圖像
-            ftp_remove_imgs(camera, camera.pos_folder, camera.task_folder)
-    else:
-        print("uploading imgs failed!")
 
-    if ret:
-        # 補上傳其它任務圖像
-        ftp_upload_previous_tasks(camera)
+    # 任務結束，背景上傳 FTP 並寫入 MySQL，任務不需等待上傳
+    finish_task_journal(camera, journal, camera.designated_task, start_time)
 
     print("designated task finished!")
     camera.designated_task.is_running = False
@@ -1812,20 +1133,9 @@ def run_ir_task(camera):
     camera.main_logger.debug("run ir task!")
 
     task_folder = create_task_folder(camera)  # 建立task資料夾
-    filename = task_folder + os.sep + "info.txt"
     start_time = time.time()
-    write_file(filename, f"amr_pos_theta:{camera.amr.amr_pos_theta}\n")
-    write_file(filename, f"camera_offset:{camera.camera_offset}\n")
-    write_file(filename, f"task_type:ir\n")
-    write_file(filename, f"task_cnt:{2}\n")
-    write_file(filename, f"requestor:{camera.task_requestor}\n")
-    write_file(filename, f"amr_pos_x:{camera.amr.amr_pos_x}\n")
-    write_file(filename, f"amr_pos_y:{camera.amr.amr_pos_y}\n")
-    write_file(filename, f"amr_pos_z:{camera.amr.amr_pos_z}\n")
-    write_file(filename, f"amr_tag_id:{camera.amr.amr_tag_id}\n")
-    write_file(filename, f"ftp_url:{task_folder}\n")
-    write_file(
-        filename, f'task_time:{camera.ir_task.start_time.strftime("%Y-%m-%d %H:%M:%S")}\n')
+    journal = start_task_journal(
+        camera, "ir", camera.ir_task, task_folder, 2)  # 任務紀錄
 
     camera.ir_task.is_running = True
 
@@ -1838,45 +1148,10 @@ def run_ir_task(camera):
         camera.main_logger.error(f"error:{e.args}")
 
     # camera.ir_task.is_running = False
-    write_file(
-        filename, f"task_left:{0}\n")
-
-    write_file(filename, f"time_cost:{int(time.time()-start_time)}\n")
+    journal["task_left"] = 0
 
-    write_file(filename, f"stitch_state:none\n")
-
-    # ftp上傳圖像
-    print("uploading imgs...")
-    print(f"pos_id:{camera.pos_folder}, task_folder:{camera.task_folder}")
-    camera.main_logger.debug(
-        f"uploading imgs..., pos_id:{camera.pos_folder}, task_folder:{camera.task_folder}")
-    ret = ftp_upload_imgs(camera, camera.pos_folder, camera.task_folder)
-    if ret:
-        camera.main_logger.debug(f"uploading imgs successfully!")
-        # write to mysql
-        query = """
-insert into `task_history` (`task_type`, `amr_pos_X`, `amr_pos_y`, `amr_pos_z`,
-`amr_pos_theta`, `amr_tag_id`, `ftp_url`, `task_time`, `stitch_state`, `requestor`) values
-(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s )
-"""
-        # print(query)
-        camera.main_logger.debug(f"query:{query}")
-        data = ("ir", camera.pos_folder_x, camera.pos_folder_y, camera.pos_folder_z,
-                camera.pos_folder_theta, camera.pos_folder_tag_id, "save_imgs" +
-                os.sep+camera.pos_folder+os.sep+camera.task_folder,
-                camera.ir_task.start_time.strftime("%Y-%m-%d %H:%M:%S"), "none", camera.task_requestor)
-        if camera.mysql_conn.UpdateRowsByTuple(query, data):
-            # 上傳成功刪圖像
-            camera.main_logger.debug(f"mysql insert successfully!")
-            camera.main_logger.debug("ftp remove imgs")
-            ftp_remove_imgs(camera, camera.pos_folder, camera.task_folder)
-    else:
-        print("uploading imgs failed!")
-        camera.main_logger.debug(f"uploading imgs failed!")
-
-    # 補上傳其它任務圖像
-    if ret:
-        ftp_upload_previous_tasks(camera)
+    # 任務結束，背景上傳 FTP 並寫入 MySQL，任務不需等待上傳
+    finish_task_journal(camera, journal, camera.ir_task, start_time)
 
     print("ir task finished!")
     camera.main_logger.debug(f"ir task finished!")
@@ -1887,20 +1162,9 @@ def run_video_task(camera):
     """make video"""
     camera.main_logger.debug("run video task!")
     task_folder = create_task_folder(camera)  # 建立task資料夾
-    filename = task_folder + os.sep + "info.txt"
     start_time = time.time()
-    write_file(filename, f"amr_pos_theta:{camera.amr.amr_pos_theta}\n")
-    write_file(filename, f"camera_offset:{camera.camera_offset}\n")
-    write_file(filename, f"task_type:video\n")
-    write_file(filename, f"task_cnt:{camera.video_task.qsize()}\n")
-    write_file(filename, f"requestor:{camera.task_requestor}\n")
-    write_file(filename, f"amr_pos_x:{camera.amr.amr_pos_x}\n")
-    write_file(filename, f"amr_pos_y:{camera.amr.amr_pos_y}\n")
-    write_file(filename, f"amr_pos_z:{camera.amr.amr_pos_z}\n")
-    write_file(filename, f"amr_tag_id:{camera.amr.amr_tag_id}\n")
-    write_file(filename, f"ftp_url:{task_folder}\n")
-    write_file(
-        filename, f'task_time:{camera.video_task.start_time.strftime("%Y-%m-%d %H:%M:%S")}\n')
+    journal = start_task_journal(
+        camera, "video", camera.video_task, task_folder, camera.video_task.qsize())  # 任務紀錄
 
     camera.video_task.is_running = True
     camera.video_task.stop_flag = False
@@ -1945,8 +1209,7 @@ def run_video_task(camera):
 
         time.sleep(0.5)
 
-    write_file(
-        filename, f"task_left:{camera.video_task.qsize()}\n")
+    journal["task_left"] = camera.video_task.qsize()
 
     # clear initial task
     if not camera.initial_task.empty():
@@ -1955,51 +1218,54 @@ def run_video_task(camera):
     if not camera.video_task.empty():
         camera.video_task.queue.clear()
 
-    write_file(filename, f"stitch_state:none\n")
-    write_file(filename, f"time_cost:{int(time.time()-start_time)}\n")
 
-    # ftp上傳圖像
-    # print("uploading videos...")
-    # print(f"pos_id:{camera.pos_folder}, task_folder:{camera.task_folder}")
-    camera.main_logger.debug(
-        f"uploading videos..., pos_id:{camera.pos_folder}, task_folder:{camera.task_folder}")
-    ret = ftp_upload_imgs(camera, camera.pos_folder, camera.task_folder)
-    if ret:
-        camera.main_logger.debug(
-            f"uploading videos successfully, and write to mysql.")
-        # write to mysql
-        query = """
-insert into `task_history` (`task_type`, `amr_pos_X`, `amr_pos_y`, `amr_pos_z`,
-`amr_pos_theta`, `amr_tag_id`, `ftp_url`, `task_time`, `stitch_state`, `requestor`) values
-(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s )
-"""
-        # print(query)
-        data = ("video", camera.pos_folder_x, camera.pos_folder_y, camera.pos_folder_z,
-                camera.pos_folder_theta, camera.pos_folder_tag_id, "save_imgs" +
-                os.sep+camera.pos_folder+os.sep+camera.task_folder,
-                camera.video_task.start_time.strftime("%Y-%m-%d %H:%M:%S"), "none", camera.task_requestor)
-        if camera.mysql_conn.UpdateRowsByTuple(query, data):
-            # 上傳成功刪圖像
-            camera.main_logger.debug(
-                "insert mysql successfully, ftp remove imgs")
-            ftp_remove_imgs(camera, camera.pos_folder, camera.task_folder)
-    else:
-        camera.main_logger.error("uploading video failed!")
-
-    if ret:
-        # 補上傳其它任務圖像
-        ftp_upload_previous_tasks(camera)
+    # 任務結束，背景上傳 FTP 並寫入 MySQL，任務不需等待上傳
+    finish_task_journal(camera, journal, camera.video_task, start_time)
 
     # print("video task finished!")
     camera.main_logger.debug("video task finished!")
     camera.video_task.is_running = False
 
 
-def save_img(camera, ptz_angle):
-    """存照片"""
+def capture_task_shots(camera, task_queue, task_type):
+    """依序移動PTZ拍攝，存檔由 capture_pipeline 背景執行，取得影像後即移動至下一點"""
+    futures = []
+    while task_queue.qsize() > 0:
+
+        if task_queue.stop_flag:
+            # 中斷拍攝任務
+            print(f"{task_type} task stopped!")
+            break
+
+        ptz_angle = task_queue.get()
+
+        ret = move_to_abs(camera, ptz_angle)  # PTZ控制
+        if not ret:
+            print(f"ptz:{ptz_angle} retrived image failed!")
+        else:
+            future = save_img(camera, ptz_angle, camera.capture_pipeline)  # 存照片
+            if future is not None:
+                futures.append(future)
+
+        print(f"{task_type} task left cnt:{task_queue.qsize()}")
+
+    # 等待存檔完成，之後才上傳
+    failed = camera.capture_pipeline.wait(futures)
+    camera.main_logger.info(
+        f"{task_type} task saved:{len(futures)-failed}, failed:{failed}, pipeline:{camera.capture_pipeline.get_stats()}")
+
+
+def save_img(camera, ptz_angle, pipeline=None):
+    """存照片，指定 pipeline 時背景存檔並回傳 future"""
     # 格式：save_imgs/位置(x,y,theta,tag_id)/task年月日時分秒/img_年月日時分秒_pan(0.0)_tilt(0.0)_zoom(0.0).jpg
 
-    img = camera.get_img(True)
+    # 取 PTZ 到位後才解碼的影像，避免存到緩衝區中的舊影像
+    frame = camera.frame_slots["camera"].wait_newer(after=time.monotonic(), timeout=1.0)
+    if frame is None:
+        # 逾時沒有新影像 (畫面內容未變，PTZ 未移動)，最新影像即為目前畫面
+        frame = camera.frame_slots["camera"].get()
+        camera.main_logger.error(f"no new frame after ptz move, use latest frame seq:{frame[0]}")
+    img = frame[2]
     if img is not None:
         task_folder = create_task_folder(camera)
         filename = task_folder + os.sep + \
@@ -2010,19 +1276,33 @@ def save_img(camera, ptz_angle):
             if isinstance(camera.amr.amr_pos_x, int) and isinstance(camera.amr.amr_pos_y, int) and isinstance(camera.amr.amr_pos_theta, int):
 
                 # calculate the target
-                theta_converted = convert_angle(camera.amr.amr_pos_theta)
-                camera_pos = theta_converted + camera.camera_offset
-                camera_pos_converted = convert_angle(camera_pos)
-                target_pos = camera_pos_converted - int(ptz_angle[0])
-                target_pos_converted = convert_angle(target_pos)
+                target_pos_converted = target_bearing(
+                    camera.amr.amr_pos_theta, camera.camera_offset, int(ptz_angle[0])).item()
 
                 # filename = task_folder + os.sep + \
                 #     f'img_{datetime.now().strftime("%Y%m%d%H%M%S")}_{camera.amr.amr_pos_x}_{camera.amr.amr_pos_y}_{camera.amr.amr_pos_theta+int(ptz_angle[0])}.jpg'
                 filename = task_folder + os.sep + \
                     f'img_{datetime.now().strftime("%Y%m%d%H%M%S")}_{camera.amr.amr_pos_x}_{camera.amr.amr_pos_y}_{target_pos_converted}.jpg'
+        if pipeline is not None:
+            # 同一秒內檔名相同時加序號，避免覆蓋
+            name, ext = os.path.splitext(filename)
+            cnt = 1
+            while pipeline.is_pending(filename) or os.path.exists(filename):
+                filename = f"{name}_{cnt}{ext}"
+                cnt += 1
+            # 存檔成功後才加入索引
+            pos_id, task_id = camera.pos_folder, camera.task_folder
+            future = pipeline.submit(filename, img, on_saved=lambda path: camera.image_store.add_image(
+                pos_id, task_id, os.path.basename(path)))
+            if camera.stitcher.is_active(task_folder):
+                camera.stitcher.submit(filename, img, tuple(
+                    float(value) for value in ptz_angle[:3]))  # 增量拼接
+            return future
         try:
             # 存檔
-            cv2.imwrite(filename, img)
+            if cv2.imwrite(filename, img):
+                camera.image_store.add_image(
+                    camera.pos_folder, camera.task_folder, os.path.basename(filename))
         except Exception as e:
             print(e.args)
     else:
@@ -2036,112 +1316,42 @@ def ftp_upload_imgs(camera, pos_id, task_id):
     camera.main_logger.info(
         f"starting upload images, pos_id={pos_id}, task={task_id}")
     success = False
-    with MyFTP() as ftp:
-        # login
-        try:
-            ftp.connect(camera.ftp.ftp_ip, port=camera.ftp.ftp_port)
-            ftp.login(camera.ftp.ftp_account, camera.ftp.ftp_password)
-        except:
-            camera.main_logger.error("login ftp failed!")
-        else:
-            camera.main_logger.info("login successfully!")
-
-            # 第一層save_imgs
-            ret_base, base_folder = ftp.get_files_list()
-            if ret_base:
-                if '/save_imgs' not in base_folder:
-                    # 建立save_imgs資料夾
-                    camera.main_logger.debug("make save_imgs folder.")
-                    ftp.make_dir("save_imgs")
-
-                # 進入save_img資料夾
-                if ftp.change_dir("save_imgs"):
-                    camera.main_logger.debug(f"ftp cwd:{ftp.get_cwd()}")
-
-                    # 第二層POS ID
-                    ret_pos, pos_folder = ftp.get_files_list()
-                    if ret_pos:
-
-                        # 建立POS ID資料夾
-                        if pos_id not in pos_folder:
-                            camera.main_logger.debug(
-                                f"make pos_folder:{pos_id}.")
-                            ftp.make_dir(pos_id)
-
-                        # 進入POS ID資料夾
-                        if ftp.change_dir(pos_id):
-
-                            # 第三層task id
-                            ret_task, task_folder = ftp.get_files_list()
-                            if ret_task:
-                                if task_id not in task_folder:
-                                    # 建立TASK ID資料夾
-                                    camera.main_logger.debug(
-                                        f"make task_folder:{task_id}.")
-                                    ftp.make_dir(task_id)
-
-                                # 進入TASK ID資料夾
-                                if ftp.change_dir(task_id):
-
-                                    # 已進入工作目錄
-                                    ret, remote_files = ftp.get_files_list()
-                                    if ret:
-                                        # 獲取需上傳照片
-                                        tasks = []
-                                        local_files = os.listdir(
-                                            "save_imgs" + os.sep + pos_id + os.sep + task_id)
-                                        print(f"local_files:{local_files}")
-                                        for local_file in local_files:
-                                            if not local_file in remote_files:
-                                                tasks.append(
-                                                    "save_imgs" + os.sep + pos_id + os.sep + task_id + os.sep + local_file)
-                                        # print(f"tasks:{tasks}")
-                                        camera.main_logger.info(
-                                            f"tasks count:{len(tasks)}.")
-                                        if len(tasks) > 0:
-                                            success_cnt = 0
-                                            for task in tasks:
-                                                if ftp.upload_file(task, os.path.basename(task)):
-                                                    success_cnt += 1
-                                                    camera.main_logger.debug(
-                                                        f"upload ok, success_cnt:{success_cnt}.")
-                                                    # try:
-                                                    #     os.remove(task)
-                                                    # except:
-                                                    #     camera.main_logger.error(f"remove local file failed, file path:{task}")
-                                                    #     break
-                                                else:
-                                                    camera.main_logger.error(
-                                                        f"upload failed, success_cnt:{success_cnt}, stopped!")
-                                                    break
-                                            if success_cnt == len(tasks):
-                                                success = True
-                                                camera.main_logger.info(
-                                                    "uploaded images successfully!")
-                                        else:
-                                            camera.main_logger.debug(
-                                                f"no images needed to be upload!")
-                                            success = True
-                                    else:
-                                        camera.main_logger.error(
-                                            "retrieve remove files failed!")
-                                else:
-                                    camera.main_logger.error(
-                                        "change to task id folder failed!")
-                            else:
-                                camera.main_logger.error(
-                                    "retrieve task id folder failed!")
-                        else:
-                            camera.main_logger.error(
-                                "change to pos id folder failed!")
-                    else:
-                        camera.main_logger.error(
-                            "retrieve pos id folder failed!")
-                else:
-                    camera.main_logger.error(
-                        "change to save_imgs folder failed!")
-            else:
-                camera.main_logger.error("retrieve save_imgs folder failed!")
+    local_dir = "save_imgs" + os.sep + pos_id + os.sep + task_id
+    remote_dir = f"/save_imgs/{pos_id}/{task_id}"
+
+    # 獲取需上傳照片 (比對已上傳清單，不需 LIST 遠端資料夾)
+    try:
+        local_files = sorted(os.listdir(local_dir))
+    except Exception as e:
+        camera.main_logger.error(f"list local files failed, error:{e}")
+        return success
+    tasks = []
+    for local_file in local_files:
+        path = local_dir + os.sep + local_file
+        if ".tmp" in local_file:
+            continue  # 寫入中的暫存檔 (拼接結果、task.json 等)
+        if os.path.isfile(path) and not camera.upload_manifest.is_uploaded(path):
+            tasks.append(path)
+    camera.main_logger.info(f"tasks count:{len(tasks)}.")
+    if len(tasks) == 0:
+        camera.main_logger.debug(f"no images needed to be upload!")
+        return True
+
+    # 多連線上傳，單檔失敗重試，不中斷其他檔案
+    ok, failed = camera.ftp_uploader.upload_files(
+        tasks, remote_dir, on_uploaded=camera.upload_manifest.mark_uploaded)
+    try:
+        camera.upload_manifest.save()
+    except Exception as e:
+        camera.main_logger.error(f"save upload manifest failed, error:{e}")
+    if failed:
+        camera.main_logger.error(
+            f"upload failed, success_cnt:{len(ok)}, failed:{failed}")
+    else:
+        success = True
+        camera.main_logger.info("uploaded images successfully!")
+    camera.main_logger.debug(
+        f"upload stats:{camera.ftp_uploader.get_stats()}")
     return success
 
 
@@ -2167,6 +1377,8 @@ def ftp_remove_imgs(camera, pos_id, task_id):
                     camera.main_logger.error(f"remove file:{file} failed!")
                     success1 = False
                     message = "remove img file failed!"
+            camera.upload_manifest.forget_dir(dir)
+            camera.image_store.remove_task(pos_id, task_id)
 
             # 刪task資料夾
             success2 = True
@@ -2208,74 +1420,239 @@ def ftp_remove_imgs(camera, pos_id, task_id):
     return status, message
 
 
-def ftp_upload_previous_tasks(camera):
-    """ uploading previous failed task imgs """
-    camera.main_logger.debug("uploading previous failed task imgs...")
+TASK_HISTORY_COLUMNS = ("task_type", "amr_pos_x", "amr_pos_y", "amr_pos_z", "amr_pos_theta",
+                        "amr_tag_id", "ftp_url", "task_time", "stitch_state", "requestor")
+TASK_HISTORY_INSERT = """
+insert into `task_history` (`task_type`, `amr_pos_X`, `amr_pos_y`, `amr_pos_z`,
+`amr_pos_theta`, `amr_tag_id`, `ftp_url`, `task_time`, `stitch_state`, `requestor`) values
+(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s )
+"""
+TASK_HISTORY_STITCH_UPDATE = "update `task_history` set `stitch_state` = %s where `ftp_url` = %s"
+LEGACY_MIGRATED_MARKER = "legacy_migrated"  # 舊版任務已加入佇列
+
+
+def start_task_journal(camera, task_type, task_queue, task_folder, task_cnt):
+    """任務開始：寫入 task.json，並以 capturing 狀態加入上傳佇列 (中斷時重啟可補上傳)"""
+    journal = {
+        "task_type": task_type,
+        "pos_id": camera.pos_folder,
+        "task_id": camera.task_folder,
+        "state": "capturing",
+        "requestor": camera.task_requestor,
+        "amr_pos_x": camera.pos_folder_x,
+        "amr_pos_y": camera.pos_folder_y,
+        "amr_pos_z": camera.pos_folder_z,
+        "amr_pos_theta": camera.pos_folder_theta,
+        "amr_tag_id": camera.pos_folder_tag_id,
+        "camera_offset": camera.camera_offset,
+        "task_cnt": task_cnt,
+        "ftp_url": task_folder,
+        "task_time": task_queue.start_time.strftime("%Y-%m-%d %H:%M:%S"),
+        "stitch_state": "none",
+        "save_global_coordinate": bool(camera.save_global_coordinate),  # 檔名為大地坐標 (無 PTZ 角度)
+        "job_id": None,
+    }
+    try:
+        write_journal(task_folder, journal)
+    except Exception as e:
+        camera.main_logger.error(f"write task journal failed, error:{e}")
+    try:
+        camera.image_store.add_task(
+            journal["pos_id"], journal["task_id"], task_type, journal["amr_tag_id"],
+            journal["amr_pos_x"], journal["amr_pos_y"], journal["amr_pos_theta"], journal["task_time"])
+    except Exception as e:
+        camera.main_logger.error(f"update image index failed, error:{e}")
+    try:
+        journal["job_id"] = camera.upload_queue.enqueue(
+            journal["pos_id"], journal["task_id"], task_record(journal), state=STATE_CAPTURING)
+    except Exception as e:
+        camera.main_logger.error(f"enqueue upload job failed, error:{e}")
+    return journal
+
+
+def finish_task_journal(camera, journal, task_queue, start_time):
+    """
+    任務結束：更新 task.json、產生 info.txt，上傳佇列改為 pending 開始背景上傳；
+    需要拼接的任務 (stitch_state 為 queued) 另建拼接結果上傳工作 (stitching，拼接完成後才上傳)
+    """
+    task_folder = journal["ftp_url"]
+    time_cost = time.time() - start_time
+    journal["state"] = "done"
+    journal["time_cost"] = int(time_cost)
+    journal["estimated_time"] = int(getattr(task_queue, "estimated_time", 0))
+    camera.main_logger.info(
+        f"{journal['task_type']} task time cost:{time_cost:.1f}s, estimated:{journal['estimated_time']}s")
+    try:
+        write_journal(task_folder, journal)
+        write_info(task_folder, journal)
+    except Exception as e:
+        camera.main_logger.error(f"write task journal failed, error:{e}")
+    try:
+        # 含 ir、video 等非 save_img 產生的檔案
+        camera.image_store.index_task_files(journal["pos_id"], journal["task_id"])
+    except Exception as e:
+        camera.main_logger.error(f"update image index failed, error:{e}")
+    stitch_job_id = None
+    if journal["stitch_state"] == "queued":
+        try:
+            # 拼接結果上傳工作 (先於任務圖像工作建立，存在期間不刪除本機圖像)
+            stitch_job_id = camera.upload_queue.enqueue(
+                journal["pos_id"], journal["task_id"], task_record(journal),
+                state=STATE_STITCHING, kind=KIND_STITCH)
+        except Exception as e:
+            camera.main_logger.error(f"enqueue stitch upload job failed, error:{e}")
+    try:
+        if journal["job_id"] is not None:
+            camera.upload_queue.update(
+                journal["job_id"], task_record(journal), STATE_PENDING)
+        else:
+            journal["job_id"] = camera.upload_queue.enqueue(
+                journal["pos_id"], journal["task_id"], task_record(journal), state=STATE_PENDING)
+    except Exception as e:
+        camera.main_logger.error(f"update upload job failed, error:{e}")
+    if journal["stitch_state"] == "queued":
+        task_type = journal["task_type"]
+        camera.stitcher.detach(
+            lambda export: export_task_stitch(camera, task_folder, task_type, stitch_job_id, export))
+
+
+def export_task_stitch(camera, task_folder, task_type, job_id, export):
+    """拍攝時登錄結果寫入 stitch.json 後加入拼接佇列 (stitcher 背景執行緒)"""
+    if export is not None:
+        try:
+            write_registration(task_folder, export)
+        except Exception as e:
+            # 無 stitch.json 時 worker 由影像檔重新登錄
+            camera.main_logger.error(f"write stitch registration {task_folder} failed, error:{e}")
+    submit_task_stitch(camera, task_folder, task_type, job_id)
+
+
+def submit_task_stitch(camera, task_folder, task_type, job_id):
+    """加入拼接佇列，無法加入時視為拼接失敗，照常上傳"""
+    if not camera.stitch_service.submit(task_folder, task_type, job_id):
+        on_stitch_state({"task_folder": task_folder, "task_type": task_type, "job_id": job_id},
+                        "ng", {"state": "ng", "error": "stitch queue rejected"})
+
+
+def on_stitch_state(job, state, result=None):
+    """
+    拼接狀態變更 (queued / running / ok / ng)：更新 task.json、info.txt 與 task_history，
+    完成後拼接結果上傳工作改為 pending
+    """
+    task_folder = job["task_folder"]
+    done = state in ("ok", "ng")
+    record = None
+    with camera.task_history_lock:
+        journal = read_journal(task_folder)
+        if journal is not None:
+            journal["stitch_state"] = state
+            write_journal(task_folder, journal)
+            write_info(task_folder, journal)
+            record = task_record(journal)
+        # task_history 尚未寫入時更新 0 筆，由 commit_task_jobs 依 task.json 寫入目前狀態
+        camera.mysql_conn.UpdateRowsByTuple(TASK_HISTORY_STITCH_UPDATE, (state, task_folder))
+    if done and journal is not None:
+        # 拼接結果 <task_type>.jpg 加入索引
+        camera.image_store.index_task_files(journal["pos_id"], journal["task_id"])
+    if done and job["job_id"] is not None:
+        if record is None:
+            record = next((dict(upload_job["record"], stitch_state=state)
+                           for upload_job in camera.upload_queue.list_jobs(STATE_STITCHING)
+                           if upload_job["job_id"] == job["job_id"]), None)
+        if record is not None:
+            camera.upload_queue.update(job["job_id"], record, STATE_PENDING)
+    if state == "ng":
+        camera.main_logger.error(f"stitch {task_folder} failed, result:{result}")
+
+
+def resume_stitch_jobs(camera):
+    """程式重啟：等待拼接的拼接結果上傳工作重新加入拼接佇列"""
+    for job in camera.upload_queue.list_jobs(STATE_STITCHING):
+        task_folder = "save_imgs" + os.sep + job["pos_id"] + os.sep + job["task_id"]
+        submit_task_stitch(camera, task_folder, job["record"].get("task_type") or "", job["job_id"])
+
+
+def upload_task_job(job):
+    """上傳佇列：FTP上傳任務圖像"""
+    if not os.path.isdir("save_imgs" + os.sep + job["pos_id"] + os.sep + job["task_id"]):
+        # 本機圖像已刪除
+        camera.main_logger.error(
+            f"task folder not found, pos:{job['pos_id']}, task:{job['task_id']}")
+        return True
+    return ftp_upload_imgs(camera, job["pos_id"], job["task_id"])
+
+
+def commit_task_jobs(jobs):
+    """
+    上傳佇列：任務圖像批次寫入 task_history，拼接結果更新 stitch_state；
+    同一任務沒有其他未完成的工作 (例如拼接中) 時才刪除本機圖像
+    """
+    updates = [(job["record"].get("stitch_state") or "none", job["record"].get("ftp_url") or "")
+               for job in jobs if job.get("kind", KIND_TASK) == KIND_STITCH]
+    with camera.task_history_lock:
+        rows = []
+        for job in jobs:
+            if job.get("kind", KIND_TASK) != KIND_TASK:
+                continue
+            record = job["record"]
+            journal = read_journal("save_imgs" + os.sep + job["pos_id"] + os.sep + job["task_id"])
+            if journal is not None and journal.get("stitch_state"):
+                # 上傳期間拼接狀態可能已變更
+                record = dict(record, stitch_state=journal["stitch_state"])
+            rows.append(tuple(record.get(column) for column in TASK_HISTORY_COLUMNS))
+        if not camera.mysql_conn.ExecuteMany(TASK_HISTORY_STITCH_UPDATE, updates):
+            return False
+        camera.main_logger.debug(f"query:{TASK_HISTORY_INSERT}, rows:{len(rows)}")
+        if not camera.mysql_conn.ExecuteMany(TASK_HISTORY_INSERT, rows):
+            return False
+    camera.main_logger.debug(f"mysql insert successfully!")
+    job_ids = {job["job_id"] for job in jobs}
+    for pos_id, task_id in sorted({(job["pos_id"], job["task_id"]) for job in jobs}):
+        if any(other["job_id"] not in job_ids
+               for other in camera.upload_queue.list_task_jobs(pos_id, task_id)):
+            continue  # 拼接中或拼接結果尚未上傳
+        ftp_remove_imgs(camera, pos_id, task_id)
+    return True
+
+
+def task_record(journal):
+    """任務紀錄轉 task_history 欄位"""
+    record = {column: journal.get(column) for column in TASK_HISTORY_COLUMNS}
+    record["task_type"] = record["task_type"] or ""
+    record["ftp_url"] = record["ftp_url"] or ""
+    record["task_time"] = record["task_time"] or "0000-00-00 00:00:00"
+    record["stitch_state"] = record["stitch_state"] or "none"
+    record["requestor"] = record["requestor"] or "manual"
+    return record
+
+
+def migrate_previous_tasks(camera):
+    """
+    舊版任務補上傳 (僅執行一次)：
+        save_imgs 中不在上傳佇列的任務加入佇列，之後未完成任務皆由佇列記錄
+    """
+    marker = os.path.join(camera.upload_queue.queue_dir, LEGACY_MIGRATED_MARKER)
+    if os.path.exists(marker) or not os.path.isdir("save_imgs"):
+        return
+    camera.main_logger.debug("enqueue previous failed task imgs...")
     for pos in os.listdir("save_imgs"):
+        if not os.path.isdir("save_imgs" + os.sep + pos):
+            continue
         for task in os.listdir("save_imgs" + os.sep + pos):
+            if camera.upload_queue.has_task(pos, task):
+                continue
             camera.main_logger.debug(f"pos:{pos}, task:{task}")
-            ret1 = ftp_upload_imgs(camera, pos, task)
-            if ret1:
-                camera.main_logger.debug(
-                    f"uploading successfully, pos:{pos}, task:{task}.")
-                # read info.txt
-                info_txt = "save_imgs" + os.sep + pos + os.sep + task + os.sep + "info.txt"
-                camera.main_logger.debug(f"read info.txt, path{info_txt}.")
-                try:
-                    lines = read_lines(
-                        "save_imgs" + os.sep + pos + os.sep + task + os.sep + "info.txt")
-                except Exception as e:
-                    camera.main_logger.error(
-                        f"read task folder failed, pos:{pos}, task:{task}, error:{e}.")
-                else:
-                    camera.main_logger.debug(f"read info.txt OK!")
-                    task_type = ""
-                    amr_pos_x, amr_pos_y, amr_pos_z, amr_pos_theta, amr_tag_id = None, None, None, None, None
-                    ftp_url = ""
-                    stitch_state = "none"
-                    requestor = "manual"
-                    task_time = "0000-00-00 00:00:00"
-                    for line in lines:
-                        if "task_type" in line:
-                            task_type = line.replace("task_type:", "")
-                        if "amr_pos_x" in line:
-                            amr_pos_x = line.replace("amr_pos_x:", "")
-                        if "amr_pos_y" in line:
-                            amr_pos_y = line.replace("amr_pos_y:", "")
-                        if "amr_pos_z" in line:
-                            amr_pos_z = line.replace("amr_pos_z:", "")
-                        if "amr_pos_theta" in line:
-                            amr_pos_theta = line.replace("amr_pos_theta:", "")
-                        if "amr_tag_id" in line:
-                            amr_tag_id = line.replace("amr_tag_id:", "")
-                        if "ftp_url" in line:
-                            ftp_url = line.replace("ftp_url:", "")
-                        if "stitch_state:" in line:
-                            stitch_state = line.replace("stitch_state:", "")
-                        if "requestor" in line:
-                            requestor = line.replace("requestor:", "")
-                        if "task_time" in line:
-                            task_time = line.replace("task_time:", "")
-                    camera.main_logger.debug(
-                        f"task_type:{task_type}, amr_pos_x:{amr_pos_x}, amr_pos_y:{amr_pos_y}, amr_pos_z:{amr_pos_z}, amr_pos_theta:{amr_pos_theta}, amr_tag_id:{amr_tag_id}, ftp_url:{ftp_url}, stitch_state:{stitch_state}, requestor:{requestor}, task_time:{task_time}")
-
-                    # write to mysql
-                    query = """
-    insert into `task_history` (`task_type`, `amr_pos_X`, `amr_pos_y`, `amr_pos_z`,
-    `amr_pos_theta`, `amr_tag_id`, `ftp_url`, `task_time`, `stitch_state`, `requestor`) values
-    (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s )
-    """
-                    camera.main_logger.debug(f"query:{query}")
-                    data = (task_type, amr_pos_x, amr_pos_y, amr_pos_z, amr_pos_theta,
-                            amr_tag_id, ftp_url, task_time, stitch_state, requestor)
-
-                    if camera.mysql_conn.UpdateRowsByTuple(query, data):
-                        # 上傳成功刪圖像
-                        camera.main_logger.debug(f"mysql insert successfully!")
-                        camera.main_logger.debug("ftp remove imgs")
-                        ftp_remove_imgs(camera, pos, task)
-                    else:
-                        break
+            try:
+                record = task_record(load_task_record(
+                    "save_imgs" + os.sep + pos + os.sep + task))
+            except Exception as e:
+                camera.main_logger.error(
+                    f"read task folder failed, pos:{pos}, task:{task}, error:{e}.")
+                continue
+            camera.main_logger.debug(f"read task record OK! record:{record}")
+            camera.upload_queue.enqueue(pos, task, record)
+    with open(marker, "w") as f:
+        f.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
 
 app = Flask(__name__)
@@ -2302,6 +1679,11 @@ camera = Webcam(filename=rtsp_url,
                 apiPreference=cv2.CAP_FFMPEG, device_name="VC-TR30")
 camera.onvif = clsONVIFCamera(
     onvif_ip, onvif_port, onvif_account, onvif_password)  # onvif
+camera.ptz_detector = PTZArrivalDetector(
+    lambda: get_ptz_position(camera))  # PTZ 到位偵測
+camera.shot_planner = ShotPlanner(
+    calculate_ptz_value, camera.ptz_detector.speed_model,
+    shot_time=camera.ptz_detector.settle_time + 0.5)  # 拍攝順序規劃
 camera.config = config_obj
 
 # camera offset
@@ -2321,10 +1703,48 @@ camera.ir_cam.open_camera()
 main_logger = LogWriter("main")
 camera.main_logger = main_logger
 
+# 增量拼接
+camera.stitcher = IncrementalStitcher(logger=main_logger)
+
+# 最新影像槽，串流、即時圖像與存檔共用
+camera.frame_slots = {
+    "camera": FrameSlot(
+        "camera", lambda: camera.get_img(resize_img=True), logger=main_logger),
+    "front_camera": FrameSlot(
+        "front_camera", lambda: camera.front_camera.get_img(resize_img=True), logger=main_logger),
+    "ir": FrameSlot(
+        "ir", lambda: camera.ir_cam.get_colormap_img(mark_max_temp=True), logger=main_logger),
+    # 即時圖像 (原始尺寸)，網頁輪詢用，頻率較低
+    "camera_snapshot": FrameSlot(
+        "camera_snapshot", lambda: camera.get_img() if camera.is_running() else None,
+        interval=0.1, logger=main_logger),
+    "ir_raw": FrameSlot(
+        "ir_raw", lambda: camera.ir_cam.get_img(), interval=0.1, logger=main_logger),
+}
+
+# 即時圖像 JPEG / Base64 快取，每張影像只編碼一次
+camera.snapshot_caches = {
+    "camera": SnapshotCache(
+        "camera", camera.frame_slots["camera_snapshot"], logger=main_logger),
+    "ir": SnapshotCache("ir", camera.frame_slots["ir_raw"], logger=main_logger),
+    "ir_colormap": SnapshotCache("ir_colormap", camera.frame_slots["ir"], logger=main_logger),
+}
+
+# 拍攝存檔管線
+camera.capture_pipeline = CapturePipeline(
+    workers=2, max_pending=4, logger=main_logger)
+
 # amr
 ams_net_id = config_obj.get_config_data("amr", "ams_net_id")
 camera.amr = AMR(ams_net_id)
 
+# task dispatcher, Flask route 與 PLC 共用
+task_dispatcher = TaskDispatcher(main_logger)
+camera.amr.task_dispatcher = task_dispatcher
+# 任務結束時立即喚醒 PLC dispatcher，回報 CameraWorkStatus
+task_dispatcher.add_finish_listener(
+    lambda task_type: camera.amr.state_cache.wake())
+
 camera.task_requestor = "manual"  # task requestor
 camera.crr_pan = 0
 camera.crr_tilt = 0
@@ -2355,6 +1775,7 @@ camera.panorama_task.is_running = False
 camera.panorama_task.stop_flag = False
 camera.panorama_task.thread = Thread()
 camera.panorama_task.start_time = datetime.now()  # 開始執行時間
+camera.panorama_task.estimated_time = 0.0  # 預估任務時間(秒)
 
 # target
 camera.target_task = Queue()
@@ -2368,6 +1789,7 @@ camera.target_task.is_running = False
 camera.target_task.stop_flag = False
 camera.target_task.thread = Thread()
 camera.target_task.start_time = datetime.now()  # 開始執行時間
+camera.target_task.estimated_time = 0.0  # 預估任務時間(秒)
 camera.target_task.target_pan = 0.0  # 單次目標位置量測
 camera.target_task.target_tilt = 0.0
 camera.target_task.target_zoom = 0.0
@@ -2395,6 +1817,7 @@ camera.designated_task.is_running = False
 camera.designated_task.stop_flag = False
 camera.designated_task.thread = Thread()
 camera.designated_task.start_time = datetime.now()  # 開始執行時間
+camera.designated_task.estimated_time = 0.0  # 預估任務時間(秒)
 camera.designated_task.designated_pan = 0.0
 camera.designated_task.designated_tilt = 0.0
 camera.designated_task.designated_zoom = 0.0
@@ -2412,6 +1835,7 @@ camera.video_task.is_running = False
 camera.video_task.stop_flag = False
 camera.video_task.thread = Thread()
 camera.video_task.start_time = datetime.now()  # 開始執行時間
+camera.video_task.estimated_time = 0.0  # 預估任務時間(秒)
 
 # mysql
 mysql_host = config_obj.get_config_data(
@@ -2422,12 +1846,17 @@ mysql_password = config_obj.get_config_data(
     "mysql", "mysql_password")
 mysql_database = config_obj.get_config_data(
     "mysql", "mysql_database")
-camera.mysql_conn = clsMySqlDB(
+camera.mysql_conn = MySQLPool(
     mysql_host,
     mysql_user,
     mysql_password,
-    mysql_database
-)
+    mysql_database,
+    logger=main_logger
+)  # 連線池，各執行緒不共用連線
+
+# designated / video 計畫快取
+camera.plan_cache = PlanCache(load_designated_rows, query_designated_version,
+                              build_designated_plan, logger=main_logger)
 
 # ftp
 camera.ftp = MyFTP()
@@ -2435,10 +1864,67 @@ camera.ftp.ftp_ip = config_obj.get_config_data("ftp", "ftp_ip")
 camera.ftp.ftp_port = int(config_obj.get_config_data("ftp", "ftp_port"))
 camera.ftp.ftp_account = config_obj.get_config_data("ftp", "ftp_account")
 camera.ftp.ftp_password = config_obj.get_config_data("ftp", "ftp_password")
+camera.ftp_pool = FTPSessionPool(camera.ftp.ftp_ip, camera.ftp.ftp_port,
+                                 camera.ftp.ftp_account, camera.ftp.ftp_password,
+                                 size=3, logger=main_logger)  # 長連線
+camera.ftp_uploader = ParallelUploader(
+    camera.ftp_pool, workers=3, logger=main_logger)  # 多連線上傳
+camera.upload_manifest = UploadManifest("upload_manifest.json")  # 已上傳檔案清單
+camera.image_store = ImageStore(
+    "image_index.db", logger=main_logger)  # 本機圖像索引
+camera.upload_queue = UploadQueue(
+    "upload_queue", upload_task_job, commit_task_jobs, logger=main_logger)  # 背景上傳佇列
+camera.task_history_lock = Lock()  # task_history 寫入與拼接狀態更新
+camera.tiles_root = "panorama_tiles"  # 全景分層圖磚 (上傳後刪除 save_imgs 仍保留)
+camera.stitch_service = StitchService(
+    on_stitch_state, workers=1, memory_mb=1500, tiles_root=camera.tiles_root,
+    logger=main_logger)  # 背景拼接 (獨立 process)
 
 # img
 camera.save_global_coordinate = eval(config_obj.get_config_data(
     "img", "save_global_coordinate"))
+
+
+def reopen_camera(webcam):
+    """重開 RTSP 相機"""
+    webcam.close_camera()
+    webcam.open_camera(True)
+
+
+def reopen_ir_camera():
+    """重開 IR 相機"""
+    camera.ir_cam.close_camera()
+    camera.ir_cam = FLIRA400()
+    camera.ir_cam.open_camera()
+
+
+def reopen_mysql():
+    """重新連線 MySQL"""
+    return camera.mysql_conn.ReOpen()
+
+
+def update_ptz_status():
+    """更新PTZ目前角度"""
+    ptz_status = camera.onvif.get_ptz_status()
+    pan, tilt, zoom = ptz_status.get("pan"), \
+        ptz_status.get("tilt"), \
+        ptz_status.get("zoom")
+    if isinstance(pan, float) and isinstance(tilt, float) and isinstance(zoom, float):
+        camera.crr_pan, camera.crr_tilt, camera.crr_zoom = calculate_ptz_angle([
+            pan, tilt, zoom])
+
+
+# device supervisor, 裝置斷線重連不阻塞 ADS 控制迴圈
+device_supervisor = DeviceSupervisor(main_logger)
+device_supervisor.add_device("camera", camera.is_running,
+                             lambda: reopen_camera(camera))  # ptz camera
+device_supervisor.add_device("front_camera", front_camera.is_running,
+                             lambda: reopen_camera(front_camera))
+device_supervisor.add_device("ir_camera", lambda: camera.ir_cam.is_running,
+                             reopen_ir_camera)
+device_supervisor.add_device("mysql", camera.mysql_conn.IsOpen, reopen_mysql)
+device_supervisor.add_device("ptz", camera.onvif.is_connected,
+                             camera.onvif.open_camera, poll=update_ptz_status)
 ControlKey=0
 
 def add_cors_headers(response):
@@ -2450,6 +1936,16 @@ def add_cors_headers(response):
 app.after_request(add_cors_headers)
 
 
+def get_requestor():
+    """取得任務請求者"""
+    requestor = "manual"
+    if request.is_json:
+        data = request.json
+        if data.get("requestor") != "":
+            requestor = data.get("requestor")
+    return requestor
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -2581,22 +2077,43 @@ def get_camera_status():
     return jsonify(data)
 
 
+def snapshot_response(source, base64=False):
+    """即時圖像回應，ETag 為影像序號，影像未更新時回應 304"""
+    snapshot = camera.snapshot_caches[source].get()
+    if snapshot is None:
+        return Response(status=503)
+    if base64:
+        # 與 ETag 同一張影像的 JPEG，不另外取像編碼
+        response = Response(snapshot.get_base64())
+    else:
+        response = Response(snapshot.jpeg, mimetype="image/jpeg")
+    response.set_etag(snapshot.etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
 @app.route("/camera/get_camera_img", methods=["GET", "POST"])
 def get_camera_img():
     """取即時圖像"""
-    data = None
-    if camera.is_running():
-        img = camera.get_img()
-        ret, encoded_img = cv2.imencode(".jpg", img)
-        if ret:
-            data = encoded_img.tobytes()
-    return data
+    return snapshot_response("camera")
+
+
+@app.route("/camera/get_stitch_preview", methods=["GET", "POST"])
+def get_stitch_preview():
+    """取拼接預覽圖 (任務進行中依已登錄影像串接)"""
+    pano = camera.stitcher.get_preview()
+    if pano is None:
+        return Response(status=503)
+    ret, encoded_img = cv2.imencode(".jpg", pano)
+    if not ret:
+        return Response(status=503)
+    return Response(encoded_img.tobytes(), mimetype="image/jpeg")
 
 
 @app.route("/camera/get_camera_base64_img", methods=["GET", "POST"])
 def get_camera_base64_img():
     """取即時Base64圖像"""
-    return camera.get_base64_img()
+    return snapshot_response("camera", base64=True)
 
 
 @app.route("/camera/move_camera_to_abs/", methods=["GET", "POST"])
@@ -2628,6 +2145,13 @@ def move_camera_to_abs():
     return jsonify(data)
 
 
+@app.route("/camera/get_ptz_move_stats/", methods=["GET", "POST"])
+def get_ptz_move_stats():
+    """獲取PTZ移動時間統計 (預估/實際到位時間、查詢次數)"""
+    data = {"status": True, "message": camera.ptz_detector.get_stats()}
+    return jsonify(data)
+
+
 # amr
 @app.route("/amr/set_amr_pos_x/<int:amr_pos_x>", methods=["GET", "POST"])
 def set_amr_pos_x(amr_pos_x):
@@ -2673,6 +2197,20 @@ def set_amr_tag_id(amr_tag_id):
     return jsonify(data)
 
 
+@app.route("/device/get_device_status", methods=["GET", "POST"])
+def get_device_status():
+    """獲取裝置連線狀態"""
+    data = {"status": True, "message": device_supervisor.get_status()}
+    return jsonify(data)
+
+
+@app.route("/amr/get_scheduler_status", methods=["GET", "POST"])
+def get_scheduler_status():
+    """獲取 PLC 週期性工作統計 (週期、jitter、missed deadline)"""
+    data = {"status": True, "message": camera.amr.scheduler.get_stats()}
+    return jsonify(data)
+
+
 @app.route("/amr/get_amr_status", methods=["GET", "POST"])
 def get_amr_status():
     """獲取 AMR 狀態"""
@@ -2792,16 +2330,14 @@ def download_and_upload_obstacle_imgs():
 
 
 # initial
-@app.route("/initial/start_initial_task", methods=["GET", "POST"])
-def start_initial_task():
+def launch_initial_task(requestor="manual"):
     """Initialize Camera"""
     status, message = False, ""
 
     if not camera.is_running():
         # 相機未開啟
         message = "camera is closed!"
-        data = {"status": status, "message": message}
-        return jsonify(data)
+        return status, message
 
     # clear inital task
     if not camera.initial_task.empty():
@@ -2809,17 +2345,22 @@ def start_initial_task():
     # add initial task
     camera.initial_task.put((-170.0, 90.0, 0.0))  # left up
     camera.initial_task.put((170.0, -30.0, 0.0))  # right down
-    camera.initial_task.thread = Thread(target=run_initial_task,
-                                        args=(camera,))
-    camera.initial_task.thread.start()
+    camera.initial_task.is_running = True  # change status
+    camera.initial_task.thread = task_dispatcher.spawn(
+        "initial", run_initial_task, camera)
     status, message = True, "starting initial task!"
-    data = {"status": status, "message": message}
+    return status, message
+
+
+@app.route("/initial/start_initial_task", methods=["GET", "POST"])
+def start_initial_task():
+    """Initialize Camera"""
+    data = task_dispatcher.start("initial", get_requestor())
     return jsonify(data)
 
 
 # panorama
-@app.route("/panorama/start_panorama_task", methods=["GET", "POST"])
-def start_panorama_task():
+def launch_panorama_task(requestor="manual"):
     """開始拍攝全景圖工作"""
     camera.main_logger.debug("start panorama task!")
 
@@ -2828,14 +2369,8 @@ def start_panorama_task():
     if not camera.is_running():
         # 相機未開啟
         message = "camera is closed!"
-        data = {"status": status, "message": message}
-        return jsonify(data)
+        return status, message
 
-    requestor = "manual"
-    if request.is_json:
-        data = request.json
-        if data.get("requestor") != "":
-            requestor = data.get("requestor")
     camera.main_logger.debug(f"requstor:{requestor}")
 
     # clear inital task
@@ -2864,11 +2399,18 @@ def start_panorama_task():
     camera.pos_folder_tag_id = camera.amr.amr_tag_id
     camera.pos_folder = f"({camera.pos_folder_x},{camera.pos_folder_y},{camera.pos_folder_theta},{camera.pos_folder_tag_id})"
     camera.task_folder = datetime.now().strftime("%Y%m%d%H%M%S")  # task folder
-    camera.panorama_task.thread = Thread(target=run_panorama_task,
-                                         args=(camera,))
-    camera.panorama_task.thread.start()
+    plan_task_shots(camera, camera.panorama_task)  # 依移動時間排序
+    camera.panorama_task.is_running = True  # change status
+    camera.panorama_task.thread = task_dispatcher.spawn(
+        "panorama", run_panorama_task, camera)
     status, message = True, "starting panorama task!"
-    data = {"status": status, "message": message}
+    return status, message
+
+
+@app.route("/panorama/start_panorama_task", methods=["GET", "POST"])
+def start_panorama_task():
+    """開始拍攝全景圖工作"""
+    data = task_dispatcher.start("panorama", get_requestor())
     return jsonify(data)
 
 
@@ -3010,8 +2552,7 @@ def get_panorama_ptz_list():
 
 
 # target
-@app.route("/target/start_target_task", methods=["GET", "POST"])
-def start_target_task():
+def launch_target_task(requestor="manual"):
     """開始拍攝Target環景圖工作"""
     camera.main_logger.debug("start target task!")
 
@@ -3020,14 +2561,8 @@ def start_target_task():
     if not camera.is_running():
         # 相機未開啟
         message = "camera is closed!"
-        data = {"status": status, "message": message}
-        return jsonify(data)
+        return status, message
 
-    requestor = "manual"
-    if request.is_json:
-        data = request.json
-        if data.get("requestor") != "":
-            requestor = data.get("requestor")
     camera.main_logger.debug(f"requstor:{requestor}")
 
     # clear inital task
@@ -3055,11 +2590,18 @@ def start_target_task():
     camera.pos_folder_tag_id = camera.amr.amr_tag_id
     camera.pos_folder = f"({camera.pos_folder_x},{camera.pos_folder_y},{camera.pos_folder_theta},{camera.pos_folder_tag_id})"
     camera.task_folder = datetime.now().strftime("%Y%m%d%H%M%S")  # task folder
-    camera.target_task.thread = Thread(target=run_target_task,
-                                       args=(camera,))
-    camera.target_task.thread.start()
+    plan_task_shots(camera, camera.target_task)  # 依移動時間排序
+    camera.target_task.is_running = True  # change status
+    camera.target_task.thread = task_dispatcher.spawn(
+        "target", run_target_task, camera)
     status, message = True, "starting target task!"
-    data = {"status": status, "message": message}
+    return status, message
+
+
+@app.route("/target/start_target_task", methods=["GET", "POST"])
+def start_target_task():
+    """開始拍攝Target環景圖工作"""
+    data = task_dispatcher.start("target", get_requestor())
     return jsonify(data)
 
 
@@ -3313,8 +2855,82 @@ def get_target_ptz_list():
 
 
 # designated
-@app.route("/designated/start_designated_task", methods=["GET", "POST"])
-def start_designated_task():
+DESIGNATED_TASK_SELECT = """
+select `primary_key`, `pan`, `tilt`, `zoom`, `amr_pos_x`, `amr_pos_y`, `amr_pos_z`,
+`amr_pos_theta`, `amr_tag_id`, `video_time`
+from `designated_task`
+where 1 = 1
+and `amr_tag_id`  = %s
+and `task_type` = %s
+"""
+# 計畫版本：筆數、最後建立時間、內容 checksum
+DESIGNATED_TASK_VERSION = """
+select count(*), max(`create_time`),
+sum(crc32(concat_ws(',', `primary_key`, `pan`, `tilt`, `zoom`, `amr_pos_theta`, `video_time`)))
+from `designated_task`
+where 1 = 1
+and `amr_tag_id`  = %s
+and `task_type` = %s
+"""
+
+
+def load_designated_rows(task_type, tag_id):
+    """讀取 designated_task 資料列"""
+    return camera.mysql_conn.SelectRowsByTuple(
+        DESIGNATED_TASK_SELECT, (tag_id, task_type), raise_error=True)
+
+
+def query_designated_version(task_type, tag_id):
+    """designated_task 版本 (含 camera_offset，設定變更時重新換算)"""
+    rows = camera.mysql_conn.SelectRowsByTuple(
+        DESIGNATED_TASK_VERSION, (tag_id, task_type), raise_error=True)
+    return f"{list(rows[0]) if rows else None}|{camera.camera_offset}"
+
+
+def to_number(value):
+    """MySQL Decimal / float 轉 int / float"""
+    if value is None or isinstance(value, int):
+        return value
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def build_designated_plan(rows):
+    """designated_task 資料列換算為拍攝計畫 (目標方位角，與 AMR 目前角度無關)"""
+    if not rows:
+        return []
+    # calculate the target (整批換算)
+    target_pos = target_bearing([to_number(row[7]) for row in rows], camera.camera_offset,
+                                [to_number(row[1]) for row in rows])
+    return [{"primary_key": row[0], "target_pos": to_number(pos),
+             "tilt": to_number(row[2]), "zoom": to_number(row[3]),
+             "video_time": to_number(row[9])}
+            for row, pos in zip(rows, target_pos.tolist())]
+
+
+def put_plan_shots(camera, task_queue, plan, video=False):
+    """依 AMR 目前角度換算 pan，加入 task"""
+    if not plan:
+        return
+    # calculate input pan (超出 ±170度時反方向)
+    input_pans, valid = bearing_to_pan(camera.amr.amr_pos_theta, camera.camera_offset,
+                                       [shot["target_pos"] for shot in plan])
+    for shot, input_pan, ok in zip(plan, input_pans.tolist(), valid.tolist()):
+        input_pan = to_number(input_pan)
+        if not ok:
+            camera.main_logger.error(
+                f"input pan:{input_pan}, is not a valid angle, pass")
+            continue
+        if video:
+            task_queue.put(
+                (input_pan, shot["tilt"], shot["zoom"], shot["video_time"]))
+        else:
+            task_queue.put((input_pan, shot["tilt"], shot["zoom"]))
+    camera.main_logger.debug(
+        f"amr_pos_theta:{camera.amr.amr_pos_theta}, shots:{list(task_queue.queue)}")
+
+
+def launch_designated_task(requestor="manual"):
     """開始拍攝designated工作"""
     camera.main_logger.debug("start designated task!")
 
@@ -3323,14 +2939,8 @@ def start_designated_task():
     if not camera.is_running():
         # 相機未開啟
         message = "camera is closed!"
-        data = {"status": status, "message": message}
-        return jsonify(data)
+        return status, message
 
-    requestor = "manual"
-    if request.is_json:
-        data = request.json
-        if data.get("requestor") != "":
-            requestor = data.get("requestor")
     camera.main_logger.debug(f"requstor:{requestor}")
 
     # clear inital task
@@ -3344,80 +2954,17 @@ def start_designated_task():
     if not camera.designated_task.empty():
         camera.designated_task.queue.clear()
 
-    # 取得designated task
-    query = """
-select `primary_key`, `pan`, `tilt`, `zoom`, `amr_pos_x`, `amr_pos_y`, `amr_pos_z`,
-amr_pos_theta, amr_tag_id
-from `designated_task`
-where 1 = 1
-and `amr_tag_id`  = %s
-and `task_type` = 'designated'
-"""
-    data = (camera.amr.amr_tag_id)
-    # data = (0)
-
-    tasks = camera.mysql_conn.SelectRowsByTuple(query, data)
+    # 取得designated task (快取計畫，MySQL 無法連線時使用最後一次計畫)
+    plan, source = camera.plan_cache.get("designated", camera.amr.amr_tag_id)
     camera.main_logger.debug(
-        f"amr_tag_id:{camera.amr.amr_tag_id}, tasks:{tasks}")
-    if not tasks:
+        f"amr_tag_id:{camera.amr.amr_tag_id}, plan source:{source}, shots:{len(plan) if plan else 0}")
+    if not plan:
         message = f"no designated task available in tag id: {camera.amr.amr_tag_id}"
-        data = {"status": status, "message": message}
         camera.main_logger.debug(message)
-        return jsonify(data)
+        return status, message
 
     # 加入task
-    for task in tasks:
-        # pan, theta mysql record data
-        pan = task[1]
-        theta = task[7]
-        camera.main_logger.info(
-            f"theta:{theta}, camera_offset:{camera.camera_offset}, pan:{pan}")
-
-        # calculate the target
-        theta_converted = convert_angle(theta)
-        camera_pos = theta_converted + camera.camera_offset
-        camera_pos_converted = convert_angle(camera_pos)
-        target_pos = camera_pos_converted - pan
-        target_pos_converted = convert_angle(target_pos)
-        camera.main_logger.info(
-            f"theta_converted:{theta_converted}, camera_pos_converted:{camera_pos_converted}, target_converted:{target_pos_converted}")
-
-        # calculate input pan
-        input_theta = camera.amr.amr_pos_theta
-        input_theta_converted = convert_angle(input_theta)
-        input_camera_pos = input_theta_converted + camera.camera_offset
-        input_camera_pos_converted = convert_angle(input_camera_pos)
-        input_pan = input_camera_pos_converted - target_pos_converted
-        camera.main_logger.info(
-            f"input_theta_converted:{input_theta_converted}, input_camera_pos_converted:{input_camera_pos_converted}, input_pan:{input_pan}")
-
-        camera.main_logger.info(
-            f"input pan:{input_pan}, input tilt:{task[2]}, input zoom:{task[3]}")
-        if input_pan > 170:
-            # calculate reverse directon
-            reverse_input_pan = input_pan - 360  # reverse direction
-            camera.main_logger.info(f"reverse input pan:{reverse_input_pan}")
-            if reverse_input_pan >= -170 and reverse_input_pan <= 170:
-                camera.designated_task.put(
-                    (reverse_input_pan, task[2], task[3]))
-                camera.main_logger.debug(f"add command ok!")
-            else:
-                camera.main_logger.error(
-                    f"input pan:{input_pan}, is not a valid angle, pass")
-        elif input_pan < -170:
-            # calculate reverse directon
-            reverse_input_pan = input_pan + 360  # reverse direction
-            camera.main_logger.info(f"reverse input pan:{reverse_input_pan}")
-            if reverse_input_pan >= -170 and reverse_input_pan <= 170:
-                camera.designated_task.put(
-                    (reverse_input_pan, task[2], task[3]))
-                camera.main_logger.debug(f"add command ok!")
-            else:
-                camera.main_logger.error(
-                    f"input pan:{input_pan}, is not a valid angle, pass")
-        else:  # -170 ~ 170 ok
-            camera.designated_task.put((input_pan, task[2], task[3]))
-            camera.main_logger.debug(f"add command ok!")
+    put_plan_shots(camera, camera.designated_task, plan)
 
     # 開始Designated Task拍攝
     camera.task_requestor = requestor
@@ -3429,11 +2976,18 @@ and `task_type` = 'designated'
     camera.pos_folder_tag_id = camera.amr.amr_tag_id
     camera.pos_folder = f"({camera.pos_folder_x},{camera.pos_folder_y},{camera.pos_folder_theta},{camera.pos_folder_tag_id})"
     camera.task_folder = datetime.now().strftime("%Y%m%d%H%M%S")  # task folder
-    camera.designated_task.thread = Thread(target=run_designated_task,
-                                           args=(camera,))
-    camera.designated_task.thread.start()
+    plan_task_shots(camera, camera.designated_task)  # 依移動時間排序
+    camera.designated_task.is_running = True  # change status
+    camera.designated_task.thread = task_dispatcher.spawn(
+        "designated", run_designated_task, camera)
     status, message = True, "starting designated task!"
-    data = {"status": status, "message": message}
+    return status, message
+
+
+@app.route("/designated/start_designated_task", methods=["GET", "POST"])
+def start_designated_task():
+    """開始拍攝designated工作"""
+    data = task_dispatcher.start("designated", get_requestor())
     return jsonify(data)
 
 
@@ -3536,16 +3090,22 @@ insert into `designated_task` (`pan`, `tilt`, `zoom`,
     if not status:
         message = "insert into remote DB failed!"
         data = {"status": status, "message": message}
-        camera.mysql_conn.ReOpen()
         return jsonify(data)
+    camera.plan_cache.invalidate(task_type, tag_id)  # 計畫重新載入
     message = "insert into remote DB successfully!"
     data = {"status": status, "message": message}
     return jsonify(data)
 
 
+@app.route("/designated/get_plan_cache/", methods=["GET", "POST"])
+def get_plan_cache():
+    """獲取 designated/video 計畫快取"""
+    data = {"status": True, "message": camera.plan_cache.get_status()}
+    return jsonify(data)
+
+
 # ir
-@app.route("/ir/start_ir_task", methods=["GET", "POST"])
-def start_ir_task():
+def launch_ir_task(requestor="manual"):
     """開始拍攝熱顯像圖工作"""
     camera.main_logger.debug(f"start ir task...")
 
@@ -3554,14 +3114,8 @@ def start_ir_task():
     if not camera.is_running():
         # 相機未開啟
         message = "camera is closed!"
-        data = {"status": status, "message": message}
-        return jsonify(data)
+        return status, message
 
-    requestor = "manual"
-    if request.is_json:
-        data = request.json
-        if data.get("requestor") != "":
-            requestor = data.get("requestor")
     camera.main_logger.debug(f"requstor:{requestor}")
 
     # 開始Target全景拍攝
@@ -3574,28 +3128,34 @@ def start_ir_task():
     camera.pos_folder_tag_id = camera.amr.amr_tag_id
     camera.pos_folder = f"({camera.pos_folder_x},{camera.pos_folder_y},{camera.pos_folder_theta},{camera.pos_folder_tag_id})"
     camera.task_folder = datetime.now().strftime("%Y%m%d%H%M%S")  # task folder
-    camera.ir_task.thread = Thread(target=run_ir_task, args=(camera,))
-    camera.ir_task.thread.start()
+    camera.ir_task.is_running = True  # change status
+    camera.ir_task.thread = task_dispatcher.spawn(
+        "ir", run_ir_task, camera)
     status, message = True, "starting ir task!"
-    data = {"status": status, "message": message}
+    return status, message
+
+
+@app.route("/ir/start_ir_task", methods=["GET", "POST"])
+def start_ir_task():
+    """開始拍攝熱顯像圖工作"""
+    data = task_dispatcher.start("ir", get_requestor())
     return jsonify(data)
 
 
 @app.route("/ir/get_ir_base64_img", methods=["GET", "POST"])
 def get_ir_base64_img():
     """取即時IR Base64圖像"""
-    return camera.ir_cam.get_base64_img()
+    return snapshot_response("ir", base64=True)
 
 
 @app.route("/ir/get_ir_base64_colormap_img", methods=["GET", "POST"])
 def get_ir_base64_colormap_img():
     """取即時IR Base64 ColorMap圖像"""
-    return camera.ir_cam.get_base64_colormap_img(mark_max_temp=True)
+    return snapshot_response("ir_colormap", base64=True)
 
 
 # video
-@app.route("/video/start_video_task", methods=["GET", "POST"])
-def start_video_task():
+def launch_video_task(requestor="manual"):
     """start video task"""
     camera.main_logger.debug(f"start video task...")
 
@@ -3604,95 +3164,25 @@ def start_video_task():
     if not camera.is_running():
         # 相機未開啟
         message = "camera is closed!"
-        data = {"status": status, "message": message}
-        return jsonify(data)
+        return status, message
 
-    requestor = "manual"
-    if request.is_json:
-        data = request.json
-        if data.get("requestor") != "":
-            requestor = data.get("requestor")
     camera.main_logger.debug(f"requstor:{requestor}")
 
     # 清空task
     if not camera.video_task.empty():
         camera.video_task.queue.clear()
 
-    # 取得video task
-    query = """
-select `primary_key`, `pan`, `tilt`, `zoom`, `amr_pos_x`, `amr_pos_y`, `amr_pos_z`,
-`amr_pos_theta`, `amr_tag_id`, `video_time`
-from `designated_task`
-where 1 = 1
-and `amr_tag_id`  = %s
-and `task_type` = 'video'
-"""
-    data = (camera.amr.amr_tag_id)
-    # data = (0)
-
-    tasks = camera.mysql_conn.SelectRowsByTuple(query, data)
+    # 取得video task (快取計畫，MySQL 無法連線時使用最後一次計畫)
+    plan, source = camera.plan_cache.get("video", camera.amr.amr_tag_id)
     camera.main_logger.debug(
-        f"amr_tag_id:{camera.amr.amr_tag_id}, tasks:{tasks}")
-    if not tasks:
+        f"amr_tag_id:{camera.amr.amr_tag_id}, plan source:{source}, shots:{len(plan) if plan else 0}")
+    if not plan:
         message = f"no video task available in tag id: {camera.amr.amr_tag_id}"
-        data = {"status": status, "message": message}
         camera.main_logger.debug(message)
-        return jsonify(data)
+        return status, message
 
     # 加入task
-    for task in tasks:
-        # pan, theta mysql record data
-        pan = task[1]
-        theta = task[7]
-        video_time = task[9]
-        camera.main_logger.info(
-            f"theta:{theta}, camera_offset:{camera.camera_offset}, pan:{pan}, video_time:{video_time}")
-
-        # calculate the target
-        theta_converted = convert_angle(theta)
-        camera_pos = theta_converted + camera.camera_offset
-        camera_pos_converted = convert_angle(camera_pos)
-        target_pos = camera_pos_converted - pan
-        target_pos_converted = convert_angle(target_pos)
-        camera.main_logger.info(
-            f"theta_converted:{theta_converted}, camera_pos_converted:{camera_pos_converted}, target_converted:{target_pos_converted}")
-
-        # calculate input pan
-        input_theta = camera.amr.amr_pos_theta
-        input_theta_converted = convert_angle(input_theta)
-        input_camera_pos = input_theta_converted + camera.camera_offset
-        input_camera_pos_converted = convert_angle(input_camera_pos)
-        input_pan = input_camera_pos_converted - target_pos_converted
-        camera.main_logger.info(
-            f"input_theta_converted:{input_theta_converted}, input_camera_pos_converted:{input_camera_pos_converted}, input_pan:{input_pan}")
-
-        camera.main_logger.info(
-            f"input pan:{input_pan}, input tilt:{task[2]}, input zoom:{task[3]}")
-        if input_pan > 170:
-            # calculate reverse directon
-            reverse_input_pan = input_pan - 360  # reverse direction
-            camera.main_logger.info(f"reverse input pan:{reverse_input_pan}")
-            if reverse_input_pan >= -170 and reverse_input_pan <= 170:
-                camera.video_task.put(
-                    (reverse_input_pan, task[2], task[3], video_time))
-                camera.main_logger.debug(f"add video task ok!")
-            else:
-                camera.main_logger.error(
-                    f"input pan:{input_pan}, is not a valid angle, pass")
-        elif input_pan < -170:
-            # calculate reverse directon
-            reverse_input_pan = input_pan + 360  # reverse direction
-            camera.main_logger.info(f"reverse input pan:{reverse_input_pan}")
-            if reverse_input_pan >= -170 and reverse_input_pan <= 170:
-                camera.video_task.put(
-                    (reverse_input_pan, task[2], task[3], video_time))
-                camera.main_logger.debug(f"add video task ok!")
-            else:
-                camera.main_logger.error(
-                    f"input pan:{input_pan}, is not a valid angle, pass")
-        else:  # -170 ~ 170 ok
-            camera.video_task.put((input_pan, task[2], task[3], video_time))
-            camera.main_logger.debug(f"add video task ok!")
+    put_plan_shots(camera, camera.video_task, plan, video=True)
 
     # 開始 Video 拍攝
     camera.task_requestor = requestor
@@ -3704,18 +3194,40 @@ and `task_type` = 'video'
     camera.pos_folder_tag_id = camera.amr.amr_tag_id
     camera.pos_folder = f"({camera.pos_folder_x},{camera.pos_folder_y},{camera.pos_folder_theta},{camera.pos_folder_tag_id})"
     camera.task_folder = datetime.now().strftime("%Y%m%d%H%M%S")  # task folder
-    camera.video_task.thread = Thread(target=run_video_task, args=(camera,))
-    camera.video_task.thread.start()
+    plan_task_shots(camera, camera.video_task, sum(
+        shot[3] for shot in camera.video_task.queue
+        if isinstance(shot[3], (int, float))))  # 依移動時間排序
+    camera.video_task.is_running = True  # change status
+    camera.video_task.thread = task_dispatcher.spawn(
+        "video", run_video_task, camera)
     status, message = True, "starting video task!"
-    data = {"status": status, "message": message}
+    return status, message
+
+
+@app.route("/video/start_video_task", methods=["GET", "POST"])
+def start_video_task():
+    """start video task"""
+    data = task_dispatcher.start("video", get_requestor())
     return jsonify(data)
 
 
 # ftp
+def get_page_args():
+    """分頁參數 offset, limit"""
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = request.args.get("limit")
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        offset, limit = 0, None
+    return offset, limit
+
+
 @app.route("/ftp/get_pos_list/", methods=["GET", "POST"])
 def get_pos_list():
     """取得拍攝點位清單"""
-    data = {"status": os.listdir("./save_imgs")}
+    offset, limit = get_page_args()
+    data = {"status": camera.image_store.list_pos(offset, limit)}
     return jsonify(data)
 
 
@@ -3725,9 +3237,10 @@ def get_task_list():
     data = {"status": None}
     pos_id = request.args.get("pos")
     if pos_id:
-        dir = "./save_imgs" + os.sep + pos_id
-        if os.path.exists(dir):
-            data = {"status": os.listdir(dir)}
+        offset, limit = get_page_args()
+        tasks = camera.image_store.list_tasks(pos_id, offset, limit)
+        if tasks:
+            data = {"status": tasks}
     return jsonify(data)
 
 
@@ -3738,9 +3251,30 @@ def get_img_list():
     pos_id = request.args.get("pos")
     task_id = request.args.get("task")
     if pos_id and task_id:
-        dir = "./save_imgs" + os.sep + pos_id + os.sep + task_id
-        if os.path.exists(dir):
-            data = {"status": os.listdir(dir)}
+        offset, limit = get_page_args()
+        imgs = camera.image_store.list_images(pos_id, task_id, offset, limit)
+        if imgs:
+            data = {"status": imgs}
+    return jsonify(data)
+
+
+@app.route("/ftp/find_tasks/", methods=["GET", "POST"])
+def find_tasks():
+    """依 tag id、任務類型、時間 (since, until) 查詢本機任務"""
+    offset, limit = get_page_args()
+    tasks = camera.image_store.find_tasks(
+        tag_id=request.args.get("tag"), task_type=request.args.get("task_type"),
+        since=request.args.get("since"), until=request.args.get("until"),
+        offset=offset, limit=limit)
+    data = {"status": True, "message": tasks}
+    return jsonify(data)
+
+
+@app.route("/ftp/rebuild_img_index/", methods=["GET", "POST"])
+def rebuild_img_index():
+    """由 save_imgs 重建圖像索引"""
+    camera.image_store.rebuild()
+    data = {"status": True, "message": "rebuild image index!"}
     return jsonify(data)
 
 
@@ -3759,6 +3293,87 @@ def upload_task_imgs():
     return jsonify(data)
 
 
+@app.route("/ftp/get_upload_status/", methods=["GET", "POST"])
+def get_upload_status():
+    """獲取FTP上傳統計 (傳輸量、重試、續傳)"""
+    message = camera.ftp_uploader.get_stats()
+    message["pool"] = camera.ftp_pool.get_stats()
+    data = {"status": True, "message": message}
+    return jsonify(data)
+
+
+@app.route("/ftp/get_upload_queue/", methods=["GET", "POST"])
+def get_upload_queue():
+    """獲取背景上傳佇列狀態"""
+    data = {"status": True, "message": camera.upload_queue.get_status()}
+    return jsonify(data)
+
+
+@app.route("/stitch/get_stitch_status/", methods=["GET", "POST"])
+def get_stitch_status():
+    """獲取背景拼接佇列狀態"""
+    data = {"status": True, "message": camera.stitch_service.get_status()}
+    return jsonify(data)
+
+
+@app.route("/stitch/get_tiles_info/", methods=["GET", "POST"])
+def get_tiles_info():
+    """獲取全景分層圖磚資訊 (寬高、圖磚大小、層數)"""
+    pos_id = request.args.get("pos")
+    task_id = request.args.get("task")
+    info = None
+    if pos_id and task_id:
+        info = read_tiles_info(pos_id, task_id)
+    if info is None:
+        data = {"status": False, "message": "tiles not found!"}
+    else:
+        # 網址包含版本，重新拼接後網址改變
+        base_url = f"/stitch/tiles/{pos_id}/{task_id}/{info['version']}"
+        info["dzi"] = f"{base_url}/{DZI_NAME}"
+        info["preview"] = f"{base_url}/{PREVIEW_NAME}"
+        data = {"status": True, "message": info}
+    return jsonify(data)
+
+
+def read_tiles_info(pos_id, task_id):
+    """讀取任務圖磚資訊，不存在時回傳 None"""
+    if ".." in pos_id + task_id:
+        return None
+    return read_pyramid_info(camera.tiles_root + os.sep + pos_id + os.sep + task_id)
+
+
+def tiles_file_response(pos_id, task_id, version, path):
+    """圖磚檔案 (網址含版本，內容不變，長時間快取)，版本不符 (已重新拼接) 時回應 404"""
+    info = read_tiles_info(pos_id, task_id)
+    if info is None or info["version"] != version:
+        return Response(status=404)
+    response = send_from_directory(camera.tiles_root, f"{pos_id}/{task_id}/{path}")
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@app.route("/stitch/tiles/<pos_id>/<task_id>/<version>/<name>", methods=["GET"])
+def get_tiles_file(pos_id, task_id, version, name):
+    """全景圖磚描述檔 (image.dzi) 與預覽圖 (preview.jpg)"""
+    if name not in (DZI_NAME, PREVIEW_NAME):
+        return Response(status=404)
+    return tiles_file_response(pos_id, task_id, version, name)
+
+
+@app.route("/stitch/tiles/<pos_id>/<task_id>/<version>/image_files/<int:level>/<tile>", methods=["GET"])
+def get_tile(pos_id, task_id, version, level, tile):
+    """全景圖磚 (OpenSeadragon 依 image.dzi 取 image_files/<level>/<col>_<row>.jpg)"""
+    return tiles_file_response(pos_id, task_id, version, f"{level}/{tile}")
+
+
+@app.route("/ftp/retry_upload_queue/", methods=["GET", "POST"])
+def retry_upload_queue():
+    """背景上傳佇列立即重試"""
+    camera.upload_queue.wake()
+    data = {"status": True, "message": "retry upload queue!"}
+    return jsonify(data)
+
+
 @app.route("/ftp/remove_task_imgs/", methods=["GET", "POST"])
 def remove_task_imgs():
     """刪除TASK舊圖片"""
@@ -3770,7 +3385,7 @@ def remove_task_imgs():
         if os.path.exists(dir):
             # 刪檔
             files = os.listdir(dir)
-            success1, True
+            success1 = True
             for file in files:
                 try:
                     os.remove(dir + os.sep + file)
@@ -3778,6 +3393,8 @@ def remove_task_imgs():
                     print(f"remove file:{file} failed!")
                     success1 = False
                     message = "remove file failed!"
+            camera.upload_manifest.forget_dir(dir)
+            camera.image_store.remove_task(pos_id, task_id)
 
             # 刪task資料夾
             success2 = True
@@ -3798,83 +3415,89 @@ def remove_task_imgs():
     return jsonify(data)
 
 
-# img streamming
-def gen_camera_video(camera):
-    while True:
-        try:
-            frame = camera.get_img(resize_img=True)
-            ret, jpeg = cv2.imencode(".jpg", frame)
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n\r\n')
-            time.sleep(0.03)
-        except:
-            print("some thing error")
-            break
+# img streamming, 每個來源只編碼一次，所有連線共用
+camera.broadcasters = {source: MJPEGBroadcaster(source, camera.frame_slots[source], logger=main_logger)
+                       for source in ("camera", "front_camera", "ir")}
 
 
-def gen_front_camera_video(camera):
-    while True:
-        try:
-            frame = camera.front_camera.get_img(resize_img=True)
-            ret, jpeg = cv2.imencode(".jpg", frame)
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n\r\n')
-            time.sleep(0.03)
-        except:
-            print("some thing error")
-            break
+def get_stream_options():
+    """
+    串流參數：
+        fps：目標頻率，width：輸出寬度，quality：最高 JPEG 品質 (10 ~ 95)，
+        adaptive：依頻寬自動調整品質 (預設 1)
+    """
+    fps = request.args.get("fps", type=float)
+    width = request.args.get("width", type=int)
+    quality = request.args.get("quality", type=int)
+    if quality is not None:
+        quality = max(10, min(95, quality))
+    adaptive = request.args.get("adaptive", "1") not in ("0", "false", "False")
+    return StreamOptions(fps, width, quality, adaptive)
 
 
-def gen_ir_camera_video(camera):
-    while True:
-        try:
-            frame = camera.ir_cam.get_colormap_img(mark_max_temp=True)
-            ret, jpeg = cv2.imencode(".jpg", frame)
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n\r\n')
-            time.sleep(0.03)
-        except:
-            print("some thing error")
-            break
+def video_feed_response(source):
+    return Response(camera.broadcasters[source].stream(get_stream_options()),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
 @app.route("/camera/camera_video_feed")
 def camera_video_feed():
-    return Response(gen_camera_video(camera),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return video_feed_response("camera")
 
 
 # for 20240722 demo 2nd source
 @app.route("/camera/camera_video_feed1")
 def camera_video_feed1():
-    return Response(gen_camera_video(camera),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return video_feed_response("camera")
 
 
 @app.route("/front_camera/front_camera_video_feed")
 def front_camera_video_feed():
-    return Response(gen_front_camera_video(camera),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return video_feed_response("front_camera")
 
 
 # for 20240722 demo 2nd source
 @app.route("/front_camera/front_camera_video_feed1")
 def front_camera_video_feed1():
-    return Response(gen_front_camera_video(camera),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return video_feed_response("front_camera")
 
 
 @app.route("/ir/ir_camera_video_feed")
 def ir_camera_video_feed():
-    return Response(gen_ir_camera_video(camera),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return video_feed_response("ir")
 
 
 # for 20240722 demo 2nd source
 @app.route("/ir/ir_camera_video_feed1")
 def ir_camera_video_feed1():
-    return Response(gen_ir_camera_video(camera),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    return video_feed_response("ir")
+
+
+@app.route("/camera/get_stream_stats/", methods=["GET", "POST"])
+def get_stream_stats():
+    """串流編碼與連線統計、各相機取像頻率與丟棄數量、即時圖像快取統計"""
+    message = {"frame_slot": {source: slot.get_stats()
+                              for source, slot in camera.frame_slots.items()},
+               "broadcaster": {source: broadcaster.get_stats()
+                               for source, broadcaster in camera.broadcasters.items()},
+               "snapshot": {source: cache.get_stats()
+                            for source, cache in camera.snapshot_caches.items()}}
+    data = {"status": True, "message": message}
+    return jsonify(data)
+
+# 註冊任務
+task_dispatcher.register("initial", launch_initial_task,
+                         lambda: camera.initial_task.is_running)
+task_dispatcher.register("panorama", launch_panorama_task,
+                         lambda: camera.panorama_task.is_running)
+task_dispatcher.register("target", launch_target_task,
+                         lambda: camera.target_task.is_running)
+task_dispatcher.register("designated", launch_designated_task,
+                         lambda: camera.designated_task.is_running)
+task_dispatcher.register("ir", launch_ir_task,
+                         lambda: camera.ir_task.is_running)
+task_dispatcher.register("video", launch_video_task,
+                         lambda: camera.video_task.is_running)
 
 if __name__ == "__main__":
 
@@ -3889,5 +3512,17 @@ if __name__ == "__main__":
     # 開啟mysql連線
     camera.mysql_conn.Open()
 
+    # 裝置連線監控
+    device_supervisor.start()
+
+    # FTP keepalive
+    camera.ftp_pool.start_keepalive()
+
+    # 背景上傳佇列，補上舊版未上傳的任務
+    migrate_previous_tasks(camera)
+    camera.stitch_service.start()
+    resume_stitch_jobs(camera)
+    camera.upload_queue.start()
+
     app.run(host="0.0.0.0", threaded=True, debug=False,
             port=8080)
@@ -0,0 +1,161 @@
+"""
+PTZ 到位偵測：
+    依移動距離與 PTZ 速度預估到位時間，到位前以較低頻率查詢，
+    接近預估時間時提高查詢頻率 (有上下限)，避免 ONVIF GetStatus 被連續呼叫。
+    位置連續在容許誤差內且不再變動即視為到位，再等待穩定時間後返回。
+    穩定時間需涵蓋 RTSP 串流延遲 (尚無取像時間可量測)，預設沿用原本固定等待的 1 秒。
+"""
+import time
+from collections import deque
+from threading import Lock
+from typing import Callable, List, Optional
+
+
+class PTZSpeedModel:
+    """
+    PTZ 速度模型 (ONVIF 控制值/秒)：
+        預估時間 = latency + max(各軸距離 / 各軸速度) * scale
+        scale 依實際移動時間以 EMA 修正
+    """
+
+    def __init__(self, pan_speed=0.6, tilt_speed=0.5, zoom_speed=0.4, latency=0.15, alpha=0.2):
+        self.speeds = [pan_speed, tilt_speed, zoom_speed]
+        self.latency = latency  # 指令延遲(秒)
+        self.alpha = alpha  # EMA 權重
+        self.scale = 1.0
+        self.lock = Lock()
+
+    def travel_time(self, start: Optional[List[float]], target: List[float]) -> float:
+        """不含延遲的移動時間(秒)，start 未知時以最遠距離估算"""
+        if start is None:
+            return max(2.0 / speed for speed in self.speeds)
+        return max(abs(t - s) / speed for s, t, speed in zip(start, target, self.speeds))
+
+    def predict(self, start: Optional[List[float]], target: List[float]) -> float:
+        """預估到位時間(秒)"""
+        with self.lock:
+            return self.latency + self.travel_time(start, target) * self.scale
+
+    def observe(self, start: Optional[List[float]], target: List[float], elapsed: float):
+        """依實際到位時間修正 scale"""
+        if start is None:
+            return
+        travel = self.travel_time(start, target)
+        if travel < 0.05:
+            # 距離過短，量測誤差大
+            return
+        ratio = max(0.2, min(5.0, (elapsed - self.latency) / travel))
+        with self.lock:
+            self.scale += self.alpha * (ratio - self.scale)
+
+
+class MoveTiming:
+    """單次移動時間統計"""
+
+    def __init__(self, target: List[float]):
+        self.target = target
+        self.success = False
+        self.reason = ""
+        self.predicted = 0.0  # 預估到位時間(秒)
+        self.arrived = 0.0  # 實際到位時間(秒)
+        self.total = 0.0  # 含穩定時間(秒)
+        self.polls = 0  # GetStatus 查詢次數
+        self.position = None  # 最後一次查詢位置
+
+    def get_status(self) -> dict:
+        return {
+            "target": [round(v, 4) for v in self.target],
+            "success": self.success,
+            "reason": self.reason,
+            "predicted": round(self.predicted, 3),
+            "arrived": round(self.arrived, 3),
+            "total": round(self.total, 3),
+            "polls": self.polls,
+        }
+
+
+class PTZArrivalDetector:
+    """PTZ 到位偵測"""
+
+    def __init__(self, get_position: Callable, speed_model: Optional[PTZSpeedModel] = None,
+                 tolerance=0.005, still_tolerance=0.001, min_interval=0.05, max_interval=0.5,
+                 settle_time=1.0, history_size=100):
+        self.get_position = get_position  # get_position() -> [pan, tilt, zoom] 或 None
+        self.speed_model = speed_model or PTZSpeedModel()
+        self.tolerance = tolerance  # 到位容許誤差
+        self.still_tolerance = still_tolerance  # 兩次查詢間變化小於此值視為靜止
+        self.min_interval = min_interval  # 最短查詢間隔(秒)
+        self.max_interval = max_interval  # 最長查詢間隔(秒)
+        self.settle_time = settle_time  # 到位後等待影像穩定與串流延遲(秒)
+        self.history = deque(maxlen=history_size)
+        self.lock = Lock()
+
+    def poll_interval(self, remaining: float) -> float:
+        """距預估到位時間越近，查詢越頻繁"""
+        return max(self.min_interval, min(self.max_interval, remaining / 2))
+
+    def wait(self, start: Optional[List[float]], target: List[float], timeout: float,
+             move_time: Optional[float] = None) -> MoveTiming:
+        """
+        等待 PTZ 到位，start 為移動前位置 (未知時為 None)，
+        move_time 為送出移動指令時間 (time.monotonic)
+        """
+        timing = MoveTiming(target)
+        t0 = time.monotonic() if move_time is None else move_time
+        end = t0 + timeout
+        timing.predicted = self.speed_model.predict(start, target)
+        eta = t0 + timing.predicted
+        last = None
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                timing.reason = "timeout"
+                break
+
+            position = self.get_position()
+            timing.polls += 1
+            if position is None:
+                timing.reason = "get ptz value failed"
+                break
+            timing.position = position
+
+            arrived = all(abs(t - p) <= self.tolerance for t, p in zip(target, position))
+            still = last is not None and \
+                all(abs(p - q) <= self.still_tolerance for p, q in zip(position, last))
+            if arrived and (still or now >= eta):
+                timing.success = True
+                timing.arrived = time.monotonic() - t0
+                break
+            last = position
+
+            if arrived:
+                # 已在誤差內，以最短間隔確認靜止
+                delay = self.min_interval
+            else:
+                delay = self.poll_interval(eta - time.monotonic())
+            time.sleep(max(0.0, min(delay, end - time.monotonic())))
+
+        if timing.success:
+            self.speed_model.observe(start, target, timing.arrived)
+            time.sleep(self.settle_time)
+        timing.total = time.monotonic() - t0
+        with self.lock:
+            self.history.append(timing)
+        return timing
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            history = list(self.history)
+        done = [timing for timing in history if timing.success]
+        stats = {
+            "moves": len(history),
+            "failed": len(history) - len(done),
+            "scale": round(self.speed_model.scale, 3),
+            "last": [timing.get_status() for timing in history[-10:]],
+        }
+        if done:
+            stats["mean_total"] = round(sum(t.total for t in done) / len(done), 3)
+            stats["mean_polls"] = round(sum(t.polls for t in done) / len(done), 1)
+            stats["mean_predict_error"] = round(
+                sum(t.arrived - t.predicted for t in done) / len(done), 3)
+        return stats
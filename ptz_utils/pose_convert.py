@@ -0,0 +1,63 @@
+"""
+AMR 位姿 / PTZ 角度換算 (NumPy 向量化)：
+    輸入可為純量或陣列，整批資料一次換算，並回傳有效範圍遮罩 (valid mask)。
+        pan：-170 ~ 170度，對應-1.0 ~ 1.0
+        tilt：-30 ~ 90度，對應-0.3 ~ 0.9
+        zoom：0.0 ~ 1.0，對應0 ~ 12X 變焦
+"""
+import numpy as np
+
+PAN_LIMIT = 170.0  # pan 可轉動範圍 ±170度
+TILT_MIN, TILT_MAX = -30.0, 90.0
+ZOOM_MIN, ZOOM_MAX = 0.0, 1.0
+PAN_SCALE = 1 / 170  # 角度 -> ONVIF 值
+TILT_DEGREES = 100.0  # ONVIF tilt 值 1.0 對應角度
+
+
+def normalize_angle(angle):
+    """角度換算至 0 ~ 360"""
+    return np.mod(angle, 360)
+
+
+def target_bearing(theta, camera_offset, pan):
+    """
+    AMR theta + 相機安裝角 camera_offset + PTZ pan -> 目標方位角 (0 ~ 360)，
+    與 AMR 目前角度無關，可預先計算
+    """
+    camera_pos = normalize_angle(normalize_angle(theta) + camera_offset)
+    return normalize_angle(camera_pos - pan)
+
+
+def bearing_to_pan(theta, camera_offset, bearing):
+    """
+    目標方位角 -> AMR 目前角度 theta 下的 PTZ pan，
+    超出 ±170度時改為反方向 (±360)，回傳 (pan, valid)
+    """
+    camera_pos = normalize_angle(normalize_angle(theta) + camera_offset)
+    pan = np.asarray(camera_pos - bearing, dtype=float)
+    pan = np.where(pan > PAN_LIMIT, pan - 360,
+                   np.where(pan < -PAN_LIMIT, pan + 360, pan))  # reverse direction
+    valid = np.abs(pan) <= PAN_LIMIT
+    return pan, valid
+
+
+def angles_to_ptz(pan, tilt, zoom):
+    """角度 -> ONVIF PTZ 值，回傳 (pan_value, tilt_value, zoom_value, valid)"""
+    pan = np.asarray(pan, dtype=float)
+    tilt = np.asarray(tilt, dtype=float)
+    zoom = np.asarray(zoom, dtype=float)
+    valid = (np.abs(pan) <= PAN_LIMIT) & (tilt >= TILT_MIN) & (tilt <= TILT_MAX) & \
+        (zoom >= ZOOM_MIN) & (zoom <= ZOOM_MAX)
+    return pan * PAN_SCALE, tilt / TILT_DEGREES, zoom, valid
+
+
+def ptz_to_angles(pan_value, tilt_value, zoom_value):
+    """ONVIF PTZ 值 -> 角度 (pan、tilt 取整數度)，回傳 (pan, tilt, zoom, valid)"""
+    pan_value = np.asarray(pan_value, dtype=float)
+    tilt_value = np.asarray(tilt_value, dtype=float)
+    zoom_value = np.asarray(zoom_value, dtype=float)
+    valid = (np.abs(pan_value) <= 1.0) & \
+        (tilt_value >= TILT_MIN / TILT_DEGREES) & (tilt_value <= TILT_MAX / TILT_DEGREES) & \
+        (zoom_value >= ZOOM_MIN) & (zoom_value <= ZOOM_MAX)
+    return np.floor(pan_value * PAN_LIMIT), np.floor(tilt_value * TILT_DEGREES), \
+        np.round(zoom_value, 1), valid
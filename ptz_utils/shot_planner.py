@@ -0,0 +1,114 @@
+"""
+PTZ 拍攝順序規劃：
+    以 PTZSpeedModel 預估兩拍攝點間的移動時間 (各軸同時移動，取最慢軸)，
+    最近鄰 (nearest neighbour) 建立初始路徑，再以 2-opt 改善，
+    減少 PTZ 在 pan -170 ~ 170 之間來回掃動。
+"""
+import time
+from typing import Callable, List, Optional, Sequence
+
+from ptz_utils.arrival import PTZSpeedModel
+
+
+class ShotPlan:
+    """規劃結果"""
+
+    def __init__(self, shots: List[tuple], move_time: float, original_move_time: float,
+                 estimated_time: float):
+        self.shots = shots  # 排序後的拍攝點 (保留原 tuple，如 video_time)
+        self.move_time = move_time  # 預估移動時間(秒)
+        self.original_move_time = original_move_time  # 原順序預估移動時間(秒)
+        self.estimated_time = estimated_time  # 預估任務時間(秒)
+
+    def get_status(self) -> dict:
+        return {
+            "shots": len(self.shots),
+            "move_time": round(self.move_time, 2),
+            "original_move_time": round(self.original_move_time, 2),
+            "estimated_time": round(self.estimated_time, 2),
+        }
+
+
+class ShotPlanner:
+    """PTZ 拍攝順序規劃"""
+
+    def __init__(self, to_value: Callable, speed_model: Optional[PTZSpeedModel] = None,
+                 shot_time=0.5, time_budget=0.2):
+        self.to_value = to_value  # 角度轉 PTZ 控制值，to_value([pan, tilt, zoom]) -> list
+        self.speed_model = speed_model or PTZSpeedModel()
+        self.shot_time = shot_time  # 每個拍攝點的固定時間 (穩定 + 存檔)(秒)
+        self.time_budget = time_budget  # 2-opt 最長計算時間(秒)
+
+    def plan(self, shots: Sequence[tuple], start: Optional[Sequence[float]] = None) -> ShotPlan:
+        """
+        shots：[(pan, tilt, zoom, ...), ...] 角度
+        start：目前 PTZ 角度 (pan, tilt, zoom)，未知時為 None
+        """
+        shots = list(shots)
+        values = [self.to_value(list(shot[:3])) for shot in shots]
+        start_value = None
+        if start is not None:
+            try:
+                start_value = self.to_value(list(start[:3]))
+            except ValueError:
+                start_value = None
+        # 節點 0 為起點 (未知時與所有點距離為 0)
+        n = len(shots)
+        cost = [[0.0] * (n + 1) for _ in range(n + 1)]
+        for i in range(n):
+            for j in range(i + 1, n):
+                cost[i + 1][j + 1] = cost[j + 1][i + 1] = \
+                    self.speed_model.predict(values[i], values[j])
+            if start_value is not None:
+                cost[0][i + 1] = cost[i + 1][0] = \
+                    self.speed_model.predict(start_value, values[i])
+
+        original = list(range(n + 1))
+        path = self._nearest_neighbour(cost, n)
+        path = self._two_opt(cost, path)
+        move_time = self._path_cost(cost, path)
+        original_move_time = self._path_cost(cost, original)
+        if move_time > original_move_time:
+            path, move_time = original, original_move_time
+
+        return ShotPlan([shots[i - 1] for i in path[1:]], move_time, original_move_time,
+                        move_time + n * self.shot_time)
+
+    @staticmethod
+    def _path_cost(cost: List[List[float]], path: List[int]) -> float:
+        return sum(cost[path[k]][path[k + 1]] for k in range(len(path) - 1))
+
+    @staticmethod
+    def _nearest_neighbour(cost: List[List[float]], n: int) -> List[int]:
+        path = [0]
+        left = set(range(1, n + 1))
+        while left:
+            last = path[-1]
+            # 同距離時保留原順序
+            nxt = min(left, key=lambda i: (cost[last][i], i))
+            path.append(nxt)
+            left.remove(nxt)
+        return path
+
+    def _two_opt(self, cost: List[List[float]], path: List[int]) -> List[int]:
+        """開放路徑 2-opt，起點固定"""
+        end = time.monotonic() + self.time_budget
+        n = len(path)
+        improved = True
+        while improved and time.monotonic() < end:
+            improved = False
+            for i in range(1, n - 1):
+                a, b = path[i - 1], path[i]
+                for j in range(i + 1, n):
+                    c = path[j]
+                    d = path[j + 1] if j + 1 < n else None
+                    # 反轉 path[i..j]：邊 (a,b),(c,d) 改為 (a,c),(b,d)
+                    before = cost[a][b] + (cost[c][d] if d is not None else 0.0)
+                    after = cost[a][c] + (cost[b][d] if d is not None else 0.0)
+                    if after < before - 1e-9:
+                        path[i:j + 1] = reversed(path[i:j + 1])
+                        improved = True
+                        b = path[i]
+                if time.monotonic() >= end:
+                    break
+        return path
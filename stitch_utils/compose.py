@@ -0,0 +1,126 @@
+"""
+全景合成：
+    依已估計的相機參數 (焦距、主點、旋轉矩陣) 投影、曝光補償、找接縫後以 multi-band 融合。
+    相機參數以 dict 保存 (可寫入 JSON)，合成時由原始影像檔讀取，
+    可在拍攝程式內或獨立 process 中執行。
+"""
+import math
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+WARP_TYPE = "spherical"
+
+
+def camera_to_dict(camera) -> dict:
+    """cv2.detail.CameraParams -> dict"""
+    return {"focal": float(camera.focal), "aspect": float(camera.aspect),
+            "ppx": float(camera.ppx), "ppy": float(camera.ppy),
+            "R": np.asarray(camera.R, dtype=np.float32).tolist()}
+
+
+def camera_matrix(camera: dict, scale=1.0) -> np.ndarray:
+    """相機內部參數 K，scale 為相對於 work scale 的縮放"""
+    focal = camera["focal"] * scale
+    return np.array([[focal, 0, camera["ppx"] * scale],
+                     [0, focal * camera["aspect"], camera["ppy"] * scale],
+                     [0, 0, 1]], dtype=np.float32)
+
+
+def megapix_scale(shape, megapix: float) -> float:
+    """縮放至 megapix 百萬像素的比例，megapix < 0 時不縮放"""
+    if megapix < 0:
+        return 1.0
+    return min(1.0, math.sqrt(megapix * 1e6 / (shape[0] * shape[1])))
+
+
+def compose_panorama(files: List[str], cameras: List[dict], work_scale: float,
+                     seam_megapix=0.1, compose_megapix=-1.0, blend_strength=5.0,
+                     warp_type=WARP_TYPE) -> Optional[np.ndarray]:
+    """
+    合成全景圖：
+        files：原始影像檔，cameras：對應的相機參數 (work scale)，
+        回傳 BGR 影像，影像數不足時回傳 None
+    """
+    if len(files) < 2 or len(files) != len(cameras):
+        return None
+    warped_image_scale = float(np.median([camera["focal"] for camera in cameras]))
+    rotations = [np.asarray(camera["R"], dtype=np.float32) for camera in cameras]
+
+    # 低解析度找接縫與曝光補償
+    seam_scale = None
+    full_sizes = []
+    corners, images_warped, masks_warped = [], [], []
+    warper = None
+    for path, camera, rotation in zip(files, cameras, rotations):
+        full_img = cv2.imread(path)
+        if full_img is None:
+            raise ValueError(f"read image failed, path:{path}")
+        full_sizes.append((full_img.shape[1], full_img.shape[0]))
+        if seam_scale is None:
+            seam_scale = megapix_scale(full_img.shape, seam_megapix)
+            warper = cv2.PyRotationWarper(warp_type, warped_image_scale * seam_scale / work_scale)
+        img = cv2.resize(full_img, None, fx=seam_scale, fy=seam_scale,
+                         interpolation=cv2.INTER_LINEAR_EXACT)
+        del full_img
+        K = camera_matrix(camera, seam_scale / work_scale)
+        corner, image_warped = warper.warp(img, K, rotation, cv2.INTER_LINEAR, cv2.BORDER_REFLECT)
+        mask = np.full(img.shape[:2], 255, dtype=np.uint8)
+        _, mask_warped = warper.warp(mask, K, rotation, cv2.INTER_NEAREST, cv2.BORDER_CONSTANT)
+        corners.append(corner)
+        images_warped.append(image_warped)
+        masks_warped.append(mask_warped)
+
+    compensator = cv2.detail.ExposureCompensator_createDefault(
+        cv2.detail.ExposureCompensator_GAIN_BLOCKS)
+    compensator.feed(corners=corners, images=images_warped, masks=masks_warped)
+    seam_finder = cv2.detail_GraphCutSeamFinder("COST_COLOR")
+    masks_warped = seam_finder.find([img.astype(np.float32) for img in images_warped],
+                                    corners, masks_warped)
+    del images_warped
+
+    # 合成解析度
+    compose_scale = megapix_scale((full_sizes[0][1], full_sizes[0][0]), compose_megapix)
+    compose_work_aspect = compose_scale / work_scale
+    warper = cv2.PyRotationWarper(warp_type, warped_image_scale * compose_work_aspect)
+    Ks, corners, sizes = [], [], []
+    for (width, height), camera, rotation in zip(full_sizes, cameras, rotations):
+        K = camera_matrix(camera, compose_work_aspect)
+        size = (int(round(width * compose_scale)), int(round(height * compose_scale)))
+        roi = warper.warpRoi(size, K, rotation)
+        Ks.append(K)
+        corners.append(roi[0:2])
+        sizes.append(roi[2:4])
+    dst_roi = cv2.detail.resultRoi(corners=corners, sizes=sizes)
+    blend_width = math.sqrt(dst_roi[2] * dst_roi[3]) * blend_strength / 100
+    if blend_width < 1:
+        blender = cv2.detail.Blender_createDefault(cv2.detail.Blender_NO)
+    else:
+        blender = cv2.detail_MultiBandBlender()
+        blender.setNumBands(int(math.log(blend_width) / math.log(2) - 1))
+    blender.prepare(dst_roi)
+
+    for idx, path in enumerate(files):
+        img = cv2.imread(path)
+        if img is None:
+            raise ValueError(f"read image failed, path:{path}")
+        if compose_scale != 1:
+            img = cv2.resize(img, None, fx=compose_scale, fy=compose_scale,
+                             interpolation=cv2.INTER_LINEAR_EXACT)
+        _, image_warped = warper.warp(img, Ks[idx], rotations[idx], cv2.INTER_LINEAR,
+                                      cv2.BORDER_REFLECT)
+        mask = np.full(img.shape[:2], 255, dtype=np.uint8)
+        del img
+        _, mask_warped = warper.warp(mask, Ks[idx], rotations[idx], cv2.INTER_NEAREST,
+                                     cv2.BORDER_CONSTANT)
+        compensator.apply(idx, corners[idx], image_warped, mask_warped)
+        dilated_mask = cv2.dilate(masks_warped[idx], None)
+        seam_mask = cv2.resize(dilated_mask, (mask_warped.shape[1], mask_warped.shape[0]),
+                               0, 0, cv2.INTER_LINEAR_EXACT)
+        mask_warped = cv2.bitwise_and(seam_mask, mask_warped)
+        blender.feed(cv2.UMat(image_warped.astype(np.int16)), mask_warped, corners[idx])
+    result, _ = blender.blend(None, None)
+    if isinstance(result, cv2.UMat):
+        result = result.get()
+    return np.clip(result, 0, 255).astype(np.uint8)
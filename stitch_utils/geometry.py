@@ -0,0 +1,129 @@
+"""
+PTZ 幾何：
+    由拍攝時的 pan / tilt / zoom 推算相機旋轉矩陣與焦距 (依 zoom 查水平視角表)，
+    作為拼接的初始相機參數，並只比對視野重疊的相鄰影像。
+    座標：x 向右、y 向下、z 為 pan 0 / tilt 0 的方向，pan 向右為正、tilt 向上為正。
+"""
+import math
+import os
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ptz_utils.pose_convert import PAN_LIMIT, TILT_MAX, TILT_MIN, ZOOM_MAX, ZOOM_MIN
+
+# zoom (ONVIF 0.0 ~ 1.0) -> 水平視角(度)，預設值，需依實際鏡頭校正
+HFOV_TABLE = ((0.0, 60.0), (0.1, 40.0), (0.2, 28.0), (0.3, 20.0), (0.4, 15.0),
+              (0.5, 11.5), (0.6, 9.0), (0.7, 7.5), (0.8, 6.5), (0.9, 5.6), (1.0, 5.0))
+
+# img_年月日時分秒_pan_tilt_zoom(_序號).jpg
+FILENAME_PATTERN = re.compile(
+    r"^img_\d{14}_(-?\d+(?:\.\d+)?)_(-?\d+(?:\.\d+)?)_(\d+(?:\.\d+)?)(?:_\d+)?\.jpg$")
+
+PTZAngle = Tuple[float, float, float]  # (pan, tilt, zoom)
+
+
+def parse_ptz_angle(filename: str) -> Optional[PTZAngle]:
+    """
+    由檔名取得 pan / tilt / zoom，超出 PTZ 範圍時回傳 None：
+        存大地坐標的檔名 (img_時間_x_y_方位角.jpg) 格式相同，多數因 x / y / 方位角超出範圍而排除，
+        範圍內無法區分，需由任務紀錄判斷 (stitch_worker)
+    """
+    match = FILENAME_PATTERN.match(os.path.basename(filename))
+    if match is None:
+        return None
+    pan, tilt, zoom = float(match.group(1)), float(match.group(2)), float(match.group(3))
+    if abs(pan) > PAN_LIMIT or not TILT_MIN <= tilt <= TILT_MAX or not ZOOM_MIN <= zoom <= ZOOM_MAX:
+        return None
+    return pan, tilt, zoom
+
+
+def hfov_for_zoom(zoom: float, table=HFOV_TABLE) -> float:
+    """依 zoom 內插水平視角(度)，以對數內插 (視角約與倍率成反比)"""
+    zooms = [z for z, _ in table]
+    log_fovs = [math.log(fov) for _, fov in table]
+    return math.exp(float(np.interp(zoom, zooms, log_fovs)))
+
+
+def focal_for_zoom(zoom: float, width: int, table=HFOV_TABLE) -> float:
+    """焦距(像素)"""
+    return (width / 2) / math.tan(math.radians(hfov_for_zoom(zoom, table)) / 2)
+
+
+def rotation_from_ptz(pan: float, tilt: float, pan_sign=1) -> np.ndarray:
+    """相機座標 -> 世界座標旋轉矩陣 (cv2.detail.CameraParams.R)"""
+    pan = math.radians(pan * pan_sign)
+    tilt = math.radians(tilt)
+    rot_pan = np.array([[math.cos(pan), 0, math.sin(pan)],
+                        [0, 1, 0],
+                        [-math.sin(pan), 0, math.cos(pan)]])
+    rot_tilt = np.array([[1, 0, 0],
+                         [0, math.cos(tilt), -math.sin(tilt)],
+                         [0, math.sin(tilt), math.cos(tilt)]])
+    return (rot_pan @ rot_tilt).astype(np.float32)
+
+
+def axis_angle(first: PTZAngle, second: PTZAngle) -> float:
+    """兩個拍攝方向的夾角(度)"""
+    first_axis = rotation_from_ptz(first[0], first[1])[:, 2]
+    second_axis = rotation_from_ptz(second[0], second[1])[:, 2]
+    return math.degrees(math.acos(max(-1.0, min(1.0, float(first_axis @ second_axis)))))
+
+
+def is_neighbor(first: PTZAngle, second: PTZAngle, overlap=0.9, table=HFOV_TABLE) -> bool:
+    """視野是否重疊 (夾角小於兩者半視角和 * overlap)"""
+    limit = (hfov_for_zoom(first[2], table) + hfov_for_zoom(second[2], table)) / 2 * overlap
+    return axis_angle(first, second) < limit
+
+
+def neighbor_mask(angles: Sequence[PTZAngle], overlap=0.9, table=HFOV_TABLE) -> np.ndarray:
+    """相鄰影像比對遮罩 (n x n)"""
+    num = len(angles)
+    mask = np.zeros((num, num), np.uint8)
+    for i in range(num):
+        for j in range(i + 1, num):
+            if is_neighbor(angles[i], angles[j], overlap, table):
+                mask[i, j] = mask[j, i] = 1
+    return mask
+
+
+def estimate_pan_sign(pairs: Sequence[Tuple[PTZAngle, PTZAngle, np.ndarray]]) -> int:
+    """
+    依相鄰影像 homography 的水平位移判斷 pan 方向：
+        pan 向右為正時，相機右轉後畫面內容往左移 (第一張中心點在第二張的 x < 0)
+    pairs：(第一張角度, 第二張角度, homography 第一張 -> 第二張，影像中心座標)
+    """
+    votes = 0
+    for first, second, H in pairs:
+        pan_diff = second[0] - first[0]
+        if abs(pan_diff) < 1 or H is None or np.shape(H) != (3, 3) or abs(H[2, 2]) < 1e-9:
+            continue
+        shift = H[0, 2] / H[2, 2]
+        votes += 1 if (shift < 0) == (pan_diff > 0) else -1
+    return -1 if votes < 0 else 1
+
+
+def seed_cameras(cameras, angles: Sequence[PTZAngle], sizes: Sequence[Tuple[int, int]],
+                 pan_sign=1, table=HFOV_TABLE):
+    """以 PTZ 角度與視角表設定相機參數 (cv2.detail.CameraParams，work scale)"""
+    for camera, (pan, tilt, zoom), (width, height) in zip(cameras, angles, sizes):
+        camera.focal = focal_for_zoom(zoom, width, table)
+        camera.aspect = 1.0
+        camera.ppx = width / 2
+        camera.ppy = height / 2
+        camera.R = rotation_from_ptz(pan, tilt, pan_sign)
+    return cameras
+
+
+def relative_deviation(seeded: List[np.ndarray], refined: List[np.ndarray],
+                       pairs: Sequence[Tuple[int, int]]) -> float:
+    """bundle adjustment 前後相鄰影像相對旋轉差異的中位數(度)，與整體旋轉無關"""
+    deviations = []
+    for i, j in pairs:
+        seeded_rel = seeded[i].T @ seeded[j]
+        refined_rel = refined[i].T @ refined[j]
+        diff = seeded_rel.T @ refined_rel
+        cos = max(-1.0, min(1.0, (float(np.trace(diff)) - 1) / 2))
+        deviations.append(math.degrees(math.acos(cos)))
+    return float(np.median(deviations)) if deviations else 0.0
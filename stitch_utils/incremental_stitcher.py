@@ -0,0 +1,350 @@
+"""
+增量拼接：
+    拍攝時每存一張影像即在背景計算特徵點，並與前幾張影像比對 (不需等任務結束)，
+    任務進行中可取得預覽拼接圖 (依相鄰影像 homography 串接，低解析度、不融合)；
+    任務結束時 detach 只在背景匯出比對成功的影像組 (export，寫入 stitch.json)，任務不需等待，
+    由 stitch_worker load 後只對這些影像組重新比對，估計相機參數與 bundle adjustment，
+    再由 compose_panorama 合成，不需兩兩比對全部影像。
+    有拍攝角度 (pan / tilt / zoom) 時只比對視野重疊的影像，並以 PTZ 幾何作為初始相機參數，
+    特徵點不足 (低紋理牆面) 或 bundle adjustment 偏離過大時直接使用 PTZ 幾何。
+"""
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from stitch_utils.compose import camera_to_dict, megapix_scale
+from stitch_utils.geometry import (HFOV_TABLE, PTZAngle, estimate_pan_sign, is_neighbor,
+                                   relative_deviation, seed_cameras)
+
+
+class StitchFrame:
+    """已登錄的單張影像"""
+
+    def __init__(self, filename: str, features, size: Tuple[int, int], thumb,
+                 ptz: Optional[PTZAngle] = None):
+        self.filename = filename
+        self.ptz = ptz  # 拍攝角度 (pan, tilt, zoom)
+        self.features = features  # cv2.detail.ImageFeatures (work scale)
+        self.size = size  # work scale 影像尺寸 (w, h)
+        self.thumb = thumb  # 預覽用縮圖
+        self.transform: Optional[np.ndarray] = None  # 預覽座標 (第一張影像中心座標, work scale)
+
+
+class StitchSession:
+    """單一任務的登錄狀態"""
+
+    def __init__(self, task_folder: Optional[str]):
+        self.task_folder = task_folder
+        self.work_scale: Optional[float] = None
+        self.frames: List[StitchFrame] = []
+        self.pairs: Dict[Tuple[int, int], tuple] = {}  # (i, j) -> (信心值, homography)
+        self.register_time = 0.0  # 累計登錄時間(秒)
+
+
+class IncrementalStitcher:
+    """任務進行中登錄影像的增量拼接"""
+
+    def __init__(self, work_megapix=0.6, match_conf=0.3, conf_thresh=1.0, neighbors=3,
+                 thumb_scale=0.3, hfov_table=HFOV_TABLE, max_deviation=5.0, logger=None):
+        self.work_megapix = work_megapix  # 特徵點計算解析度(百萬像素)
+        self.match_conf = match_conf
+        self.conf_thresh = conf_thresh  # 影像組信心門檻
+        self.neighbors = neighbors  # 無拍攝角度時，每張影像與前幾張比對
+        self.thumb_scale = thumb_scale  # 預覽縮圖相對於 work scale 的比例
+        self.hfov_table = hfov_table  # zoom -> 水平視角
+        self.max_deviation = max_deviation  # bundle adjustment 與 PTZ 幾何相對旋轉差異上限(度)
+        self.logger = logger
+        self.lock = Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stitch")
+        self.finder = cv2.ORB.create()
+        self.matcher = cv2.detail_BestOf2NearestMatcher(False, match_conf)
+        self.session: Optional[StitchSession] = None
+        self.futures: List[Future] = []
+
+    def start(self, task_folder: Optional[str]):
+        """開始新任務"""
+        with self.lock:
+            self.session = StitchSession(task_folder)
+            self.futures = []
+
+    def is_active(self, task_folder: Optional[str] = None) -> bool:
+        with self.lock:
+            return self.session is not None and \
+                (task_folder is None or self.session.task_folder == task_folder)
+
+    def submit(self, filename: str, img, ptz: Optional[PTZAngle] = None) -> Future:
+        """背景登錄影像，不阻塞拍攝"""
+        with self.lock:
+            future = self.executor.submit(self.add_frame, filename, img, ptz, self.session)
+            self.futures.append(future)
+        return future
+
+    def add_frame(self, filename: str, img, ptz: Optional[PTZAngle] = None,
+                  session: Optional[StitchSession] = None):
+        """計算特徵點並與相鄰影像比對 (session 為 submit 時的任務，任務已結束仍登錄至該任務)"""
+        start = time.monotonic()
+        with self.lock:
+            session = session or self.session
+            if session is None:
+                return
+            if session.work_scale is None:
+                session.work_scale = megapix_scale(img.shape, self.work_megapix)
+            work_scale = session.work_scale
+        frame = self._make_frame(filename, img, ptz, work_scale)
+
+        with self.lock:
+            idx = len(session.frames)
+            if ptz is not None and all(ref.ptz is not None for ref in session.frames):
+                # 只比對視野重疊的影像
+                candidates = [i for i, ref in enumerate(session.frames)
+                              if is_neighbor(ref.ptz, ptz, table=self.hfov_table)]
+            else:
+                candidates = list(range(max(0, idx - self.neighbors), idx))
+            ref_frames = [session.frames[i] for i in candidates]
+        best = None
+        for i, ref in zip(candidates, ref_frames):
+            matches_info = self.matcher.apply(ref.features, frame.features)
+            if matches_info.confidence < self.conf_thresh:
+                continue
+            H = matches_info.H
+            with self.lock:
+                session.pairs[(i, idx)] = (matches_info.confidence, H)
+            if ref.transform is not None and H is not None and np.shape(H) == (3, 3) and \
+                    (best is None or matches_info.confidence > best[0]):
+                best = (matches_info.confidence, ref.transform @ np.linalg.inv(H))
+        if idx == 0:
+            frame.transform = np.eye(3)
+        elif best is not None:
+            frame.transform = best[1]
+        with self.lock:
+            session.frames.append(frame)
+            session.register_time += time.monotonic() - start
+
+    def _make_frame(self, filename: str, img, ptz: Optional[PTZAngle], work_scale: float) -> StitchFrame:
+        """計算 work scale 特徵點與預覽縮圖"""
+        work_img = cv2.resize(img, None, fx=work_scale, fy=work_scale,
+                              interpolation=cv2.INTER_LINEAR_EXACT)
+        features = cv2.detail.computeImageFeatures2(self.finder, work_img)
+        thumb = cv2.resize(work_img, None, fx=self.thumb_scale, fy=self.thumb_scale,
+                           interpolation=cv2.INTER_AREA)
+        return StitchFrame(filename, features, (work_img.shape[1], work_img.shape[0]), thumb, ptz)
+
+    def wait(self, timeout=None):
+        """等待背景登錄完成"""
+        with self.lock:
+            futures = list(self.futures)
+        wait(futures, timeout=timeout)
+
+    def get_preview(self, max_width=1600) -> Optional[np.ndarray]:
+        """依相鄰影像 homography 串接的預覽圖"""
+        with self.lock:
+            if self.session is None:
+                return None
+            frames = [frame for frame in self.session.frames if frame.transform is not None]
+        if not frames:
+            return None
+        placed = []
+        for frame in frames:
+            w, h = frame.size
+            center = np.array([[1, 0, -w / 2], [0, 1, -h / 2], [0, 0, 1]])
+            transform = frame.transform @ center  # work scale 像素 -> 預覽座標
+            corners = transform @ np.array([[0, w, w, 0], [0, 0, h, h], [1, 1, 1, 1]])
+            if np.any(corners[2] <= 1e-6):
+                continue  # 投影發散
+            placed.append((frame, transform, corners[:2] / corners[2]))
+        if not placed:
+            return None
+        points = np.hstack([corners for _, _, corners in placed])
+        x_min, y_min = points.min(axis=1)
+        x_max, y_max = points.max(axis=1)
+        scale = min(self.thumb_scale, max_width / max(1.0, x_max - x_min))
+        canvas_size = (int((x_max - x_min) * scale) + 1, int((y_max - y_min) * scale) + 1)
+        if canvas_size[0] * canvas_size[1] > 4 * max_width * max_width:
+            return None
+        offset = np.array([[scale, 0, -x_min * scale], [0, scale, -y_min * scale], [0, 0, 1]])
+        canvas = np.zeros((canvas_size[1], canvas_size[0], 3), dtype=np.uint8)
+        for frame, transform, _ in placed:
+            thumb_to_work = np.diag([1 / self.thumb_scale, 1 / self.thumb_scale, 1])
+            warped = cv2.warpPerspective(frame.thumb, offset @ transform @ thumb_to_work,
+                                         canvas_size)
+            mask = warped.any(axis=2)
+            canvas[mask] = warped[mask]
+        return canvas
+
+    def detach(self, on_done: Callable) -> Future:
+        """
+        任務結束 (不等待)：結束目前任務，背景登錄完成後以 on_done(export) 通知，
+        export 見 export()，無任務或影像不足時為 None；下一個任務可立即 start
+        """
+        with self.lock:
+            session, self.session = self.session, None
+        # executor 只有一個執行緒，排在此任務尚未完成的登錄之後
+        return self.executor.submit(self._export_done, session, on_done)
+
+    def _export_done(self, session: Optional[StitchSession], on_done: Callable):
+        try:
+            export = self.export(session) if session is not None else None
+        except Exception as e:
+            export = None
+            self._warning(f"export stitch registration failed, error:{e}")
+        try:
+            on_done(export)
+        except Exception as e:
+            self._warning(f"stitch export callback failed, error:{e}")
+
+    def export(self, session: StitchSession) -> Optional[dict]:
+        """
+        拍攝時的登錄結果 (可寫入 JSON)：
+            {"files", "ptz", "work_scale", "pairs": [[i, j, 信心值, homography]]}
+        """
+        with self.lock:
+            frames = list(session.frames)
+            pairs = dict(session.pairs)
+        if len(frames) < 2:
+            return None
+        return {"files": [frame.filename for frame in frames],
+                "ptz": [list(frame.ptz) if frame.ptz is not None else None for frame in frames],
+                "work_scale": session.work_scale,
+                "pairs": [[i, j, float(conf), np.asarray(H, dtype=np.float64).tolist()
+                           if H is not None and np.shape(H) == (3, 3) else None]
+                          for (i, j), (conf, H) in sorted(pairs.items())]}
+
+    def load(self, export: dict):
+        """由 export 重建任務 (stitch_worker)：重新計算特徵點，沿用拍攝時比對成功的影像組"""
+        session = StitchSession(None)
+        session.work_scale = export["work_scale"]
+        for filename, ptz in zip(export["files"], export["ptz"]):
+            img = cv2.imread(filename)
+            if img is None:
+                raise ValueError(f"read image failed, path:{filename}")
+            session.frames.append(self._make_frame(
+                filename, img, tuple(ptz) if ptz is not None else None, session.work_scale))
+        for i, j, conf, H in export["pairs"]:
+            session.pairs[(i, j)] = (conf, np.array(H) if H is not None else None)
+        with self.lock:
+            self.session = session
+            self.futures = []
+
+    def finish(self, timeout=None) -> Optional[dict]:
+        """
+        等待登錄完成，估計相機參數 (bundle adjustment)，回傳合成用的 registration：
+            {"files", "cameras", "work_scale"}，無法拼接時回傳 None
+        """
+        self.wait(timeout)
+        with self.lock:
+            session, self.session = self.session, None
+        if session is None:
+            return None
+        frames = list(session.frames)
+        pairs = dict(session.pairs)
+        work_scale = session.work_scale
+        if len(frames) < 2:
+            return None
+        start = time.monotonic()
+        keep = list(range(len(frames)))
+        features = [frame.features for frame in frames]
+        if all(frame.ptz is not None for frame in frames):
+            cameras = self._estimate_geometry(frames, features, pairs)
+            if cameras is None:
+                return None
+            self._log_registration("geometry", len(keep), len(frames), session, start)
+            return {"files": [frame.filename for frame in frames],
+                    "cameras": [camera_to_dict(camera) for camera in cameras],
+                    "work_scale": work_scale}
+
+        if not pairs:
+            return None
+        pairwise = self._match(features, pairs, keep)
+        indices = cv2.detail.leaveBiggestComponent(features, pairwise, self.conf_thresh)
+        component = [int(i) for i in np.asarray(indices).flatten()]
+        if len(component) < 2:
+            return None
+        if len(component) < len(frames):
+            # 只保留最大的連通影像組
+            keep = component
+            features = [frames[i].features for i in keep]
+            pairwise = self._match(features, pairs, keep)
+
+        estimator = cv2.detail_HomographyBasedEstimator()
+        ret, cameras = estimator.apply(features, pairwise, None)
+        if not ret:
+            return None
+        cameras = self.refine(features, pairwise, cameras)
+        if cameras is None:
+            return None
+        self._log_registration("features", len(keep), len(frames), session, start)
+        return {"files": [frames[i].filename for i in keep],
+                "cameras": [camera_to_dict(camera) for camera in cameras],
+                "work_scale": work_scale}
+
+    def refine(self, features, pairwise, cameras):
+        """bundle adjustment 與水平校正"""
+        for camera in cameras:
+            camera.R = camera.R.astype(np.float32)
+        adjuster = cv2.detail_BundleAdjusterRay()
+        adjuster.setConfThresh(self.conf_thresh)
+        refine_mask = np.zeros((3, 3), np.uint8)
+        refine_mask[0, 0] = refine_mask[0, 1] = refine_mask[0, 2] = 1
+        refine_mask[1, 1] = refine_mask[1, 2] = 1
+        adjuster.setRefinementMask(refine_mask)
+        ret, cameras = adjuster.apply(features, pairwise, cameras)
+        if not ret:
+            return None
+        rotations = cv2.detail.waveCorrect([np.copy(camera.R) for camera in cameras],
+                                           cv2.detail.WAVE_CORRECT_HORIZ)
+        for camera, rotation in zip(cameras, rotations):
+            camera.R = rotation
+        return cameras
+
+    def _estimate_geometry(self, frames: List[StitchFrame], features, pairs: Dict[Tuple[int, int], tuple]):
+        """以 PTZ 幾何為初始相機參數，相鄰影像比對結果做 bundle adjustment"""
+        angles = [frame.ptz for frame in frames]
+        sizes = [frame.size for frame in frames]
+        pan_sign = estimate_pan_sign(
+            [(angles[i], angles[j], H) for (i, j), (_, H) in pairs.items()])
+        pairwise = self._match(features, pairs, list(range(len(frames))))
+        # HomographyBasedEstimator 只用來建立 CameraParams，參數以 PTZ 幾何取代
+        _, cameras = cv2.detail_HomographyBasedEstimator().apply(features, pairwise, None)
+        cameras = seed_cameras(cameras, angles, sizes, pan_sign, self.hfov_table)
+        seeded = [np.copy(camera.R) for camera in cameras]
+        if not pairs:
+            return cameras  # 無比對成功的影像組 (低紋理)，直接使用 PTZ 幾何
+        try:
+            refined = self.refine(features, pairwise, cameras)
+        except cv2.error as e:
+            refined = None
+            self._warning(f"bundle adjustment failed, error:{e}")
+        if refined is None:
+            return seed_cameras(cameras, angles, sizes, pan_sign, self.hfov_table)
+        deviation = relative_deviation(seeded, [np.asarray(camera.R) for camera in refined],
+                                       list(pairs))
+        if deviation > self.max_deviation:
+            self._warning(f"bundle adjustment deviates {deviation:.1f} deg from PTZ, use PTZ geometry")
+            return seed_cameras(cameras, angles, sizes, pan_sign, self.hfov_table)
+        return refined
+
+    def _log_registration(self, mode: str, used: int, total: int, session: StitchSession,
+                          start: float):
+        if self.logger is not None:
+            self.logger.info(
+                f"stitch registration ({mode}), frames:{used}/{total}, "
+                f"register:{session.register_time:.1f}s, estimate:{time.monotonic() - start:.1f}s")
+
+    def _warning(self, message: str):
+        if self.logger is not None:
+            self.logger.error(message)  # LogWriter 只使用 debug / info / error
+
+    def _match(self, features, pairs: Dict[Tuple[int, int], tuple], keep: List[int]):
+        """只比對登錄時比對成功的影像組"""
+        index = {frame_idx: i for i, frame_idx in enumerate(keep)}
+        mask = np.zeros((len(keep), len(keep)), np.uint8)
+        for i, j in pairs:
+            if i in index and j in index:
+                mask[index[i], index[j]] = mask[index[j], index[i]] = 1
+        pairwise = self.matcher.apply2(features, mask)
+        self.matcher.collectGarbage()
+        return pairwise
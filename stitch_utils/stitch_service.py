@@ -0,0 +1,131 @@
+"""
+拼接服務：
+    任務結束後將 task 資料夾加入佇列，由固定數量的 worker 以獨立 process (stitch_worker) 執行，
+    主程式不需等待拼接，也不會與 ADS 控制迴圈競爭 GIL。
+    每個 worker process 有記憶體上限、較低優先權與逾時，狀態變更 (queued / running / ok / ng)
+    以 on_state(job, state, result) 通知。
+    使用 subprocess 而非 multiprocessing，Windows 下 spawn 不會重新載入主程式 (相機、ADS、Flask)。
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+from threading import Condition, Thread
+from typing import Callable, Dict, List, Optional
+
+
+class StitchService:
+    """拼接服務"""
+
+    def __init__(self, on_state: Callable, workers=1, max_pending=32, memory_mb=1500,
+                 threads=2, timeout=1800.0, tiles_root: Optional[str] = None, tiles_keep=50,
+                 logger=None):
+        self.on_state = on_state  # on_state(job, state, result)
+        self.workers = workers  # 同時執行的拼接數量
+        self.max_pending = max_pending  # 佇列上限
+        self.memory_mb = memory_mb  # 每個 worker 記憶體上限(MB)
+        self.threads = threads  # 每個 worker OpenCV 執行緒數量
+        self.timeout = timeout  # 單一任務逾時(秒)
+        self.tiles_root = tiles_root  # 分層圖磚根目錄，None 不產生
+        self.tiles_keep = tiles_keep  # 保留最新的圖磚任務數量
+        self.logger = logger
+        self.cond = Condition()
+        self.pending = deque()  # job
+        self.running: Dict[str, dict] = {}  # task_folder -> job
+        self.worker_threads: List[Thread] = []
+        self.history = deque(maxlen=20)  # 最近完成的結果
+        self.ok_cnt = 0
+        self.ng_cnt = 0
+
+    def start(self):
+        with self.cond:
+            if self.worker_threads:
+                return
+            for idx in range(self.workers):
+                thread = Thread(target=self._worker, name=f"stitch-{idx}", daemon=True)
+                thread.start()
+                self.worker_threads.append(thread)
+
+    def submit(self, task_folder: str, task_type: str, job_id: Optional[str] = None) -> bool:
+        """加入拼接佇列，已在佇列中或佇列已滿時回傳 False"""
+        job = {"task_folder": task_folder, "task_type": task_type, "job_id": job_id}
+        with self.cond:
+            if task_folder in self.running or \
+                    any(queued["task_folder"] == task_folder for queued in self.pending):
+                return False
+            if len(self.pending) >= self.max_pending:
+                self._log_error(f"stitch queue full, task:{task_folder}")
+                return False
+        self._notify(job, "queued")  # 加入佇列前通知，避免與 running 順序顛倒
+        with self.cond:
+            self.pending.append(job)
+            self.cond.notify()
+        return True
+
+    def get_status(self) -> dict:
+        with self.cond:
+            return {
+                "queued": [job["task_folder"] for job in self.pending],
+                "running": list(self.running),
+                "ok_cnt": self.ok_cnt,
+                "ng_cnt": self.ng_cnt,
+                "history": list(self.history),
+            }
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                job = self.pending.popleft()
+                self.running[job["task_folder"]] = job
+            self._notify(job, "running")
+            result = self._run(job)
+            with self.cond:
+                self.running.pop(job["task_folder"], None)
+                if result["state"] == "ok":
+                    self.ok_cnt += 1
+                else:
+                    self.ng_cnt += 1
+                self.history.append(dict(result, task_folder=job["task_folder"]))
+            if self.logger is not None:
+                self.logger.info(f"stitch {job['task_folder']} finished, result:{result}")
+            self._notify(job, result["state"], result)
+
+    def _run(self, job: dict) -> dict:
+        """以獨立 process 執行 stitch_worker"""
+        cmd = [sys.executable, "-m", "stitch_utils.stitch_worker", job["task_folder"],
+               job["task_type"], "--memory-mb", str(self.memory_mb), "--threads", str(self.threads)]
+        if self.tiles_root:
+            cmd += ["--tiles-root", self.tiles_root, "--tiles-keep", str(self.tiles_keep)]
+        start = time.time()
+        try:
+            proc = subprocess.run(
+                cmd, cwd=os.getcwd(), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                timeout=self.timeout,
+                creationflags=getattr(subprocess, "BELOW_NORMAL_PRIORITY_CLASS", 0))
+        except subprocess.TimeoutExpired:
+            return {"state": "ng", "error": f"timeout {self.timeout}s"}
+        except Exception as e:
+            return {"state": "ng", "error": str(e)}
+        lines = proc.stdout.decode("utf-8", "replace").strip().splitlines()
+        try:
+            result = json.loads(lines[-1])
+        except (IndexError, ValueError):
+            # process 異常結束 (例如超過記憶體上限)
+            result = {"state": "ng", "error": f"exit code {proc.returncode}, "
+                                              f"{proc.stderr.decode('utf-8', 'replace')[-500:]}"}
+        result.setdefault("cost", round(time.time() - start, 1))
+        return result
+
+    def _notify(self, job: dict, state: str, result: Optional[dict] = None):
+        try:
+            self.on_state(job, state, result)
+        except Exception as e:
+            self._log_error(f"update stitch state failed, task:{job['task_folder']}, error:{e}")
+
+    def _log_error(self, message: str):
+        if self.logger is not None:
+            self.logger.error(message)
@@ -0,0 +1,181 @@
+"""
+拼接 worker (獨立 process，不佔用主程式的 GIL 與記憶體)：
+    python -m stitch_utils.stitch_worker <task_folder> <task_type> [--memory-mb 1500] [--tiles-root panorama_tiles]
+    讀取 task 資料夾的 stitch.json (拍攝時比對成功的影像組)，重新計算特徵點後只比對這些影像組，
+    估計相機參數與 bundle adjustment；沒有時由影像檔重新登錄 (依檔名 PTZ 角度)，
+    合成後存為 <task_type>.jpg，並於 <tiles_root>/<pos>/<task> 產生分層圖磚 (上傳後刪除 task 資料夾仍保留)；
+    結果以 JSON 輸出至 stdout，成功時 exit code 0。
+    記憶體上限：POSIX 以 RLIMIT_AS 限制，並依上限降低合成解析度 (Windows 僅降低解析度)。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Optional
+
+import cv2
+
+from stitch_utils.compose import compose_panorama
+from stitch_utils.geometry import parse_ptz_angle
+from stitch_utils.incremental_stitcher import IncrementalStitcher
+from stitch_utils.tile_pyramid import (prune_pyramids, write_tile_pyramid)
+from task_utils.task_journal import read_journal
+
+REGISTRATION_NAME = "stitch.json"
+BLEND_BYTES_PER_PIXEL = 16  # multi-band 融合每個全景像素約需記憶體(bytes)
+PANORAMA_OVERLAP = 0.6  # 全景像素約為影像像素總和的比例
+
+
+def write_registration(task_folder: str, registration: dict):
+    """寫入 stitch.json (IncrementalStitcher.export，暫存檔 fsync 後取代)"""
+    registration = dict(registration)
+    registration["files"] = [os.path.basename(path) for path in registration["files"]]
+    path = os.path.join(task_folder, REGISTRATION_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(registration, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_registration(task_folder: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(task_folder, REGISTRATION_NAME), "r", encoding="utf-8") as f:
+            registration = json.load(f)
+    except (OSError, ValueError):
+        return None
+    registration["files"] = [os.path.join(task_folder, name) for name in registration["files"]]
+    return registration
+
+
+def estimate_registration(saved: dict) -> Optional[dict]:
+    """由 stitch.json 估計相機參數"""
+    stitcher = IncrementalStitcher()
+    stitcher.load(saved)
+    return stitcher.finish()
+
+
+def register_files(task_folder: str) -> Optional[dict]:
+    """由影像檔重新登錄 (無 stitch.json 時)，存大地坐標的任務檔名沒有 PTZ 角度，只以特徵點登錄"""
+    names = sorted(name for name in os.listdir(task_folder)
+                   if name.startswith("img_") and name.endswith(".jpg"))
+    journal = read_journal(task_folder)
+    ptz_names = not (journal is not None and journal.get("save_global_coordinate"))
+    stitcher = IncrementalStitcher()
+    stitcher.start(task_folder)
+    for name in names:
+        path = os.path.join(task_folder, name)
+        img = cv2.imread(path)
+        if img is not None:
+            stitcher.add_frame(path, img, parse_ptz_angle(name) if ptz_names else None)
+    return stitcher.finish()
+
+
+def compose_megapix_limit(registration: dict, memory_mb: int) -> float:
+    """依記憶體上限計算合成解析度(百萬像素)，不需縮小時回傳 -1"""
+    img = cv2.imread(registration["files"][0])
+    if img is None:
+        return -1.0
+    frame_pixels = img.shape[0] * img.shape[1]
+    panorama_pixels = frame_pixels * len(registration["files"]) * PANORAMA_OVERLAP
+    allowed_pixels = memory_mb * 1024 * 1024 / 2 / BLEND_BYTES_PER_PIXEL  # 保留一半給其他用途
+    if panorama_pixels <= allowed_pixels:
+        return -1.0
+    return frame_pixels * allowed_pixels / panorama_pixels / 1e6
+
+
+def tiles_folder(tiles_root: str, task_folder: str) -> str:
+    """task 資料夾 (save_imgs/<pos>/<task>) 對應的圖磚資料夾 (<tiles_root>/<pos>/<task>)"""
+    task_folder = os.path.normpath(task_folder)
+    return os.path.join(tiles_root, os.path.basename(os.path.dirname(task_folder)),
+                        os.path.basename(task_folder))
+
+
+def stitch_folder(task_folder: str, task_type: str, memory_mb: int,
+                  tiles_root: Optional[str] = None, tiles_keep=50) -> dict:
+    """拼接任務資料夾，回傳結果 {"state": "ok" / "ng", ...}"""
+    start = time.time()
+    saved = read_registration(task_folder)
+    registration, mode = None, "registration"
+    if saved is not None:
+        try:
+            registration = estimate_registration(saved)
+        except (KeyError, TypeError, ValueError):
+            saved = None  # stitch.json 不完整或影像已不存在
+    if saved is None:
+        registration = register_files(task_folder)
+        mode = "files"
+    if registration is None:
+        return {"state": "ng", "error": "not enough matched images"}
+    compose_megapix = compose_megapix_limit(registration, memory_mb)
+    pano = compose_panorama(registration["files"], registration["cameras"],
+                            registration["work_scale"], compose_megapix=compose_megapix)
+    if pano is None:
+        return {"state": "ng", "error": "compose failed"}
+
+    from panorama.panorama import (crop, add_black_margin)
+    pano = crop(pano)
+    pano = add_black_margin(pano)
+    result = os.path.join(task_folder, f"{task_type}.jpg")
+    tmp_result = os.path.join(task_folder, f"{task_type}.tmp.jpg")
+    if not cv2.imwrite(tmp_result, pano):
+        return {"state": "ng", "error": "save image failed"}
+    os.replace(tmp_result, result)
+    output = {"state": "ok", "result": result, "mode": mode, "frames": len(registration["files"]),
+              "compose_megapix": compose_megapix}
+
+    if tiles_root:
+        # 圖磚失敗不影響拼接結果
+        tiles_dir = tiles_folder(tiles_root, task_folder)
+        try:
+            pyramid = write_tile_pyramid(pano, tiles_dir)
+            output["tiles"] = tiles_dir
+            output["tile_levels"] = pyramid["max_level"] + 1
+            prune_pyramids(tiles_root, tiles_keep)
+        except Exception as e:
+            output["tiles_error"] = str(e)
+    output["cost"] = round(time.time() - start, 1)
+    return output
+
+
+def limit_resources(memory_mb: int, threads: int):
+    """限制記憶體、降低優先權與執行緒數量，避免影響控制迴圈"""
+    try:
+        import resource  # 僅 POSIX
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass  # Windows 由主程式以 BELOW_NORMAL_PRIORITY_CLASS 啟動
+    cv2.setNumThreads(threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="stitch task images")
+    parser.add_argument("task_folder")
+    parser.add_argument("task_type")
+    parser.add_argument("--memory-mb", type=int, default=1500)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--tiles-root", default=None)
+    parser.add_argument("--tiles-keep", type=int, default=50)
+    args = parser.parse_args()
+
+    limit_resources(args.memory_mb, args.threads)
+    try:
+        result = stitch_folder(args.task_folder, args.task_type, args.memory_mb,
+                               args.tiles_root, args.tiles_keep)
+    except MemoryError:
+        result = {"state": "ng", "error": "out of memory"}
+    except Exception as e:
+        result = {"state": "ng", "error": str(e)}
+    print(json.dumps(result))
+    sys.exit(0 if result["state"] == "ok" else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+全景圖分層圖磚 (Deep Zoom)：
+    拼接結果切成 256 px 圖磚，每一層縮小一半直到 1 x 1，網頁只下載目前可見範圍的圖磚。
+    目錄：<out_dir>/<level>/<col>_<row>.jpg，另有 image.dzi (OpenSeadragon)、pyramid.json 與 preview.jpg。
+    先寫入暫存目錄完成後再改名，網頁不會讀到未完成的圖磚。
+    每次產生記錄版本 (version)，網址包含版本，重新拼接後網址改變，圖磚可長時間快取。
+"""
+import json
+import math
+import os
+import shutil
+import time
+from typing import Optional
+
+import cv2
+
+PYRAMID_NAME = "pyramid.json"
+PREVIEW_NAME = "preview.jpg"
+DZI_NAME = "image.dzi"
+DZI_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="jpg" Overlap="{overlap}" TileSize="{tile_size}">
+  <Size Width="{width}" Height="{height}"/>
+</Image>
+"""
+
+
+def write_tile_pyramid(img, out_dir: str, tile_size=256, overlap=0, quality=85,
+                       preview_width=1024) -> dict:
+    """產生圖磚，回傳 pyramid 資訊"""
+    height, width = img.shape[:2]
+    max_level = int(math.ceil(math.log2(max(width, height, 1))))
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+
+    level_img = img
+    tile_cnt = 0
+    for level in range(max_level, -1, -1):
+        level_height, level_width = level_img.shape[:2]
+        level_dir = os.path.join(tmp_dir, str(level))
+        os.makedirs(level_dir)
+        for row in range(int(math.ceil(level_height / tile_size))):
+            for col in range(int(math.ceil(level_width / tile_size))):
+                x0 = max(0, col * tile_size - overlap)
+                y0 = max(0, row * tile_size - overlap)
+                x1 = min(level_width, (col + 1) * tile_size + overlap)
+                y1 = min(level_height, (row + 1) * tile_size + overlap)
+                path = os.path.join(level_dir, f"{col}_{row}.jpg")
+                if not cv2.imwrite(path, level_img[y0:y1, x0:x1], params):
+                    raise IOError(f"write tile failed, path:{path}")
+                tile_cnt += 1
+        if level > 0:
+            # 下一層縮小一半 (無條件進位，與 Deep Zoom 一致)
+            level_img = cv2.resize(level_img, (max(1, (level_width + 1) // 2),
+                                               max(1, (level_height + 1) // 2)),
+                                   interpolation=cv2.INTER_AREA)
+
+    preview_scale = min(1.0, preview_width / width)
+    preview = cv2.resize(img, (max(1, int(width * preview_scale)), max(1, int(height * preview_scale))),
+                         interpolation=cv2.INTER_AREA)
+    cv2.imwrite(os.path.join(tmp_dir, PREVIEW_NAME), preview, params)
+
+    info = {"width": width, "height": height, "tile_size": tile_size, "overlap": overlap,
+            "format": "jpg", "max_level": max_level, "tile_cnt": tile_cnt,
+            "version": f"{time.time_ns() // 1000000:x}"}
+    with open(os.path.join(tmp_dir, DZI_NAME), "w", encoding="utf-8") as f:
+        f.write(DZI_TEMPLATE.format(overlap=overlap, tile_size=tile_size, width=width, height=height))
+    with open(os.path.join(tmp_dir, PYRAMID_NAME), "w", encoding="utf-8") as f:
+        json.dump(info, f)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return info
+
+
+def read_pyramid_info(out_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(out_dir, PYRAMID_NAME), "r", encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    info.setdefault("version", "0")  # 舊版圖磚沒有版本
+    return info
+
+
+def prune_pyramids(root: str, keep=50):
+    """只保留最新的 keep 個任務圖磚 (root/<pos>/<task>)"""
+    if not os.path.isdir(root):
+        return
+    task_dirs = []
+    for pos_entry in os.scandir(root):
+        if not pos_entry.is_dir():
+            continue
+        for task_entry in os.scandir(pos_entry.path):
+            if task_entry.is_dir() and not task_entry.name.endswith(".tmp"):
+                task_dirs.append((task_entry.stat().st_mtime, task_entry.path))
+    task_dirs.sort(reverse=True)
+    for _, path in task_dirs[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+    for pos_entry in os.scandir(root):
+        if pos_entry.is_dir() and not os.listdir(pos_entry.path):
+            try:
+                os.rmdir(pos_entry.path)
+            except OSError:
+                pass  # 其他 worker 同時寫入
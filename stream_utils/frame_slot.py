@@ -0,0 +1,139 @@
+"""
+最新影像槽 (latest-frame slot)：
+    每個相機一個讀取執行緒輪詢相機 (read_func)，只有相機解碼出新影像時才放入槽中，
+    附影像序號與取像時間，串流、即時圖像與存檔共用同一張影像 (唯讀 view，使用者之間不複製)。
+    新影像判斷：read_func 回傳 (影像, 影像編號, 取像時間 time.monotonic) 時依影像編號，
+    只回傳影像時依影像內容取樣比對 (相同內容為同一張解碼影像，不重複發佈)，取像時間為第一次讀到的時間。
+    發佈時以單一 tuple 替換，讀取端只取得 tuple 參照；需要等待新影像時使用 Condition。
+    沒有使用者一段時間後讀取執行緒自動停止，下次讀取時再啟動。
+"""
+import time
+from threading import Condition, Thread
+from typing import Callable, Optional, Tuple
+
+Frame = Tuple[int, float, object]  # (seq, ts, frame)
+
+
+class FrameSlot:
+    """單一相機的最新影像槽"""
+
+    def __init__(self, name: str, read_func: Callable, interval=0.03, idle_timeout=5.0,
+                 logger=None):
+        self.name = name
+        self.read_func = read_func  # read_func() -> 影像 或 (影像, 影像編號, 取像時間)，失敗時回傳 None
+        self.interval = interval  # 取像間隔(秒)
+        self.idle_timeout = idle_timeout  # 無使用者多久後停止讀取(秒)
+        self.logger = logger
+        self.latest: Frame = (0, 0.0, None)
+        self.cond = Condition()
+        self.thread: Optional[Thread] = None
+        self.last_access = time.monotonic()
+        self.read_seq = 0  # 最後一次被讀取的序號
+        self.last_key = None  # 最新影像的編號或內容取樣
+
+        # 統計
+        self.frame_cnt = 0
+        self.poll_cnt = 0
+        self.duplicate_cnt = 0  # 輪詢到尚未更新的影像
+        self.error_cnt = 0
+        self.dropped_cnt = 0  # 未被任何使用者讀取即被取代的影像
+        self.fps = 0.0  # 取像頻率 (EMA)
+
+    def get(self) -> Frame:
+        """取最新影像 (不等待)，尚無影像時 frame 為 None"""
+        self._touch()
+        frame = self.latest
+        self.read_seq = frame[0]
+        return frame
+
+    def wait_newer(self, seq=0, after: Optional[float] = None, timeout=1.0) -> Optional[Frame]:
+        """
+        等待序號大於 seq 的影像，指定 after (time.monotonic) 時影像需在 after 之後才解碼，
+        逾時回傳 None
+        """
+        self._touch()
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                frame = self.latest
+                if frame[0] > seq and (after is None or frame[1] >= after):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+        self.read_seq = frame[0]
+        return frame
+
+    def get_stats(self) -> dict:
+        seq, ts, _ = self.latest
+        return {
+            "running": self.thread is not None,
+            "seq": seq,
+            "age": round(time.monotonic() - ts, 3) if seq else None,  # 最新影像經過時間(秒)
+            "fps": round(self.fps, 1),
+            "frame_cnt": self.frame_cnt,
+            "poll_cnt": self.poll_cnt,
+            "duplicate_cnt": self.duplicate_cnt,
+            "error_cnt": self.error_cnt,
+            "dropped_cnt": self.dropped_cnt,
+        }
+
+    def _touch(self):
+        with self.cond:
+            self.last_access = time.monotonic()
+            if self.thread is None:
+                self.last_key = None  # 重新啟動後第一張影像一定發佈
+                self.thread = Thread(target=self._run, daemon=True,
+                                     name=f"frame-{self.name}")
+                self.thread.start()
+
+    def _run(self):
+        last_ts = None
+        while True:
+            with self.cond:
+                if time.monotonic() - self.last_access > self.idle_timeout:
+                    self.thread = None
+                    return
+            start = time.monotonic()
+            try:
+                frame = self.read_func()
+            except Exception as e:
+                frame = None
+                if self.logger is not None and self.error_cnt % 100 == 0:
+                    self.logger.error(f"{self.name} read frame failed, error:{e}")
+            self.poll_cnt += 1
+            if isinstance(frame, tuple):
+                frame, key, ts = frame
+            else:
+                key, ts = self._sample(frame), start
+            if frame is None:
+                self.error_cnt += 1
+            elif key is not None and key == self.last_key:
+                self.duplicate_cnt += 1  # 相機尚未解碼新影像
+            else:
+                self.last_key = key
+                if hasattr(frame, "view"):
+                    frame = frame.view()
+                    frame.flags.writeable = False  # 共用影像，使用者不可修改
+                self._publish(frame, ts)
+                if last_ts is not None and ts > last_ts:
+                    self.fps += 0.1 * (1.0 / (ts - last_ts) - self.fps)
+                last_ts = ts
+            time.sleep(max(0.0, self.interval - (time.monotonic() - start)))
+
+    @staticmethod
+    def _sample(frame, step=16):
+        """影像內容取樣 (每 step 像素取一點)，用於判斷是否為同一張解碼影像"""
+        if frame is None or not hasattr(frame, "tobytes"):
+            return None
+        return hash(frame[::step, ::step].tobytes())
+
+    def _publish(self, frame, ts: float):
+        with self.cond:
+            seq = self.latest[0]
+            if seq and self.read_seq < seq:
+                self.dropped_cnt += 1
+            self.latest = (seq + 1, ts, frame)
+            self.frame_cnt += 1
+            self.cond.notify_all()
@@ -0,0 +1,226 @@
+"""
+MJPEG 串流廣播：
+    每個影像來源一個執行緒，由最新影像槽 (FrameSlot) 取得新影像後放入共用的環形緩衝區 (ring buffer)，
+    每張影像依 (寬度, 品質) 只做一次 JPEG 編碼，相同參數的連線共用同一份資料。
+    連線可指定 fps、寬度與最高品質，依影像序號與取像時間決定送出哪一張，不以 sleep 控制頻率；
+    依實際送出時間自動調整品質 (quality ladder)，頻寬不足時降低品質而不累積延遲。
+    連線落後過多時直接跳到最新影像 (丟棄舊影像)，不會阻塞取像執行緒與其他連線。
+    沒有連線一段時間後執行緒自動停止，有新連線時再啟動。
+"""
+import itertools
+import time
+from collections import deque
+from threading import Condition, Lock, Thread
+from typing import Dict, Iterator, Optional
+
+import cv2
+
+from stream_utils.frame_slot import FrameSlot
+
+BOUNDARY = b"frame"
+QUALITY_LADDER = (90, 75, 60, 45, 30)  # JPEG 品質階層，由高至低
+UP_FRAMES = 15  # 連續幾張送出時間充裕才提高品質
+
+
+class StreamOptions:
+    """單一連線的串流參數"""
+
+    def __init__(self, fps: Optional[float] = None, width: Optional[int] = None,
+                 quality: Optional[int] = None, adaptive=True):
+        self.fps = fps if fps and fps > 0 else None  # None: 依來源頻率
+        self.width = width if width and width > 0 else None  # None: 原始寬度
+        self.quality = quality or QUALITY_LADDER[0]  # 最高品質
+        self.adaptive = adaptive
+
+
+class FrameEntry:
+    """緩衝區中的一張影像與其編碼結果"""
+
+    def __init__(self, seq: int, ts: float, frame):
+        self.seq = seq
+        self.ts = ts  # 取像時間(time.monotonic)
+        self.frame = frame
+        self.encoded: Dict[tuple, bytes] = {}  # (width, quality) -> multipart bytes
+        self.lock = Lock()
+
+
+class MJPEGBroadcaster:
+    """單一影像來源的 MJPEG 廣播"""
+
+    def __init__(self, name: str, slot: FrameSlot, buffer_size=8,
+                 max_lag=2, idle_timeout=5.0, stall_timeout=10.0, logger=None):
+        self.name = name
+        self.slot = slot  # 影像來源
+        self.max_lag = max_lag  # 連線落後超過此張數時跳到最新影像
+        self.idle_timeout = idle_timeout  # 無連線多久後停止(秒)
+        self.stall_timeout = stall_timeout  # 多久沒有新影像即結束連線(秒)
+        self.logger = logger
+        self.cond = Condition()
+        self.buffer = deque(maxlen=buffer_size)  # FrameEntry
+        self.seq = 0
+        self.clients: Dict[int, dict] = {}  # client id -> 連線狀態
+        self.client_ids = itertools.count(1)
+        self.idle_since = time.monotonic()
+        self.thread: Optional[Thread] = None
+
+        # 統計
+        self.frame_cnt = 0
+        self.encode_cnt = 0
+        self.error_cnt = 0
+        self.sent_cnt = 0
+        self.dropped_cnt = 0
+        self.encode_time = 0.0  # 最近一次編碼時間(秒)
+
+    def stream(self, options: Optional[StreamOptions] = None) -> Iterator[bytes]:
+        """單一連線的 multipart 產生器"""
+        options = options or StreamOptions()
+        ladder = [q for q in QUALITY_LADDER if q <= options.quality] or [QUALITY_LADDER[-1]]
+        period = 1.0 / options.fps if options.fps else 0.0
+        budget = max(period, self.slot.interval)  # 每張影像可用的送出時間
+        client_id = self._subscribe(options, ladder[0])
+        level, fast_cnt = 0, 0
+        try:
+            last_seq, due = self.seq, 0.0
+            while True:
+                entry = self._next_frame(last_seq, due, paced=period > 0)
+                if entry is None:
+                    if self.logger is not None:
+                        self.logger.warning(f"{self.name} stream stalled, close connection")
+                    break
+                try:
+                    data = self._encode(entry, options.width, ladder[level])
+                except Exception as e:
+                    with self.cond:
+                        self.error_cnt += 1
+                    if self.logger is not None:
+                        self.logger.error(f"{self.name} encode frame failed, error:{e}")
+                    break
+                start = time.monotonic()
+                yield data
+                send_time = time.monotonic() - start
+                last_seq = entry.seq
+                due = entry.ts + period * 0.9  # 容許取像時間誤差
+
+                # 依送出時間調整品質
+                if options.adaptive:
+                    if send_time > budget and level < len(ladder) - 1:
+                        level, fast_cnt = level + 1, 0
+                    elif send_time < budget * 0.5:
+                        fast_cnt += 1
+                        if fast_cnt >= UP_FRAMES and level > 0:
+                            level, fast_cnt = level - 1, 0
+                    else:
+                        fast_cnt = 0
+                with self.cond:
+                    self.sent_cnt += 1
+                    client = self.clients[client_id]
+                    client["quality"] = ladder[level]
+                    client["sent_cnt"] += 1
+                    if send_time > 0:
+                        throughput = len(data) / send_time
+                        client["throughput"] += 0.2 * (throughput - client["throughput"])
+        finally:
+            self._unsubscribe(client_id)
+
+    def get_stats(self) -> dict:
+        with self.cond:
+            return {
+                "subscribers": len(self.clients),
+                "running": self.thread is not None,
+                "seq": self.seq,
+                "frame_cnt": self.frame_cnt,
+                "encode_cnt": self.encode_cnt,
+                "error_cnt": self.error_cnt,
+                "sent_cnt": self.sent_cnt,
+                "dropped_cnt": self.dropped_cnt,
+                "encode_time": round(self.encode_time, 4),
+                "clients": [{"fps": client["fps"], "width": client["width"],
+                             "quality": client["quality"], "sent_cnt": client["sent_cnt"],
+                             "throughput": int(client["throughput"])}  # bytes/秒
+                            for client in self.clients.values()],
+            }
+
+    def _next_frame(self, last_seq: int, due: float, paced: bool) -> Optional[FrameEntry]:
+        """
+        等待比 last_seq 新且取像時間已到 due 的影像：
+            有指定 fps 或落後過多時送出最新影像，否則依序送出
+        """
+        deadline = time.monotonic() + self.stall_timeout
+        with self.cond:
+            while True:
+                if self.seq > last_seq and self.buffer[-1].ts >= due:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            oldest_seq = self.buffer[0].seq
+            if paced:
+                return self.buffer[-1]
+            if self.seq - last_seq > self.max_lag or last_seq < oldest_seq:
+                # 落後過多，丟棄中間影像
+                self.dropped_cnt += self.seq - last_seq - 1
+                return self.buffer[-1]
+            return self.buffer[last_seq + 1 - oldest_seq]
+
+    def _encode(self, entry: FrameEntry, width: Optional[int], quality: int) -> bytes:
+        """同一張影像相同參數只編碼一次"""
+        key = (width, quality)
+        with entry.lock:
+            data = entry.encoded.get(key)
+            if data is not None:
+                return data
+            start = time.monotonic()
+            frame = entry.frame
+            if width is not None and width < frame.shape[1]:
+                height = max(1, int(frame.shape[0] * width / frame.shape[1]))
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            ret, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ret:
+                raise ValueError(f"{self.name} imencode failed")
+            data = b"--" + BOUNDARY + b"\r\n" \
+                b"Content-Type: image/jpeg\r\n\r\n" + jpeg.tobytes() + b"\r\n\r\n"
+            entry.encoded[key] = data
+        with self.cond:
+            self.encode_cnt += 1
+            self.encode_time = time.monotonic() - start
+        return data
+
+    def _subscribe(self, options: StreamOptions, quality: int) -> int:
+        with self.cond:
+            client_id = next(self.client_ids)
+            self.clients[client_id] = {"fps": options.fps, "width": options.width,
+                                       "quality": quality, "sent_cnt": 0, "throughput": 0.0}
+            if self.thread is None:
+                self.thread = Thread(target=self._run, daemon=True,
+                                     name=f"mjpeg-{self.name}")
+                self.thread.start()
+            return client_id
+
+    def _unsubscribe(self, client_id: int):
+        with self.cond:
+            self.clients.pop(client_id, None)
+            if not self.clients:
+                self.idle_since = time.monotonic()
+
+    def _run(self):
+        slot_seq = 0
+        while True:
+            with self.cond:
+                if not self.clients and time.monotonic() - self.idle_since > self.idle_timeout:
+                    self.thread = None
+                    self.buffer.clear()
+                    return
+            # 依影像序號等待新影像，不以 sleep 控制頻率
+            frame = self.slot.wait_newer(slot_seq, timeout=1.0)
+            if frame is None:
+                continue
+            slot_seq, ts, img = frame
+            self._publish(img, ts)
+
+    def _publish(self, frame, ts: float):
+        with self.cond:
+            self.seq += 1
+            self.buffer.append(FrameEntry(self.seq, ts, frame))
+            self.frame_cnt += 1
+            self.cond.notify_all()
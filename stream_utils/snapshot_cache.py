@@ -0,0 +1,80 @@
+"""
+即時圖像快取：
+    依最新影像槽 (FrameSlot) 的影像序號快取 JPEG 與 Base64 編碼結果，
+    每張影像只在第一次被讀取時編碼一次 (Base64 也在第一次需要時才轉換)，
+    多個網頁輪詢共用同一份資料；以影像序號作為 ETag，影像未更新時回應 304。
+    Base64 回應為快取 JPEG 的 Base64 字串，與 ETag 為同一張影像，不另外取像編碼。
+"""
+import time
+from base64 import b64encode
+from threading import Lock
+from typing import Optional
+
+import cv2
+
+from stream_utils.frame_slot import FrameSlot
+
+
+class Snapshot:
+    """單一影像的編碼結果"""
+
+    def __init__(self, seq: int, etag: str, jpeg: bytes):
+        self.seq = seq
+        self.etag = etag
+        self.jpeg = jpeg
+        self.lock = Lock()
+        self._base64: Optional[str] = None
+
+    def get_base64(self) -> str:
+        """Base64 字串 (第一次需要時才轉換)"""
+        with self.lock:
+            if self._base64 is None:
+                self._base64 = b64encode(self.jpeg).decode("utf-8")
+            return self._base64
+
+
+class SnapshotCache:
+    """單一影像來源的即時圖像快取"""
+
+    def __init__(self, name: str, slot: FrameSlot, max_age=1.0, timeout=1.0, logger=None):
+        self.name = name
+        self.slot = slot
+        self.max_age = max_age  # 影像超過此時間(秒)視為過期，等待新影像
+        self.timeout = timeout  # 等待新影像時間(秒)
+        self.logger = logger
+        self.lock = Lock()
+        self.snapshot: Optional[Snapshot] = None
+        self.boot_id = f"{int(time.time()):x}"  # 程式重啟後序號重新計算，ETag 加上啟動時間
+
+        # 統計
+        self.request_cnt = 0
+        self.encode_cnt = 0
+
+    def get(self) -> Optional[Snapshot]:
+        """取最新影像的編碼結果，無影像時回傳 None"""
+        seq, ts, img = self.slot.get()
+        if img is None or time.monotonic() - ts > self.max_age:
+            frame = self.slot.wait_newer(seq, timeout=self.timeout)
+            if frame is None:
+                return None
+            seq, ts, img = frame
+        with self.lock:
+            self.request_cnt += 1
+            if self.snapshot is not None and self.snapshot.seq >= seq:
+                return self.snapshot
+            ret, jpeg = cv2.imencode(".jpg", img)
+            if not ret:
+                if self.logger is not None:
+                    self.logger.error(f"{self.name} imencode failed, seq:{seq}")
+                return None
+            self.snapshot = Snapshot(seq, f"{self.name}-{self.boot_id}-{seq}", jpeg.tobytes())
+            self.encode_cnt += 1
+            return self.snapshot
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "seq": self.snapshot.seq if self.snapshot is not None else None,
+                "request_cnt": self.request_cnt,
+                "encode_cnt": self.encode_cnt,
+            }
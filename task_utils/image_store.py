@@ -0,0 +1,169 @@
+"""
+本機圖像索引 (SQLite)：
+    save_imgs/位置(x,y,theta,tag_id)/task年月日時分秒/檔案 的索引，
+    依位置、tag id、任務類型、時間查詢與分頁，不需 os.listdir 掃描資料夾。
+    任務開始、存檔、任務結束與刪除時更新；索引檔不存在時由 save_imgs 重建。
+"""
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import List, Optional
+
+from task_utils.task_journal import load_task_record
+
+SCHEMA = """
+create table if not exists tasks (
+    pos_id text not null,
+    task_id text not null,
+    task_type text,
+    tag_id text,
+    pos_x text,
+    pos_y text,
+    pos_theta text,
+    task_time text,
+    primary key (pos_id, task_id)
+);
+create index if not exists idx_tasks_tag on tasks (tag_id, task_time);
+create index if not exists idx_tasks_type on tasks (task_type, task_time);
+create index if not exists idx_tasks_time on tasks (task_time);
+create table if not exists images (
+    pos_id text not null,
+    task_id text not null,
+    name text not null,
+    size integer,
+    mtime real,
+    primary key (pos_id, task_id, name)
+);
+"""
+
+
+class ImageStore:
+    """本機圖像索引"""
+
+    def __init__(self, db_path: str, root="save_imgs", logger=None):
+        self.db_path = db_path
+        self.root = root
+        self.logger = logger
+        self.lock = Lock()
+        rebuild = not os.path.exists(db_path)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("pragma journal_mode=wal")
+            self.conn.executescript(SCHEMA)
+        if rebuild:
+            self.rebuild()
+
+    def add_task(self, pos_id: str, task_id: str, task_type="", tag_id=None,
+                 pos_x=None, pos_y=None, pos_theta=None, task_time=""):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "insert or replace into tasks values (?, ?, ?, ?, ?, ?, ?, ?)",
+                (pos_id, task_id, task_type, self._text(tag_id), self._text(pos_x),
+                 self._text(pos_y), self._text(pos_theta), task_time))
+
+    def add_image(self, pos_id: str, task_id: str, name: str, size=None, mtime=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "insert or replace into images values (?, ?, ?, ?, ?)",
+                (pos_id, task_id, name, size, mtime if mtime is not None else time.time()))
+
+    def index_task_files(self, pos_id: str, task_id: str):
+        """更新單一任務資料夾的檔案索引"""
+        task_dir = os.path.join(self.root, pos_id, task_id)
+        rows = []
+        for entry in os.scandir(task_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                rows.append((pos_id, task_id, entry.name, stat.st_size, stat.st_mtime))
+        with self.lock, self.conn:
+            self.conn.execute(
+                "delete from images where pos_id = ? and task_id = ?", (pos_id, task_id))
+            self.conn.executemany(
+                "insert or replace into images values (?, ?, ?, ?, ?)", rows)
+
+    def remove_task(self, pos_id: str, task_id: str):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "delete from images where pos_id = ? and task_id = ?", (pos_id, task_id))
+            self.conn.execute(
+                "delete from tasks where pos_id = ? and task_id = ?", (pos_id, task_id))
+
+    def list_pos(self, offset=0, limit: Optional[int] = None) -> List[str]:
+        return self._column(
+            "select distinct pos_id from tasks order by pos_id", (), offset, limit)
+
+    def list_tasks(self, pos_id: str, offset=0, limit: Optional[int] = None) -> List[str]:
+        return self._column(
+            "select task_id from tasks where pos_id = ? order by task_id", (pos_id,), offset, limit)
+
+    def list_images(self, pos_id: str, task_id: str, offset=0, limit: Optional[int] = None) -> List[str]:
+        return self._column(
+            "select name from images where pos_id = ? and task_id = ? order by name",
+            (pos_id, task_id), offset, limit)
+
+    def find_tasks(self, tag_id=None, task_type=None, since=None, until=None,
+                   offset=0, limit: Optional[int] = None) -> List[dict]:
+        """依 tag id、任務類型、時間區間 (task_time 字串) 查詢任務"""
+        query = "select pos_id, task_id, task_type, tag_id, task_time, " \
+                "(select count(*) from images i where i.pos_id = t.pos_id and i.task_id = t.task_id) " \
+                "from tasks t where 1 = 1"
+        args = []
+        if tag_id is not None:
+            query += " and tag_id = ?"
+            args.append(self._text(tag_id))
+        if task_type:
+            query += " and task_type = ?"
+            args.append(task_type)
+        if since:
+            query += " and task_time >= ?"
+            args.append(since)
+        if until:
+            query += " and task_time <= ?"
+            args.append(until)
+        query += " order by task_time desc limit ? offset ?"
+        args += [-1 if limit is None else limit, offset]
+        with self.lock:
+            rows = self.conn.execute(query, args).fetchall()
+        keys = ("pos_id", "task_id", "task_type", "tag_id", "task_time", "img_cnt")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def rebuild(self):
+        """由 save_imgs 重建索引"""
+        start = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("delete from images")
+            self.conn.execute("delete from tasks")
+        if not os.path.isdir(self.root):
+            return
+        task_cnt = 0
+        for pos_entry in os.scandir(self.root):
+            if not pos_entry.is_dir():
+                continue
+            for task_entry in os.scandir(pos_entry.path):
+                if not task_entry.is_dir():
+                    continue
+                try:
+                    record = load_task_record(task_entry.path)
+                except Exception:
+                    record = {}
+                self.add_task(pos_entry.name, task_entry.name, record.get("task_type", ""),
+                              record.get("amr_tag_id"), record.get("amr_pos_x"),
+                              record.get("amr_pos_y"), record.get("amr_pos_theta"),
+                              record.get("task_time", ""))
+                self.index_task_files(pos_entry.name, task_entry.name)
+                task_cnt += 1
+        if self.logger is not None:
+            self.logger.info(
+                f"rebuild image index, tasks:{task_cnt}, cost:{time.time() - start:.1f}s")
+
+    def _column(self, query: str, args: tuple, offset: int, limit: Optional[int]) -> List[str]:
+        query += " limit ? offset ?"
+        with self.lock:
+            rows = self.conn.execute(
+                query, args + (-1 if limit is None else limit, offset)).fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _text(value) -> Optional[str]:
+        return None if value is None else str(value)
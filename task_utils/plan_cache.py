@@ -0,0 +1,106 @@
+"""
+designated / video 任務計畫快取：
+    以 (task_type, amr_tag_id) 為 key，保存由 designated_task 資料列預先換算的拍攝計畫，
+    TTL 內直接使用記憶體資料；過期時以版本查詢 (筆數、最後建立時間) 確認是否需重新載入。
+    快取寫入檔案，程式重啟或 MySQL 無法連線時使用最後一次的計畫。
+"""
+import json
+import os
+import time
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class PlanCache:
+    """任務計畫快取"""
+
+    def __init__(self, load_func: Callable, version_func: Callable, build_func: Callable,
+                 path="plan_cache.json", ttl=300.0, logger=None):
+        self.load_func = load_func  # load_func(task_type, tag_id) -> rows，失敗時拋出例外
+        self.version_func = version_func  # version_func(task_type, tag_id) -> str，失敗時拋出例外
+        self.build_func = build_func  # build_func(rows) -> plan (list)
+        self.path = path
+        self.ttl = ttl  # 不查詢版本的有效時間(秒)
+        self.logger = logger
+        self.lock = Lock()
+        self.plans: Dict[str, dict] = {}  # key -> {"version", "plan", "update_time"}
+        self.checked: Dict[str, float] = {}  # key -> 最後確認時間(time.monotonic)
+        self.load()
+
+    @staticmethod
+    def _key(task_type: str, tag_id) -> str:
+        return f"{task_type}:{tag_id}"
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                plans = json.load(f)
+        except (OSError, ValueError):
+            plans = {}
+        with self.lock:
+            self.plans = plans if isinstance(plans, dict) else {}
+
+    def save(self):
+        """寫入暫存檔後取代"""
+        with self.lock:
+            data = json.dumps(self.plans, ensure_ascii=False)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def get(self, task_type: str, tag_id) -> Tuple[Optional[List], str]:
+        """
+        取得計畫，回傳 (plan, source)：
+            source：cache (記憶體)、db (重新載入)、stale (MySQL 無法連線，使用最後一次計畫)
+            plan 為 None 表示無計畫可用
+        """
+        key = self._key(task_type, tag_id)
+        with self.lock:
+            entry = self.plans.get(key)
+            checked = self.checked.get(key)
+        if entry is not None and checked is not None and time.monotonic() - checked < self.ttl:
+            return entry["plan"], "cache"
+
+        try:
+            version = str(self.version_func(task_type, tag_id))
+            if entry is not None and entry["version"] == version:
+                with self.lock:
+                    self.checked[key] = time.monotonic()
+                return entry["plan"], "cache"
+            plan = self.build_func(self.load_func(task_type, tag_id))
+        except Exception as e:
+            self._error(f"load {key} plan failed, error:{e}")
+            if entry is not None:
+                return entry["plan"], "stale"
+            return None, "stale"
+
+        with self.lock:
+            self.plans[key] = {"version": version, "plan": plan,
+                               "update_time": time.strftime("%Y-%m-%d %H:%M:%S")}
+            self.checked[key] = time.monotonic()
+        try:
+            self.save()
+        except Exception as e:
+            self._error(f"save plan cache failed, error:{e}")
+        return plan, "db"
+
+    def invalidate(self, task_type: Optional[str] = None, tag_id=None):
+        """資料異動後，下次使用時重新確認版本"""
+        with self.lock:
+            if task_type is None or tag_id is None:
+                self.checked.clear()
+            else:
+                self.checked.pop(self._key(task_type, tag_id), None)
+
+    def get_status(self) -> dict:
+        with self.lock:
+            return {key: {"version": entry["version"], "shots": len(entry["plan"]),
+                          "update_time": entry["update_time"]}
+                    for key, entry in self.plans.items()}
+
+    def _error(self, message: str):
+        if self.logger is not None:
+            self.logger.error(message)
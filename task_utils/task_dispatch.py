@@ -0,0 +1,75 @@
+"""
+任務分派：
+    task type -> start function 註冊表，Flask route 與 PLC (do_routine_job) 共用，
+    PLC 命令不需再經由 HTTP 呼叫本機 Flask server。
+"""
+from threading import Lock, Thread
+from typing import Callable, Dict, Optional
+
+
+class TaskDispatcher:
+    """任務分派"""
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.lock = Lock()  # 同一時間只執行一個 start function
+        self.start_funcs: Dict[str, Callable] = {}  # {task type: start function}
+        self.status_funcs: Dict[str, Callable] = {}  # {task type: is running function}
+        self.finish_listeners = []  # callback(task_type)
+
+    def register(self, task_type: str, start_func: Callable, is_running: Optional[Callable] = None):
+        """
+        註冊任務：
+            start_func(requestor) -> (status, message)
+            is_running() -> bool
+        """
+        self.start_funcs[task_type] = start_func
+        if is_running is not None:
+            self.status_funcs[task_type] = is_running
+
+    def task_types(self):
+        return list(self.start_funcs)
+
+    def start(self, task_type: str, requestor: str = "manual") -> dict:
+        """開始任務，回傳 {"status": bool, "message": str}"""
+        start_func = self.start_funcs.get(task_type)
+        if start_func is None:
+            return {"status": False, "message": f"{task_type} is not a valid task type!"}
+        with self.lock:
+            try:
+                status, message = start_func(requestor)
+            except Exception as e:
+                self._log_error(f"start {task_type} task failed, error:{e}")
+                status, message = False, f"start {task_type} task failed, error:{e}"
+        return {"status": status, "message": message}
+
+    def is_running(self, task_type: str) -> bool:
+        """任務是否執行中"""
+        is_running = self.status_funcs.get(task_type)
+        return bool(is_running()) if is_running is not None else False
+
+    def spawn(self, task_type: str, target: Callable, *args) -> Thread:
+        """以執行緒執行任務，結束時通知 finish listeners"""
+        def run():
+            try:
+                target(*args)
+            finally:
+                self._notify_finished(task_type)
+        thread = Thread(target=run)
+        thread.start()
+        return thread
+
+    def add_finish_listener(self, callback: Callable):
+        """任務結束時呼叫 callback(task_type)"""
+        self.finish_listeners.append(callback)
+
+    def _notify_finished(self, task_type: str):
+        for callback in self.finish_listeners:
+            try:
+                callback(task_type)
+            except Exception as e:
+                self._log_error(f"task finish listener failed, error:{e}")
+
+    def _log_error(self, message: str):
+        if self.logger is not None:
+            self.logger.error(message)
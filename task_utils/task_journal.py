@@ -0,0 +1,68 @@
+"""
+任務紀錄 (task.json)：
+    每個任務資料夾一個 JSON 檔，任務開始與結束各寫入一次，
+    寫入暫存檔 fsync 後取代，並記錄 schema 版本。
+    info.txt 於任務結束時由紀錄一次產生，保留給既有的 FTP 端讀取。
+"""
+import json
+import os
+from typing import Optional
+
+SCHEMA_VERSION = 1
+JOURNAL_NAME = "task.json"
+INFO_NAME = "info.txt"
+
+# info.txt 欄位順序
+INFO_KEYS = ("amr_pos_theta", "camera_offset", "task_type", "task_cnt", "requestor",
+             "amr_pos_x", "amr_pos_y", "amr_pos_z", "amr_tag_id", "ftp_url", "task_time",
+             "task_left", "stitch_state", "time_cost", "estimated_time")
+
+
+def write_journal(task_folder: str, journal: dict):
+    """寫入 task.json (暫存檔 fsync 後取代)"""
+    journal["schema_version"] = SCHEMA_VERSION
+    path = os.path.join(task_folder, JOURNAL_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(journal, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_journal(task_folder: str) -> Optional[dict]:
+    """讀取 task.json，不存在或版本不符時回傳 None"""
+    try:
+        with open(os.path.join(task_folder, JOURNAL_NAME), "r", encoding="utf-8") as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(journal, dict) or journal.get("schema_version") != SCHEMA_VERSION:
+        return None
+    return journal
+
+
+def write_info(task_folder: str, journal: dict):
+    """由任務紀錄產生 info.txt (一次寫入)"""
+    lines = [f"{key}:{journal[key]}\n" for key in INFO_KEYS if key in journal]
+    with open(os.path.join(task_folder, INFO_NAME), "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+def read_info(task_folder: str) -> dict:
+    """讀取舊版 info.txt，key 需完全相同"""
+    info = {}
+    with open(os.path.join(task_folder, INFO_NAME), "r", encoding="utf-8") as f:
+        for line in f:
+            key, sep, value = line.rstrip("\r\n").partition(":")
+            if sep:
+                info[key.strip()] = value
+    return info
+
+
+def load_task_record(task_folder: str) -> dict:
+    """讀取任務紀錄，無 task.json 時讀取 info.txt"""
+    journal = read_journal(task_folder)
+    if journal is not None:
+        return journal
+    return read_info(task_folder)
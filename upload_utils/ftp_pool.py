@@ -0,0 +1,215 @@
+"""
+FTP 連線池：
+    保持長連線 (定期 NOOP keepalive)，斷線時自動重新連線登入；
+    遠端已建立的資料夾以集合快取，避免每個任務重複 LIST / MKD。
+"""
+import ftplib
+import time
+from contextlib import contextmanager
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from typing import Optional, Set
+
+
+class FTPSession:
+    """連線池中的單一 FTP 連線"""
+
+    def __init__(self, pool: "FTPSessionPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.ftp: Optional[ftplib.FTP] = None
+        self.last_used = 0.0  # 最後使用時間(time.monotonic)
+
+    def is_connected(self) -> bool:
+        return self.ftp is not None
+
+    def connect(self):
+        """連線並登入"""
+        self.close()
+        ftp = ftplib.FTP(timeout=self.pool.timeout)
+        ftp.connect(self.pool.host, port=self.pool.port)
+        ftp.login(self.pool.user, self.pool.password)
+        self.ftp = ftp
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.ftp is None:
+            return
+        try:
+            self.ftp.quit()
+        except Exception:
+            try:
+                self.ftp.close()
+            except Exception:
+                pass
+        self.ftp = None
+
+    def keepalive(self) -> bool:
+        """送出 NOOP，失敗時關閉連線"""
+        try:
+            self.ftp.voidcmd("NOOP")
+        except Exception:
+            self.close()
+            return False
+        self.last_used = time.monotonic()
+        return True
+
+    def ensure_dir(self, path: str):
+        """建立遠端資料夾 (含上層)，已確認存在的資料夾不再送出指令"""
+        current = ""
+        for part in [p for p in path.split("/") if p]:
+            current += "/" + part
+            if self.pool.has_dir(current):
+                continue
+            try:
+                self.ftp.mkd(current)
+            except ftplib.error_perm:
+                # 已存在 (若為權限不足，後續 cwd/STOR 會失敗)
+                pass
+            self.pool.add_dir(current)
+
+    def remote_size(self, remote_name: str) -> Optional[int]:
+        """遠端檔案大小，不存在時回傳 None"""
+        try:
+            self.ftp.voidcmd("TYPE I")
+            return self.ftp.size(remote_name)
+        except ftplib.error_perm:
+            return None
+
+    def upload_file(self, local_path: str, remote_name: str, offset=0) -> int:
+        """
+        上傳至目前目錄，回傳本次傳輸位元組數
+        offset > 0 時由該位置以 APPE 續傳
+        """
+        with open(local_path, "rb") as f:
+            if offset > 0:
+                f.seek(offset)
+                self.ftp.storbinary(f"APPE {remote_name}", f)
+            else:
+                self.ftp.storbinary(f"STOR {remote_name}", f)
+            size = f.tell() - offset
+        self.last_used = time.monotonic()
+        return size
+
+
+class FTPSessionPool:
+    """FTP 連線池"""
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+                 size=1, keepalive=30.0, timeout=30.0, logger=None):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.keepalive_interval = keepalive  # 閒置超過此時間送出 NOOP(秒)
+        self.timeout = timeout  # socket timeout(秒)
+        self.logger = logger
+        self.sessions: Queue = Queue()
+        for i in range(size):
+            self.sessions.put(FTPSession(self, i))
+        self.dirs: Set[str] = set()  # 已確認存在的遠端資料夾
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.keepalive_thread = Thread()
+
+        # 統計
+        self.connect_cnt = 0
+        self.error_cnt = 0
+        self.upload_cnt = 0
+        self.upload_bytes = 0
+
+    def has_dir(self, path: str) -> bool:
+        with self.lock:
+            return path in self.dirs
+
+    def add_dir(self, path: str):
+        with self.lock:
+            self.dirs.add(path)
+
+    def invalidate_dirs(self):
+        """清除遠端資料夾快取 (遠端被刪除或發生錯誤時)"""
+        with self.lock:
+            self.dirs.clear()
+
+    @contextmanager
+    def session(self, timeout: Optional[float] = None):
+        """
+        取得已登入的連線：
+            with pool.session() as session:
+                session.ensure_dir(...)
+        發生例外時關閉該連線並清除資料夾快取，下次使用時重新連線
+        """
+        try:
+            session: FTPSession = self.sessions.get(timeout=timeout)
+        except Empty:
+            raise TimeoutError("no ftp session available")
+        try:
+            if session.is_connected() and \
+                    time.monotonic() - session.last_used > self.keepalive_interval:
+                session.keepalive()
+            if not session.is_connected():
+                session.connect()
+                with self.lock:
+                    self.connect_cnt += 1
+                self._debug(f"ftp session {session.index} connected!")
+            yield session
+        except Exception:
+            with self.lock:
+                self.error_cnt += 1
+            session.close()
+            self.invalidate_dirs()
+            raise
+        finally:
+            self.sessions.put(session)
+
+    def record_upload(self, size: int):
+        with self.lock:
+            self.upload_cnt += 1
+            self.upload_bytes += size
+
+    def start_keepalive(self):
+        """背景對閒置連線送出 NOOP"""
+        self.stop_event.clear()
+        if not self.keepalive_thread.is_alive():
+            self.keepalive_thread = Thread(target=self._keepalive_loop,
+                                           name="ftp-keepalive", daemon=True)
+            self.keepalive_thread.start()
+
+    def close(self):
+        self.stop_event.set()
+        while True:
+            try:
+                session = self.sessions.get_nowait()
+            except Empty:
+                break
+            session.close()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "connect_cnt": self.connect_cnt,
+                "error_cnt": self.error_cnt,
+                "upload_cnt": self.upload_cnt,
+                "upload_bytes": self.upload_bytes,
+                "cached_dirs": len(self.dirs),
+            }
+
+    def _keepalive_loop(self):
+        while not self.stop_event.wait(self.keepalive_interval / 2):
+            # 只檢查目前閒置的連線
+            idle = []
+            while True:
+                try:
+                    idle.append(self.sessions.get_nowait())
+                except Empty:
+                    break
+            for session in idle:
+                if session.is_connected() and \
+                        time.monotonic() - session.last_used > self.keepalive_interval:
+                    if not session.keepalive():
+                        self._debug(f"ftp session {session.index} keepalive failed, closed!")
+                self.sessions.put(session)
+
+    def _debug(self, message: str):
+        if self.logger is not None:
+            self.logger.debug(message)
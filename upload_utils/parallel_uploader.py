@@ -0,0 +1,134 @@
+"""
+多連線 FTP 上傳：
+    以 N 條連線同時上傳，每個檔案獨立重試 (指數退避)，單檔失敗不中斷其他檔案；
+    遠端已有部分檔案時以 APPE 續傳 (伺服器不支援時改為整檔重傳)，
+    上傳後以 SIZE 確認大小。
+"""
+import ftplib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, List, Optional, Tuple
+
+from upload_utils.ftp_pool import FTPSessionPool
+
+
+class ParallelUploader:
+    """多連線 FTP 上傳"""
+
+    def __init__(self, pool: FTPSessionPool, workers=3, retries=3,
+                 base_delay=1.0, max_delay=30.0, logger=None):
+        self.pool = pool  # 連線數應不少於 workers
+        self.workers = workers
+        self.retries = retries  # 每個檔案重試次數
+        self.base_delay = base_delay  # 第一次重試等待(秒)
+        self.max_delay = max_delay  # 最長重試等待(秒)
+        self.logger = logger
+        self.lock = Lock()
+
+        # 統計
+        self.file_cnt = 0
+        self.failed_cnt = 0
+        self.skipped_cnt = 0  # 遠端已完整存在
+        self.resumed_cnt = 0  # 續傳
+        self.retry_cnt = 0
+        self.bytes = 0
+        self.transfer_time = 0.0  # 傳輸時間總和(秒)
+        self.last_error = ""
+
+    def upload_files(self, local_paths: List[str], remote_dir: str,
+                     on_uploaded: Optional[Callable] = None) -> Tuple[List[str], List[str]]:
+        """
+        上傳檔案至 remote_dir，回傳 (成功檔案, 失敗檔案)
+        on_uploaded(local_path) 於單檔上傳並確認大小後呼叫
+        """
+        if not local_paths:
+            return [], []
+        ok, failed = [], []
+        workers = max(1, min(self.workers, len(local_paths)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ftp-upload") as executor:
+            results = executor.map(
+                lambda path: (path, self._upload_with_retry(path, remote_dir)), local_paths)
+            for path, success in results:
+                if success:
+                    ok.append(path)
+                    if on_uploaded is not None:
+                        on_uploaded(path)
+                else:
+                    failed.append(path)
+        return ok, failed
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            throughput = self.bytes / self.transfer_time if self.transfer_time > 0 else 0.0
+            return {
+                "file_cnt": self.file_cnt,
+                "failed_cnt": self.failed_cnt,
+                "skipped_cnt": self.skipped_cnt,
+                "resumed_cnt": self.resumed_cnt,
+                "retry_cnt": self.retry_cnt,
+                "bytes": self.bytes,
+                "throughput_kbps": round(throughput / 1024, 1),
+                "last_error": self.last_error,
+            }
+
+    def _upload_with_retry(self, local_path: str, remote_dir: str) -> bool:
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                with self.lock:
+                    self.retry_cnt += 1
+                time.sleep(min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+            try:
+                self._upload(local_path, remote_dir)
+            except Exception as e:
+                with self.lock:
+                    self.last_error = f"{os.path.basename(local_path)}: {e}"
+                self._error(f"upload failed, file:{local_path}, attempt:{attempt + 1}, error:{e}")
+            else:
+                with self.lock:
+                    self.file_cnt += 1
+                return True
+        with self.lock:
+            self.failed_cnt += 1
+        return False
+
+    def _upload(self, local_path: str, remote_dir: str):
+        name = os.path.basename(local_path)
+        local_size = os.path.getsize(local_path)
+        with self.pool.session() as session:
+            session.ensure_dir(remote_dir)
+            session.ftp.cwd(remote_dir)
+
+            remote_size = session.remote_size(name)
+            if remote_size == local_size:
+                with self.lock:
+                    self.skipped_cnt += 1
+                return
+            offset = remote_size if remote_size is not None and 0 < remote_size < local_size else 0
+
+            start = time.monotonic()
+            try:
+                size = session.upload_file(local_path, name, offset)
+            except ftplib.error_perm:
+                if offset == 0:
+                    raise
+                # 不支援 APPE，整檔重傳
+                offset = 0
+                size = session.upload_file(local_path, name)
+            elapsed = time.monotonic() - start
+
+            remote_size = session.remote_size(name)
+            if remote_size is not None and remote_size != local_size:
+                raise IOError(f"size mismatch, local:{local_size}, remote:{remote_size}")
+
+        self.pool.record_upload(size)
+        with self.lock:
+            self.bytes += size
+            self.transfer_time += elapsed
+            if offset > 0:
+                self.resumed_cnt += 1
+
+    def _error(self, message: str):
+        if self.logger is not None:
+            self.logger.error(message)
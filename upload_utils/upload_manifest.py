@@ -0,0 +1,73 @@
+"""
+已上傳檔案清單：
+    記錄本機檔案 (路徑、大小、修改時間)，大小與修改時間皆相同才視為已上傳，
+    取代每個任務 LIST 遠端資料夾比對檔名。
+"""
+import json
+import os
+from threading import Lock
+from typing import Dict, List
+
+
+class UploadManifest:
+    """已上傳檔案清單 (JSON)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = Lock()
+        self.files: Dict[str, List[float]] = {}  # 路徑 -> [size, mtime]
+        self.dirty = False
+        self.load()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normpath(path).replace(os.sep, "/")
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                files = json.load(f)
+        except (OSError, ValueError):
+            files = {}
+        with self.lock:
+            self.files = files if isinstance(files, dict) else {}
+            self.dirty = False
+
+    def save(self):
+        """寫入暫存檔後取代，避免中斷時清單損毀"""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.files)
+            self.dirty = False
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def is_uploaded(self, path: str) -> bool:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        with self.lock:
+            record = self.files.get(self._key(path))
+        return record is not None and record[0] == stat.st_size and record[1] == stat.st_mtime
+
+    def mark_uploaded(self, path: str):
+        stat = os.stat(path)
+        with self.lock:
+            self.files[self._key(path)] = [stat.st_size, stat.st_mtime]
+            self.dirty = True
+
+    def forget_dir(self, dir: str):
+        """移除資料夾下的紀錄 (本機資料夾已刪除)"""
+        prefix = self._key(dir) + "/"
+        with self.lock:
+            keys = [key for key in self.files if key.startswith(prefix)]
+            for key in keys:
+                del self.files[key]
+            if keys:
+                self.dirty = True
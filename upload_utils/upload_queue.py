@@ -0,0 +1,245 @@
+"""
+上傳佇列：
+    任務完成 (圖像已存於本機) 即建立上傳工作，每個工作以 JSON 檔保存於 queue_dir，
+    寫入暫存檔 fsync 後取代，程式中斷後重新啟動可繼續。
+    任務開始時即以 capturing 狀態加入 (未完成任務索引)，任務結束改為 pending；
+    需要拼接的任務另建拼接結果工作 (kind 為 stitch)，拼接期間為 stitching (worker 不處理)，
+    拼接完成後改為 pending 上傳拼接結果；任務圖像照常上傳，不需等待拼接。
+    背景 worker 依序執行：
+        pending  -> upload_func(job) 上傳 FTP  -> uploaded
+        uploaded -> commit_func(jobs) 批次寫入 MySQL -> 刪除工作檔
+    失敗的工作以指數退避重試，不阻塞其他工作；
+    批次寫入失敗時逐筆重試，找出失敗的工作。
+"""
+import json
+import os
+import time
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Optional
+
+STATE_CAPTURING = "capturing"  # 任務執行中
+STATE_PENDING = "pending"  # 等待上傳
+STATE_UPLOADED = "uploaded"  # 已上傳，等待寫入資料庫
+STATE_STITCHING = "stitching"  # 等待拼接完成
+
+KIND_TASK = "task"  # 任務圖像，寫入 task_history
+KIND_STITCH = "stitch"  # 拼接結果，更新 task_history 的 stitch_state
+
+
+class UploadQueue:
+    """上傳佇列"""
+
+    def __init__(self, queue_dir: str, upload_func: Callable, commit_func: Callable,
+                 base_delay=10.0, max_delay=300.0, commit_batch=50, logger=None):
+        self.queue_dir = queue_dir
+        self.upload_func = upload_func  # upload_func(job) -> bool
+        self.commit_func = commit_func  # commit_func(jobs) -> bool
+        self.commit_batch = commit_batch  # 每批寫入工作數
+        self.base_delay = base_delay  # 第一次重試等待(秒)
+        self.max_delay = max_delay  # 最長重試等待(秒)
+        self.logger = logger
+        self.lock = Lock()
+        self.jobs: Dict[str, dict] = {}  # job_id -> job
+        self.next_retry: Dict[str, float] = {}  # job_id -> time.monotonic
+        self.wake_event = Event()
+        self.stop_event = Event()
+        self.thread = Thread()
+        self.done_cnt = 0
+        os.makedirs(queue_dir, exist_ok=True)
+        self.load()
+
+    def load(self):
+        """載入未完成的工作"""
+        jobs = {}
+        for name in sorted(os.listdir(self.queue_dir)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.queue_dir, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = json.load(f)
+                if job["state"] == STATE_CAPTURING:
+                    # 任務執行中程式中斷，已存的圖像照常上傳
+                    job["state"] = STATE_PENDING
+                    self._save(job)
+                jobs[job["job_id"]] = job
+            except Exception as e:
+                # 損毀的工作檔保留供人工檢查
+                self._error(f"load upload job failed, file:{name}, error:{e}")
+                os.replace(path, path + ".bad")
+        with self.lock:
+            self.jobs = jobs
+
+    def enqueue(self, pos_id: str, task_id: str, record: dict, state=STATE_PENDING,
+                kind=KIND_TASK) -> str:
+        """加入上傳工作，record 為寫入資料庫的欄位"""
+        job_id = f"{time.time_ns()}"
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "pos_id": pos_id,
+            "task_id": task_id,
+            "record": record,
+            "state": state,
+            "attempts": 0,
+            "last_error": "",
+            "create_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self._save(job)
+        with self.lock:
+            self.jobs[job_id] = job
+        self.wake_event.set()
+        return job_id
+
+    def update(self, job_id: str, record: dict, state: str):
+        """更新工作 (任務結束時 capturing -> pending)"""
+        with self.lock:
+            job = dict(self.jobs[job_id])
+        job["record"] = record
+        job["state"] = state
+        self._save(job)
+        with self.lock:
+            self.jobs[job_id] = job
+        self.wake_event.set()
+
+    def list_jobs(self, state: str) -> List[dict]:
+        with self.lock:
+            return [dict(job) for job in self.jobs.values() if job["state"] == state]
+
+    def has_task(self, pos_id: str, task_id: str) -> bool:
+        with self.lock:
+            return any(job["pos_id"] == pos_id and job["task_id"] == task_id
+                       for job in self.jobs.values())
+
+    def list_task_jobs(self, pos_id: str, task_id: str) -> List[dict]:
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()
+                    if job["pos_id"] == pos_id and job["task_id"] == task_id]
+
+    def wake(self):
+        """立即處理 (例如網路恢復)"""
+        with self.lock:
+            self.next_retry.clear()
+        self.wake_event.set()
+
+    def start(self):
+        self.stop_event.clear()
+        if not self.thread.is_alive():
+            self.thread = Thread(target=self._worker, name="upload-queue", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+    def get_status(self) -> dict:
+        with self.lock:
+            jobs = sorted(self.jobs.values(), key=lambda job: job["job_id"])
+            return {
+                "capturing": sum(1 for job in jobs if job["state"] == STATE_CAPTURING),
+                "pending": sum(1 for job in jobs if job["state"] == STATE_PENDING),
+                "uploaded": sum(1 for job in jobs if job["state"] == STATE_UPLOADED),
+                "stitching": sum(1 for job in jobs if job["state"] == STATE_STITCHING),
+                "done_cnt": self.done_cnt,
+                "jobs": [dict({key: job[key] for key in ("job_id", "pos_id", "task_id", "state", "attempts", "last_error")},
+                              kind=job.get("kind", KIND_TASK))
+                         for job in jobs[:20]],
+            }
+
+    def _ready_jobs(self, state: str) -> List[dict]:
+        now = time.monotonic()
+        with self.lock:
+            return [self.jobs[job_id] for job_id in sorted(self.jobs)
+                    if self.jobs[job_id]["state"] == state and
+                    self.next_retry.get(job_id, 0.0) <= now]
+
+    def _next_wait(self) -> Optional[float]:
+        with self.lock:
+            if not self.next_retry:
+                return None
+            return max(0.0, min(self.next_retry.values()) - time.monotonic())
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            self.wake_event.clear()
+            for job in self._ready_jobs(STATE_PENDING):
+                if self.stop_event.is_set():
+                    break
+                self._upload(job)
+            jobs = self._ready_jobs(STATE_UPLOADED)
+            for i in range(0, len(jobs), self.commit_batch):
+                if self.stop_event.is_set():
+                    break
+                self._commit(jobs[i:i + self.commit_batch])
+            self.wake_event.wait(self._next_wait())
+
+    def _upload(self, job: dict):
+        try:
+            if not self.upload_func(job):
+                raise IOError("upload failed")
+        except Exception as e:
+            self._fail(job, e)
+            return
+        job["state"] = STATE_UPLOADED
+        try:
+            self._save(job)
+        except Exception as e:
+            self._error(f"save upload job failed, error:{e}")
+
+    def _commit(self, jobs: List[dict]):
+        try:
+            ok = self.commit_func(jobs)
+        except Exception as e:
+            ok, error = False, e
+        else:
+            error = IOError("commit failed")
+        if ok:
+            for job in jobs:
+                self._remove(job)
+        elif len(jobs) > 1:
+            # 逐筆重試，找出失敗的工作
+            for job in jobs:
+                self._commit([job])
+        else:
+            self._fail(jobs[0], error)
+
+    def _fail(self, job: dict, error: Exception):
+        job["attempts"] += 1
+        job["last_error"] = str(error)
+        delay = min(self.max_delay, self.base_delay * (2 ** (job["attempts"] - 1)))
+        with self.lock:
+            self.next_retry[job["job_id"]] = time.monotonic() + delay
+        self._error(
+            f"upload job {job['job_id']} ({job['pos_id']}/{job['task_id']}) {job['state']} failed, "
+            f"attempts:{job['attempts']}, retry in {delay:.0f}s, error:{error}")
+        try:
+            self._save(job)
+        except Exception as e:
+            self._error(f"save upload job failed, error:{e}")
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.queue_dir, f"{job_id}.json")
+
+    def _save(self, job: dict):
+        """寫入暫存檔 fsync 後取代"""
+        path = self._path(job["job_id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _remove(self, job: dict):
+        try:
+            os.remove(self._path(job["job_id"]))
+        except FileNotFoundError:
+            pass
+        with self.lock:
+            self.jobs.pop(job["job_id"], None)
+            self.next_retry.pop(job["job_id"], None)
+            self.done_cnt += 1
+
+    def _error(self, message: str):
+        if self.logger is not None:
+            self.logger.error(message)